@@ -0,0 +1,44 @@
+"""
+add_ttft_column.py
+──────────────────
+Run ONCE from the project root to add the time-to-first-token metric to the
+existing `query_metrics` table:
+
+    python add_ttft_column.py
+
+Safe to re-run — the ALTER uses IF NOT EXISTS.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from backend.db.database import engine
+from sqlalchemy import text, inspect
+
+# ── Step 1: Add new column to query_metrics ──────────────────────────────────
+NEW_COLUMNS = [
+    ("time_to_first_token_ms", "INTEGER"),
+]
+
+print("── Step 1: Altering query_metrics table ────────────────────────────────")
+with engine.connect() as conn:
+    for col_name, col_type in NEW_COLUMNS:
+        try:
+            conn.execute(text(
+                f"ALTER TABLE query_metrics ADD COLUMN IF NOT EXISTS {col_name} {col_type};"
+            ))
+            conn.commit()
+            print(f"  ✅ query_metrics.{col_name} ({col_type})")
+        except Exception as e:
+            print(f"  ⚠️  query_metrics.{col_name} — {e}")
+
+# ── Step 2: Verify ────────────────────────────────────────────────────────────
+print("\n── Step 2: Verification ────────────────────────────────────────────────")
+inspector = inspect(engine)
+metric_cols = {c["name"] for c in inspector.get_columns("query_metrics")}
+for col_name, _ in NEW_COLUMNS:
+    status = "✅" if col_name in metric_cols else "❌ MISSING"
+    print(f"  {status}  query_metrics.{col_name}")
+
+print("\nDone. Restart your FastAPI server to pick up the new model column.")
@@ -0,0 +1,123 @@
+"""
+bench_ingest_memory.py
+──────────────────────
+Peak-memory comparison of the old eager ingest path against the streaming
+pipeline in rag_service.
+
+    python -m backend.benchmarks.bench_ingest_memory                # synthetic text
+    python -m backend.benchmarks.bench_ingest_memory --file big.pdf # a real manual
+    python -m backend.benchmarks.bench_ingest_memory --sections 4000 --batch-size 32
+
+Embedding is replaced by a deterministic fake 384-dim encoder so the numbers
+measure the pipeline (documents, chunks, vectors held at once), not the
+model. Peak is measured with tracemalloc.
+
+Expected shape of the result: eager peak grows with the document; streaming
+peak stays roughly flat as the document grows and moves with --batch-size.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.document_loaders import PyPDFLoader, TextLoader
+
+from backend.services.document_loaders import iter_chunks
+from backend.services.ingest_pipeline import IngestPipeline, batched_chunks
+
+DIM = 384
+
+
+def _splitter():
+    # Same settings as RAGService
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=200, length_function=len,
+        separators=["\n\n", "\n", " ", ""],
+    )
+
+
+def _fake_embed_sync(texts):
+    return [[(hash(t) % 1000) / 1000.0] * DIM for t in texts]
+
+
+def _write_synthetic(path: str, sections: int):
+    words = "config server retry timeout token endpoint schema deploy cache index".split()
+    rnd = random.Random(42)
+    with open(path, "w", encoding="utf-8") as f:
+        for s in range(sections):
+            f.write(f"## Section {s}\n\n")
+            for _ in range(6):
+                f.write(" ".join(rnd.choice(words) for _ in range(60)) + "\n\n")
+
+
+def eager(path: str) -> int:
+    """What add_document did before: load all → split all → embed all."""
+    loader = PyPDFLoader(path) if path.endswith(".pdf") else TextLoader(path)
+    documents = loader.load()
+    chunks = _splitter().split_documents(documents)
+    vectors = _fake_embed_sync([c.page_content for c in chunks])
+    return len(vectors)
+
+
+def streaming(path: str, batch_size: int, workers: int) -> int:
+    async def embed(texts):
+        return _fake_embed_sync(texts)
+
+    async def write(batch):
+        pass
+
+    async def batches():
+        for batch in batched_chunks(iter_chunks(path, _splitter(), "bench"), batch_size):
+            yield batch
+
+    pipeline = IngestPipeline(embed=embed, write=write, max_in_flight=workers + 1)
+    return asyncio.run(pipeline.run(batches()))
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = fn(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, peak / (1024 * 1024), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="PDF/TXT/MD to ingest (default: generated text)")
+    parser.add_argument("--sections", type=int, default=2000, help="size of the generated document")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    path = args.file
+    tmp = None
+    if not path:
+        tmp = tempfile.NamedTemporaryFile(suffix=".md", delete=False)
+        tmp.close()
+        _write_synthetic(tmp.name, args.sections)
+        path = tmp.name
+
+    try:
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"Document: {path} ({size_mb:.1f} MB)")
+        print(f"{'mode':<12}{'chunks':>10}{'peak MB':>12}{'seconds':>10}")
+        for name, fn, fn_args in (
+            ("eager", eager, (path,)),
+            ("streaming", streaming, (path, args.batch_size, args.workers)),
+        ):
+            count, peak, elapsed = measure(fn, *fn_args)
+            print(f"{name:<12}{count:>10}{peak:>12.1f}{elapsed:>10.2f}")
+    finally:
+        if tmp:
+            os.remove(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
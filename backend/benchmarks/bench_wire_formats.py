@@ -0,0 +1,127 @@
+"""
+bench_wire_formats.py
+─────────────────────
+Payload size and encode/decode time for every body format and compression
+the shared protocol can negotiate (services/wire_format.py).
+
+    python -m backend.benchmarks.bench_wire_formats
+    python -m backend.benchmarks.bench_wire_formats --k 10 --batch 32 --page 500
+
+Three synthetic payloads, shaped like the real responses:
+
+  search        POST /search, k full hits (~1000-char chunks + metadata)
+  search-ids    the same hits with fields="ids" (id, score, snippet)
+  batch         POST /search/batch, --batch queries × k full hits
+  changes       one GET /changes page of --page upserts with 384-d vectors
+
+Formats missing an optional package (msgpack, orjson, zstandard) are
+skipped, and "json" uses orjson when it is installed — run once with and
+once without it to compare. Times are the median of --repeat runs.
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from backend.services import wire_format
+from backend.services.wire_format import (
+    MEDIA_JSON,
+    MEDIA_MSGPACK,
+    compress,
+    decode_body,
+    decompress,
+    encode_body,
+    supported_encodings,
+)
+
+DIM = 384
+SNIPPET_CHARS = 200
+
+
+def _chunk_text(rnd: random.Random) -> str:
+    words = "config server retry timeout token endpoint schema deploy cache index".split()
+    return " ".join(rnd.choice(words) for _ in range(150))[:1000]
+
+
+def _hit(rnd: random.Random, i: int) -> dict:
+    return {
+        "id": f"{rnd.getrandbits(128):032x}",
+        "content": _chunk_text(rnd),
+        "metadata": {
+            "document_id": f"doc-{i % 7}",
+            "chunk_index": i,
+            "source": "deployment_runbook.pdf",
+            "original_filename": "deployment_runbook.pdf",
+            "content_hash": f"{rnd.getrandbits(64):016x}",
+            "page": i // 3,
+        },
+        "source": "deployment_runbook.pdf",
+        "relevance_score": round(rnd.random(), 4),
+    }
+
+
+def _ids_only(hit: dict) -> dict:
+    return {key: hit[key] for key in ("id", "relevance_score", "source")} | {
+        "snippet": hit["content"][:SNIPPET_CHARS]
+    }
+
+
+def payloads(k: int, batch: int, page: int) -> dict:
+    rnd = random.Random(42)
+    rng = np.random.default_rng(42)
+    hits = [_hit(rnd, i) for i in range(k)]
+    vectors = rng.normal(size=(page, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    changes = []
+    for i in range(page):
+        hit = _hit(rnd, i)
+        changes.append({"seq": i + 1, "op": "upsert", "id": hit["id"], "content": hit["content"],
+                        "metadata": hit["metadata"], "embedding": vectors[i]})
+    return {
+        "search": {"query": "how do I roll back a deploy", "results": hits},
+        "search-ids": {"query": "how do I roll back a deploy", "results": [_ids_only(h) for h in hits]},
+        "batch": {"results": [[_hit(rnd, i) for i in range(k)] for _ in range(batch)]},
+        "changes": {"epoch": "e" * 32, "version": page, "next": page, "has_more": False,
+                    "embedding_model": "sentence-transformers/all-MiniLM-L6-v2", "changes": changes},
+    }
+
+
+def median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5, help="hits per query")
+    parser.add_argument("--batch", type=int, default=16, help="queries in the batch payload")
+    parser.add_argument("--page", type=int, default=500, help="changelog entries per page")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    media_types = [MEDIA_JSON] + ([MEDIA_MSGPACK] if wire_format.msgpack is not None else [])
+    encodings = [None] + supported_encodings()
+    print(f"json encoder: {'orjson' if wire_format.orjson is not None else 'stdlib json'}; "
+          f"msgpack: {'yes' if wire_format.msgpack is not None else 'not installed'}; "
+          f"zstd: {'yes' if wire_format.zstandard is not None else 'not installed'}")
+
+    print(f"{'payload':<12}{'format':<10}{'compress':<10}{'KB':>10}{'encode ms':>12}{'decode ms':>12}")
+    for name, payload in payloads(args.k, args.batch, args.page).items():
+        for media_type in media_types:
+            raw = encode_body(payload, media_type)
+            for encoding in encodings:
+                body = compress(raw, encoding)
+                encode_ms = median_ms(lambda: compress(encode_body(payload, media_type), encoding), args.repeat)
+                decode_ms = median_ms(lambda: decode_body(decompress(body, encoding), media_type), args.repeat)
+                print(f"{name:<12}{media_type.split('/')[1]:<10}{encoding or '-':<10}"
+                      f"{len(body) / 1024:>10.1f}{encode_ms:>12.3f}{decode_ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
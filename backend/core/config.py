@@ -21,8 +21,31 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "codellama:7b")
 
+# One pooled, keep-alive HTTP client is shared by every Ollama call. Connect
+# fails fast (Ollama is local or on the LAN); reads wait for generation.
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "10"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "10"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "300"))
+
+# Answer cache — identical prompts (per search scope) reuse the last answer.
+# Bounded by total size; expired answers are swept in the background.
+ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", "32"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SWEEP_SECONDS = float(os.getenv("ANSWER_CACHE_SWEEP_SECONDS", "60"))
+
+# Semantic answer cache — a question close enough in meaning to an earlier
+# one (same scope, same index version, mostly the same retrieved chunks)
+# reuses its answer. Entries expire after ANSWER_CACHE_TTL_SECONDS.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MIN_CONTEXT_OVERLAP = float(os.getenv("SEMANTIC_CACHE_MIN_CONTEXT_OVERLAP", "0.6"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
 # Vector DB
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./vectordb")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
 # Uploads
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
@@ -43,3 +66,56 @@ class Settings:
 settings = Settings()
 
 SHARED_UPLOAD_DIR = os.path.join(os.getcwd(), "shareduploads")
+
+# RAG execution lanes — query-time and ingest-time vector store work run on
+# separate pools so a big upload never stalls interactive search.
+# A queue limit of 0 means "unbounded".
+RAG_QUERY_WORKERS = int(os.getenv("RAG_QUERY_WORKERS", "4"))
+RAG_QUERY_QUEUE_LIMIT = int(os.getenv("RAG_QUERY_QUEUE_LIMIT", "64"))
+RAG_INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "2"))
+RAG_INGEST_QUEUE_LIMIT = int(os.getenv("RAG_INGEST_QUEUE_LIMIT", "0"))
+
+# Ingestion pipeline — chunks are embedded in batches across several workers
+# and streamed into the vector store batch by batch.
+# RAG_EMBED_POOL: "thread" shares the loaded model between threads (torch
+# releases the GIL while encoding); "process" loads one model per core.
+RAG_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+RAG_EMBED_WORKERS = int(os.getenv("RAG_EMBED_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+RAG_EMBED_POOL = os.getenv("RAG_EMBED_POOL", "thread")
+
+# Embedding cache — chunk vectors keyed by (model, normalized text hash) so
+# re-uploads of unchanged documents skip the encoder.
+RAG_EMBED_CACHE_ENABLED = os.getenv("RAG_EMBED_CACHE_ENABLED", "true").lower() == "true"
+RAG_EMBED_CACHE_PATH = os.getenv(
+    "RAG_EMBED_CACHE_PATH", os.path.join(CHROMA_PERSIST_DIR, "embedding_cache.sqlite3")
+)
+RAG_EMBED_CACHE_MAX_MB = int(os.getenv("RAG_EMBED_CACHE_MAX_MB", "256"))
+
+# Query embedding LRU — repeated questions skip the encoder entirely.
+RAG_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+
+# Hybrid retrieval — a BM25 keyword index lives next to the vector store and
+# its ranking is fused with vector similarity (reciprocal-rank fusion).
+RAG_HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "true").lower() == "true"
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+RAG_KEYWORD_INDEX_PATH = os.getenv(
+    "RAG_KEYWORD_INDEX_PATH", os.path.join(CHROMA_PERSIST_DIR, "keyword_index.json")
+)
+
+# Write-behind persistence — vector store / keyword index flushes are grouped:
+# one flush per window, or sooner once this many chunk writes are pending.
+RAG_PERSIST_WINDOW_SECONDS = float(os.getenv("RAG_PERSIST_WINDOW_SECONDS", "2.0"))
+RAG_PERSIST_MAX_PENDING = int(os.getenv("RAG_PERSIST_MAX_PENDING", "2000"))
+
+# Vector store backend: "chroma" (default) or "flat" — exact NumPy search over
+# memory-mapped vectors, best for per-laptop corpora of tens of thousands of chunks.
+RAG_VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+RAG_FLAT_INDEX_DIR = os.getenv("RAG_FLAT_INDEX_DIR", os.path.join(CHROMA_PERSIST_DIR, "flat_index"))
+
+# Flat backend storage precision: "float32", "float16" (½ size) or "int8"
+# (¼ size, per-vector scale). RAG_FLAT_RESCORE keeps a float32 copy on disk and
+# re-ranks the top k × RAG_FLAT_RESCORE_FACTOR quantized candidates with it.
+# GET /api/admin/vector-quantization-report measures the recall trade-off.
+RAG_FLAT_DTYPE = os.getenv("RAG_FLAT_DTYPE", "float32")
+RAG_FLAT_RESCORE = os.getenv("RAG_FLAT_RESCORE", "false").lower() == "true"
+RAG_FLAT_RESCORE_FACTOR = int(os.getenv("RAG_FLAT_RESCORE_FACTOR", "4"))
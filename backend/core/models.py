@@ -80,7 +80,7 @@ class Message(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # ── NEW columns ───────────────────────────────────────────────────────────
-    db_scope           = Column(String(20), default="local")   # "local" | "shared"
+    db_scope           = Column(String(20), default="local")   # "local" | "shared" | "both"
     feedback_record_id = Column(UUID(as_uuid=True), nullable=True)  # → feedback_records.id
     feedback_vote      = Column(Integer, nullable=True)         # 1, -1, or NULL
     confidence_score   = Column(Float, nullable=True)           # 0.0–1.0  (cached for history)
@@ -98,6 +98,7 @@ class QueryMetrics(Base):
     message_id = Column(UUID(as_uuid=True), ForeignKey("messages.id", ondelete="CASCADE"), nullable=True)
     query = Column(Text, nullable=False)
     response_time_ms = Column(Integer)
+    time_to_first_token_ms = Column(Integer, nullable=True)   # = response_time_ms when not streamed
     num_sources = Column(Integer, default=0)
     model_used = Column(String(100))
     success = Column(Boolean, default=True)
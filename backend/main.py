@@ -4,7 +4,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 from backend.db.database import engine, Base
-from backend.routers import auth, chat, documents, admin, google_auth
+from backend.routers import auth, chat, documents, admin, google_auth, search
 from backend.services.ollama_service import ollama_service
 # ── CHANGE THIS LINE ──────────────────────────────────────────────────────
 from backend.services.rag_manager import rag_manager  # ← CHANGED from rag_service
@@ -27,6 +27,7 @@ async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
     print("🚀 Starting Code Assistant...")
+    await ollama_service.start()  # one pooled keep-alive client for all LLM calls
     await ollama_service.check_connection()
     await rag_manager.initialize()  # ← CHANGED from rag_service
     print("✅ Ready!")
@@ -35,7 +36,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("🛑 Shutting down...")
-    await rag_manager.close()  # ← NEW: close HTTP client to shared server
+    await rag_manager.flush()  # ← NEW: flush write-behind vector store writes
+    await rag_manager.close()  # ← NEW: close HTTP client + drain local RAG workers
+    await ollama_service.close()
     print("✅ Cleanup complete")
 
 # ---------- APP INITIALIZATION ----------
@@ -81,6 +84,7 @@ app.include_router(google_auth.router, prefix="/api/auth", tags=["Google_auth"])
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
+app.include_router(search.router, prefix="/api/search", tags=["Search"])
 app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 
 # ---------- ROOT & HEALTH ----------
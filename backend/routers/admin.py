@@ -1,11 +1,13 @@
 """Admin dashboard endpoints"""
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from backend.db.database import get_db
 from backend.core.models import User, Document, ChatSession, Message
 from backend.services.rag_service import rag_service
 from backend.services.ollama_service import ollama_service
+from backend.services.rag_manager import rag_manager
 
 router = APIRouter()
 
@@ -29,6 +31,7 @@ def get_stats(db: Session = Depends(get_db)):
     from backend.core.models import QueryMetrics
     total_queries = db.query(func.count(QueryMetrics.id)).scalar()
     avg_response_time = db.query(func.avg(QueryMetrics.response_time_ms)).scalar() or 0
+    avg_ttft = db.query(func.avg(QueryMetrics.time_to_first_token_ms)).scalar() or 0
     success_rate = db.query(func.count(QueryMetrics.id)).filter(QueryMetrics.success == True).scalar()
     
     # RAG stats
@@ -54,12 +57,19 @@ def get_stats(db: Session = Depends(get_db)):
         "queries": {
             "total": total_queries,
             "avg_response_time_ms": round(avg_response_time, 2),
+            "avg_time_to_first_token_ms": round(avg_ttft, 2),
             "success_rate": round((success_rate / total_queries * 100), 2) if total_queries > 0 else 0
         },
         "rag": rag_stats,
         "services": {
             "ollama": ollama_service.is_connected,
             "rag": rag_service.is_initialized
+        },
+        "ollama_http": ollama_service.connection_stats(),
+        "answer_cache": ollama_service.cache_stats(),
+        "coalescing": {
+            "generate": ollama_service.coalescing_stats(),
+            "search": rag_manager.searches.stats(),
         }
     }
 
@@ -132,4 +142,22 @@ def get_slow_queries(threshold_ms: int = 3000, db: Session = Depends(get_db)):
             "created_at": q.created_at.isoformat()
         }
         for q in slow_queries
-    ]
\ No newline at end of file
+    ]
+
+@router.get("/vector-quantization-report")
+async def get_vector_quantization_report(
+    k: int = 10,
+    sample_size: int = 200,
+    rescore_factor: int = 4,
+    queries: Optional[List[str]] = Query(None),
+):
+    """Recall@k of float16/int8 vector storage vs float32 on the current corpus"""
+    if not rag_service.is_initialized:
+        raise HTTPException(status_code=503, detail="RAG service not initialized")
+
+    return await rag_service.quantization_report(
+        queries=queries,
+        k=k,
+        sample_size=sample_size,
+        rescore_factor=rescore_factor,
+    )
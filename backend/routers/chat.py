@@ -5,9 +5,10 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional, Literal
 from uuid import UUID
+import json
 import time
-from backend.db.database import get_db
-from backend.core.models import ChatSession, Message
+from backend.db.database import SessionLocal, get_db
+from backend.core.models import ChatSession, Message, QueryMetrics
 from backend.services.ollama_service import ollama_service
 from backend.services.rag_manager import rag_manager
 from backend.routers.auth import get_current_user
@@ -22,7 +23,7 @@ class ChatRequest(BaseModel):
     session_id: Optional[UUID] = None
     use_rag: bool = True
     stream: bool = False
-    db_scope: Literal["local", "shared"] = "local"
+    db_scope: Literal["local", "shared", "both"] = "local"
 
 class ChatResponse(BaseModel):
     answer: str
@@ -59,7 +60,7 @@ async def chat_query(
 
     # ── DEBUG: confirm what scope and URL are being used ─────────────────────
     print(f"DEBUG scope received: '{request.db_scope}'")
-    print(f"DEBUG rag_manager shared URL: {rag_manager._http.base_url}")
+    print(f"DEBUG rag_manager shared URLs: {rag_manager.shared.urls}")
 
     # ── Session ───────────────────────────────────────────────────────────────
     if request.session_id:
@@ -86,12 +87,21 @@ async def chat_query(
     sources = []
     context_docs = []
     raw_similarity_scores = []
+    index_version = None
 
     if request.use_rag:
+        # index_version: what the results were read from — the semantic
+        # answer cache only reuses answers built at the same version.
         if request.db_scope == "local" and rag_manager.local.is_initialized:
-            search_results = await rag_manager.search(query=request.query, k=5, scope="local")
+            search_results, index_version = await rag_manager.search_with_version(
+                query=request.query, k=5, scope="local")
         elif request.db_scope == "shared":
-            search_results = await rag_manager.search(query=request.query, k=5, scope="shared")
+            search_results, index_version = await rag_manager.search_with_version(
+                query=request.query, k=5, scope="shared")
+        elif request.db_scope == "both":
+            # Local and shared run concurrently, each under its own deadline
+            search_results, index_version = await rag_manager.search_with_version(
+                query=request.query, k=5, scope="both")
         else:
             search_results = []
 
@@ -119,6 +129,7 @@ async def chat_query(
                     "source": r.get("source", "unknown"),
                     "document_id": r.get("metadata", {}).get("document_id", "unknown"),
                     "relevance_score": r.get("relevance_score"),
+                    "scope": r.get("scope", request.db_scope),
                 }
                 for r in search_results
             ]
@@ -126,6 +137,31 @@ async def chat_query(
     # ── Confidence ────────────────────────────────────────────────────────────
     conf_data = compute_confidence(raw_similarity_scores, len(context_docs))
 
+    history = []
+    query_embedding = None
+    if context_docs:
+        history = _get_history(db, session.id)
+        # Semantic answer cache key: the query embedding retrieval already
+        # computed, if it embedded here (local, both, or a shared replica) —
+        # never a fresh encode just for the cache. First turns only.
+        if not history and index_version is not None:
+            query_embedding = rag_manager.local.query_cache.peek(request.query)
+
+    if request.stream:
+        score, label, _ = fl_service.preview_confidence(
+            db, request.query, raw_similarity_scores, len(context_docs)
+        )
+        return StreamingResponse(
+            _stream_answer(
+                request, session.id, current_user.id, start_time,
+                sources, context_docs, raw_similarity_scores,
+                _confidence(score, label, conf_data),
+                history, query_embedding, index_version,
+            ),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     # ── Generation ────────────────────────────────────────────────────────────
     success = True
     try:
@@ -133,29 +169,15 @@ async def chat_query(
             answer = await ollama_service.generate_with_context(
                 question=request.query,
                 context=context_docs,
-                chat_history=_get_history(db, session.id),
+                chat_history=history,
                 db_scope=request.db_scope,   # ← FIX: pass scope into cache key
+                query_embedding=query_embedding,
+                index_version=index_version,
             )
         else:
-            # ── FIX 3: Tell the LLM not to hallucinate when shared returns nothing
-            if request.db_scope == "shared":
-                system_prompt = (
-                    "You are a helpful assistant. "
-                    "IMPORTANT: The shared team database returned no results for this query. "
-                    "This may mean the shared RAG server is unreachable, or no relevant "
-                    "documents exist for this question. "
-                    "Do NOT answer from your own knowledge. Instead, tell the user that "
-                    "no relevant shared documents were found and suggest they check "
-                    "whether the correct documents have been uploaded to the shared database."
-                )
-            else:
-                system_prompt = (
-                    "You are a helpful coding assistant. "
-                    "Note: No relevant documents were found in your personal database."
-                )
             answer = await ollama_service.generate(
                 prompt=request.query,
-                system_prompt=system_prompt,
+                system_prompt=_no_context_system_prompt(request.db_scope),
                 temperature=0.7,
             )
     except Exception as e:
@@ -164,47 +186,11 @@ async def chat_query(
 
     response_time = int((time.time() - start_time) * 1000)
 
-    # ── Save assistant message ────────────────────────────────────────────────
-    assistant_message = Message(
-        session_id=session.id,
-        role="assistant",
-        content=answer,
-        sources=sources,
-        response_time_ms=response_time,
-        db_scope=request.db_scope,
+    # Not streamed: the first token reaches the user with the whole answer.
+    assistant_message, feedback_record = _save_answer(
+        db, request, session.id, current_user.id, answer, sources, success,
+        response_time, response_time, raw_similarity_scores, len(context_docs),
     )
-    db.add(assistant_message)
-    db.commit()
-    db.refresh(assistant_message)
-
-    # ── QueryMetrics ──────────────────────────────────────────────────────────
-    from backend.core.models import QueryMetrics
-    metrics = QueryMetrics(
-        message_id=assistant_message.id,
-        query=request.query,
-        response_time_ms=response_time,
-        num_sources=len(sources),
-        model_used=ollama_service.model,
-        success=success,
-    )
-    db.add(metrics)
-    db.commit()
-
-    # ── FeedbackRecord ────────────────────────────────────────────────────────
-    feedback_record = fl_service.record_response(
-        db=db,
-        query=request.query,
-        similarity_scores=raw_similarity_scores,
-        num_sources=len(context_docs),
-        message_id=assistant_message.id,
-        user_id=current_user.id,
-        db_scope=request.db_scope,
-    )
-
-    assistant_message.feedback_record_id = feedback_record.id
-    assistant_message.confidence_score   = feedback_record.confidence_score
-    assistant_message.confidence_label   = feedback_record.confidence_label
-    db.commit()
 
     return ChatResponse(
         answer=answer,
@@ -213,15 +199,103 @@ async def chat_query(
         response_time_ms=response_time,
         db_scope=request.db_scope,
         feedback_record_id=feedback_record.id,
-        confidence={
-            "score": feedback_record.confidence_score,
-            "label": feedback_record.confidence_label,
-            "top_source_score": conf_data.get("top_score"),
-            "avg_source_score": conf_data.get("avg_score"),
-        },
+        confidence=_confidence(feedback_record.confidence_score, feedback_record.confidence_label, conf_data),
     )
 
 
+async def _stream_answer(
+    request: ChatRequest,
+    session_id: UUID,
+    user_id: UUID,
+    start_time: float,
+    sources: List[dict],
+    context_docs: List[str],
+    raw_similarity_scores: List[float],
+    confidence: dict,
+    history: List[dict],
+    query_embedding: Optional[List[float]],
+    index_version: Optional[str],
+):
+    """
+    Server-sent events for request.stream=True:
+
+        event: meta   {session_id, db_scope, sources, confidence}
+        event: token  {text}                       — one per Ollama chunk
+        event: error  {detail}                     — generation failed
+        event: done   {message_id, feedback_record_id, confidence,
+                       response_time_ms, time_to_first_token_ms}
+
+    Message, QueryMetrics and FeedbackRecord are saved once the stream ends
+    (in their own DB session — the request's is closed by then), and also
+    when the client disconnects mid-answer, with what was generated so far.
+    """
+    yield _sse("meta", {
+        "session_id": session_id,
+        "db_scope": request.db_scope,
+        "sources": sources,
+        "confidence": confidence,
+    })
+
+    parts: List[str] = []
+    first_token_ms = None
+    success = False
+    saved = None
+    try:
+        try:
+            if context_docs:
+                tokens = ollama_service.stream_with_context(
+                    question=request.query,
+                    context=context_docs,
+                    chat_history=history,
+                    db_scope=request.db_scope,
+                    query_embedding=query_embedding,
+                    index_version=index_version,
+                )
+            else:
+                tokens = ollama_service.generate_stream(
+                    prompt=request.query,
+                    system_prompt=_no_context_system_prompt(request.db_scope),
+                    temperature=0.7,
+                    max_tokens=600,
+                    raise_errors=True,
+                )
+            async for token in tokens:
+                if first_token_ms is None:
+                    first_token_ms = int((time.time() - start_time) * 1000)
+                parts.append(token)
+                yield _sse("token", {"text": token})
+            success = True
+        except Exception as e:
+            parts.append(f"Sorry, an error occurred: {str(e)}")
+            yield _sse("error", {"detail": str(e)})
+    finally:
+        response_time = int((time.time() - start_time) * 1000)
+        db = SessionLocal()
+        try:
+            assistant_message, feedback_record = _save_answer(
+                db, request, session_id, user_id, "".join(parts), sources, success,
+                response_time, first_token_ms, raw_similarity_scores, len(context_docs),
+            )
+            saved = {
+                "message_id": assistant_message.id,
+                "feedback_record_id": feedback_record.id,
+                "confidence": {
+                    **confidence,
+                    "score": feedback_record.confidence_score,
+                    "label": feedback_record.confidence_label,
+                },
+            }
+        finally:
+            db.close()
+
+    yield _sse("done", {
+        **saved,
+        "session_id": session_id,
+        "response_time_ms": response_time,
+        "time_to_first_token_ms": first_token_ms,
+    })
+
+
 # ── Feedback endpoint ─────────────────────────────────────────────────────────
 
 @router.post("/feedback")
@@ -347,6 +421,94 @@ async def generate_code(description: str, language: str = "python"):
 
 # ── Helper ────────────────────────────────────────────────────────────────────
 
+def _no_context_system_prompt(db_scope: str) -> str:
+    # ── FIX 3: Tell the LLM not to hallucinate when shared returns nothing
+    if db_scope in ("shared", "both"):
+        return (
+            "You are a helpful assistant. "
+            "IMPORTANT: The shared team database returned no results for this query. "
+            "This may mean the shared RAG server is unreachable, or no relevant "
+            "documents exist for this question. "
+            "Do NOT answer from your own knowledge. Instead, tell the user that "
+            "no relevant shared documents were found and suggest they check "
+            "whether the correct documents have been uploaded to the shared database."
+        )
+    return (
+        "You are a helpful coding assistant. "
+        "Note: No relevant documents were found in your personal database."
+    )
+
+
+def _confidence(score: float, label: str, conf_data: dict) -> dict:
+    return {
+        "score": score,
+        "label": label,
+        "top_source_score": conf_data.get("top_score"),
+        "avg_source_score": conf_data.get("avg_score"),
+    }
+
+
+def _save_answer(
+    db: Session,
+    request: ChatRequest,
+    session_id: UUID,
+    user_id: UUID,
+    answer: str,
+    sources: List[dict],
+    success: bool,
+    response_time: int,
+    time_to_first_token: Optional[int],
+    raw_similarity_scores: List[float],
+    num_context_docs: int,
+):
+    """Save the assistant Message, its QueryMetrics and FeedbackRecord."""
+    assistant_message = Message(
+        session_id=session_id,
+        role="assistant",
+        content=answer,
+        sources=sources,
+        response_time_ms=response_time,
+        db_scope=request.db_scope,
+    )
+    db.add(assistant_message)
+    db.commit()
+    db.refresh(assistant_message)
+
+    # ── QueryMetrics ──────────────────────────────────────────────────────────
+    metrics = QueryMetrics(
+        message_id=assistant_message.id,
+        query=request.query,
+        response_time_ms=response_time,
+        time_to_first_token_ms=time_to_first_token,
+        num_sources=len(sources),
+        model_used=ollama_service.model,
+        success=success,
+    )
+    db.add(metrics)
+    db.commit()
+
+    # ── FeedbackRecord ────────────────────────────────────────────────────────
+    feedback_record = fl_service.record_response(
+        db=db,
+        query=request.query,
+        similarity_scores=raw_similarity_scores,
+        num_sources=num_context_docs,
+        message_id=assistant_message.id,
+        user_id=user_id,
+        db_scope=request.db_scope,
+    )
+
+    assistant_message.feedback_record_id = feedback_record.id
+    assistant_message.confidence_score   = feedback_record.confidence_score
+    assistant_message.confidence_label   = feedback_record.confidence_label
+    db.commit()
+    return assistant_message, feedback_record
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
 def _get_history(db: Session, session_id: UUID):
     chat_history = db.query(Message).filter(
         Message.session_id == session_id
@@ -6,6 +6,7 @@ from typing import List, Literal  # ← ADD Literal import
 from uuid import UUID
 import os
 import shutil
+import uuid
 from backend.db.database import get_db
 from backend.core.models import Document
 # ── CHANGE THIS LINE ──────────────────────────────────────────────────────
@@ -91,6 +92,38 @@ async def process_document_task(document_id: UUID, file_path: str, db: Session,
             doc.status = "failed"
             db.commit()
 
+async def reindex_document_task(document_id: UUID, file_path: str, staged_path: str, db: Session):
+    """
+    Background task to incrementally re-index a replaced document.
+
+    The new version waits at `staged_path` and only replaces `file_path`
+    once its chunks are indexed — a failed re-index keeps the old file,
+    matching the old chunks still in the index.
+    """
+    try:
+        summary = await rag_manager.update_document(
+            file_path=staged_path,
+            document_id=str(document_id),
+            metadata={"filename": os.path.basename(file_path), "source": file_path},
+            scope="local",
+        )
+        os.replace(staged_path, file_path)
+        doc = db.query(Document).filter(Document.id == document_id).first()
+        if doc:
+            doc.chunk_count = summary["total_chunks"]
+            doc.status = "completed"
+            db.commit()
+        print(f"✅ Re-indexed document {document_id}: {summary}")
+
+    except Exception as e:
+        print(f"❌ Error re-indexing document {document_id}: {e}")
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+        doc = db.query(Document).filter(Document.id == document_id).first()
+        if doc:
+            doc.status = "failed"
+            db.commit()
+
 # ── UPDATED: Upload endpoint with scope ──────────────────────────────────────
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(
@@ -300,6 +333,58 @@ async def delete_document(
             raise HTTPException(404, "Document not found in shared database")
         return {"message": "Document deleted from shared database", "scope": "shared"}
 
+@router.put("/{document_id}", response_model=DocumentResponse)
+async def replace_document(
+    document_id: UUID,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Upload a new version of a local document; only changed chunks are re-indexed"""
+    doc = db.query(Document).filter(
+        Document.id == document_id,
+        Document.owner_id == current_user.id
+    ).first()
+
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    new_ext = os.path.splitext(file.filename)[1].lower()
+    if new_ext != os.path.splitext(doc.file_path)[1].lower():
+        raise HTTPException(status_code=400, detail="Replacement must have the same file type")
+    if new_ext in ['.png', '.jpg', '.jpeg', '.bmp', '.tiff']:
+        raise HTTPException(status_code=400, detail="Images cannot be re-indexed in place; upload a new document")
+
+    # Staged next to the original (same extension, so the same loader);
+    # the original stays untouched until the new version is indexed.
+    base, ext = os.path.splitext(doc.file_path)
+    staged_path = f"{base}.replacing-{uuid.uuid4().hex[:8]}{ext}"
+    with open(staged_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+    if os.path.getsize(staged_path) > MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+        os.remove(staged_path)
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Max size: {MAX_UPLOAD_SIZE_MB}MB"
+        )
+
+    doc.status = "processing"
+    db.commit()
+
+    background_tasks.add_task(reindex_document_task, doc.id, doc.file_path, staged_path, db)
+
+    return DocumentResponse(
+        id=doc.id,
+        title=doc.title,
+        filename=doc.filename,
+        chunk_count=doc.chunk_count,
+        status=doc.status,
+        uploaded_at=doc.uploaded_at.isoformat(),
+        scope="local"
+    )
+
 @router.get("/{document_id}/status")
 def get_document_status(
     document_id: UUID,
@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Dict
 from backend.db.database import get_db
-from backend.services.rag_service import rag_service
+from backend.services.rag_manager import rag_manager
 from backend.services.ollama_service import ollama_service
 from backend.routers.auth import get_current_admin_user
 from backend.core.models import User, QueryMetrics
@@ -46,11 +46,16 @@ async def evaluate_rag_system(
     total_time = 0
     successful_retrievals = 0
     
-    for question in questions:
+    # Retrieve for every question in one batch; its cost is shared evenly
+    retrieval_start = time.time()
+    all_search_results = await rag_manager.search_many(
+        [question.question for question in questions], k=5, scope="local"
+    )
+    retrieval_ms_each = (time.time() - retrieval_start) * 1000 / len(questions) if questions else 0
+    
+    for question, search_results in zip(questions, all_search_results):
         start_time = time.time()
         
-        # Perform RAG query
-        search_results = await rag_service.search(query=question.question, k=5)
         context_docs = [result["content"] for result in search_results]
         
         if context_docs:
@@ -63,7 +68,7 @@ async def evaluate_rag_system(
             chat_history=[]
         )
         
-        response_time = int((time.time() - start_time) * 1000)
+        response_time = int((time.time() - start_time) * 1000 + retrieval_ms_each)
         total_time += response_time
         
         # Calculate keyword match score
@@ -156,12 +161,12 @@ async def test_retrieval_quality(
     
     results = []
     
-    for query in test_queries:
-        # Get search results with scores
-        scored_results = await rag_service.search_with_scores(query=query, k=5)
-        
+    # One batched retrieval for all queries; results carry relevance_score
+    all_scored_results = await rag_manager.search_many(test_queries, k=5, scope="local")
+    
+    for query, scored_results in zip(test_queries, all_scored_results):
         if scored_results:
-            scores = [score for _, score in scored_results]
+            scores = [r["relevance_score"] for r in scored_results]
             avg_score = sum(scores) / len(scores)
             
             results.append({
@@ -214,17 +219,21 @@ async def compare_with_baseline(
     
     comparisons = []
     
-    for question in sample_questions:
+    # Retrieve for every question in one batch; its cost is shared evenly
+    retrieval_start = time.time()
+    all_search_results = await rag_manager.search_many(sample_questions, k=3, scope="local")
+    retrieval_ms_each = (time.time() - retrieval_start) * 1000 / len(sample_questions) if sample_questions else 0
+    
+    for question, search_results in zip(sample_questions, all_search_results):
         # RAG response
         rag_start = time.time()
-        search_results = await rag_service.search(query=question, k=3)
         context_docs = [result["content"] for result in search_results]
         rag_answer = await ollama_service.generate_with_context(
             question=question,
             context=context_docs,
             chat_history=[]
         )
-        rag_time = int((time.time() - rag_start) * 1000)
+        rag_time = int((time.time() - rag_start) * 1000 + retrieval_ms_each)
         
         # Non-RAG response
         norag_start = time.time()
@@ -30,14 +30,14 @@ async def get_vector_stats(
         return {"error": "RAG service not initialized"}
     
     try:
-        # Get ChromaDB collection
-        collection = rag_service.vectorstore._collection
+        # Get the vector store (Chroma or flat index)
+        backend = rag_service.backend
         
         # Get total count
-        total_chunks = collection.count()
+        total_chunks = backend.count()
         
         # Get sample data (first 5 chunks)
-        results = collection.get(
+        results = backend.get(
             limit=5,
             include=['embeddings', 'documents', 'metadatas']
         )
@@ -71,7 +71,8 @@ async def get_vector_stats(
             "total_chunks": total_chunks,
             "unique_documents": len(unique_docs),
             "embedding_dimension": embedding_dim,
-            "embedding_model": "sentence-transformers/all-MiniLM-L6-v2",
+            "embedding_model": rag_service.embedding_model,
+            "vector_backend": backend.name,
             "persist_directory": rag_service.persist_directory,
             "sample_chunks": sample_chunks
         }
@@ -90,26 +91,18 @@ async def test_vector_search(
         raise HTTPException(status_code=500, detail="RAG service not initialized")
     
     try:
-        # Perform search
+        # One retrieval pass returns content, metadata and similarity together
         results = await rag_service.search(
             query=request.query,
             k=request.k
         )
         
-        # Get similarity scores
-        scored_results = await rag_service.search_with_scores(
-            query=request.query,
-            k=request.k
-        )
-        
-        # Format results with scores
         formatted_results = []
         for i, result in enumerate(results):
-            score = scored_results[i][1] if i < len(scored_results) else 0
             formatted_results.append({
                 'rank': i + 1,
                 'content': result['content'],
-                'similarity_score': round(score, 4),
+                'similarity_score': result.get('relevance_score'),
                 'metadata': result['metadata'],
                 'source': result['source']
             })
@@ -134,10 +127,10 @@ async def get_document_chunks(
         raise HTTPException(status_code=500, detail="RAG service not initialized")
     
     try:
-        collection = rag_service.vectorstore._collection
+        backend = rag_service.backend
         
         # Get all chunks for this document
-        results = collection.get(
+        results = backend.get(
             where={"document_id": document_id},
             include=['documents', 'metadatas', 'embeddings']
         )
@@ -216,9 +209,9 @@ async def visualize_embeddings(
         raise HTTPException(status_code=500, detail="RAG service not initialized")
     
     try:
-        collection = rag_service.vectorstore._collection
+        backend = rag_service.backend
         
-        results = collection.get(
+        results = backend.get(
             where={"document_id": document_id},
             include=['embeddings', 'documents', 'metadatas']
         )
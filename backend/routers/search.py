@@ -0,0 +1,55 @@
+"""Batch retrieval endpoint — many queries per round trip"""
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from typing import List, Optional, Literal
+import time
+from backend.services.rag_manager import rag_manager
+from backend.routers.auth import get_current_user
+
+router = APIRouter()
+
+# Upper bound on queries per request, so one call can't monopolize the query lane
+MAX_BATCH_QUERIES = 256
+
+# ── Schemas ───────────────────────────────────────────────────────────────────
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = 5
+    db_scope: Literal["local", "shared", "both"] = "local"
+    document_id: Optional[str] = None
+
+
+# ── Endpoints ─────────────────────────────────────────────────────────────────
+
+@router.post("/batch")
+async def batch_search(
+    request: BatchSearchRequest,
+    current_user = Depends(get_current_user)
+):
+    """Run many searches in one request; results are returned in query order"""
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries ({len(request.queries)}); the limit is {MAX_BATCH_QUERIES}"
+        )
+    if request.db_scope == "local" and not rag_manager.local.is_initialized:
+        raise HTTPException(status_code=503, detail="RAG service not initialized")
+
+    start_time = time.time()
+    results = await rag_manager.search_many(
+        queries=request.queries,
+        k=request.k,
+        filter_metadata={"document_id": request.document_id} if request.document_id else None,
+        scope=request.db_scope,
+    )
+
+    return {
+        "db_scope": request.db_scope,
+        "total_queries": len(request.queries),
+        "elapsed_ms": int((time.time() - start_time) * 1000),
+        "results": [
+            {"query": query, "results": hits}
+            for query, hits in zip(request.queries, results)
+        ],
+    }
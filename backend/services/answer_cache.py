@@ -0,0 +1,178 @@
+"""
+answer_cache.py
+───────────────
+Bounded in-process cache of LLM answers.
+
+  • LRU order with a byte budget — the least recently used answers go first
+    once the cached text would exceed `max_bytes`
+  • TTL — an expired answer is never returned, and is actually removed: on
+    lookup, when it reaches the LRU tail, or by the background sweeper
+  • namespaces — one per search scope ("local", "shared", "both"), so the
+    same prompt asked against different stores never shares an answer and a
+    whole scope can be dropped at once; all namespaces share one budget
+  • counters — hits, misses, evictions and expirations per namespace
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Per-entry bookkeeping on top of the key and value strings (OrderedDict
+# node, tuple key, entry record) — a rough figure, only used for budgeting.
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+class _Entry(NamedTuple):
+    value: str
+    expires_at: float
+    size: int
+
+
+class _Counters:
+    __slots__ = ("hits", "misses", "evictions", "expirations", "entries", "bytes")
+
+    def __init__(self):
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.entries = self.bytes = 0
+
+    def as_dict(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class AnswerCache:
+    def __init__(self, max_bytes: int, ttl_seconds: float, sweep_interval: float = 60.0):
+        self.max_bytes = max(1, max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self.bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._namespaces: Dict[str, _Counters] = {}
+        self._lock = threading.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def _ns(self, namespace: str) -> _Counters:
+        counters = self._namespaces.get(namespace)
+        if counters is None:
+            counters = self._namespaces[namespace] = _Counters()
+        return counters
+
+    # ── Lookups / writes ──────────────────────────────────────────────────────
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        with self._lock:
+            counters = self._ns(namespace)
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove_locked((namespace, key), entry)
+                counters.expirations += 1
+                entry = None
+            if entry is None:
+                counters.misses += 1
+                return None
+            self._entries.move_to_end((namespace, key))
+            counters.hits += 1
+            return entry.value
+
+    def put(self, namespace: str, key: str, value: str) -> None:
+        size = sys.getsizeof(key) + sys.getsizeof(value) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return                      # would evict everything else; not worth it
+        with self._lock:
+            old = self._entries.get((namespace, key))
+            if old is not None:
+                self._remove_locked((namespace, key), old)
+            self._entries[(namespace, key)] = _Entry(value, time.monotonic() + self.ttl_seconds, size)
+            counters = self._ns(namespace)
+            counters.entries += 1
+            counters.bytes += size
+            self.bytes += size
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        while self.bytes > self.max_bytes and self._entries:
+            (namespace, key), entry = next(iter(self._entries.items()))
+            self._remove_locked((namespace, key), entry)
+            counters = self._ns(namespace)
+            if entry.expires_at <= time.monotonic():
+                counters.expirations += 1
+            else:
+                counters.evictions += 1
+
+    def _remove_locked(self, full_key: Tuple[str, str], entry: _Entry) -> None:
+        del self._entries[full_key]
+        counters = self._ns(full_key[0])
+        counters.entries -= 1
+        counters.bytes -= entry.size
+        self.bytes -= entry.size
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        """Drop one namespace (or everything); returns the entries removed."""
+        with self._lock:
+            doomed = [
+                (full_key, entry) for full_key, entry in self._entries.items()
+                if namespace is None or full_key[0] == namespace
+            ]
+            for full_key, entry in doomed:
+                self._remove_locked(full_key, entry)
+            return len(doomed)
+
+    # ── Expiry sweeping ───────────────────────────────────────────────────────
+
+    def sweep(self) -> int:
+        """Remove every expired entry; returns how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [(k, e) for k, e in self._entries.items() if e.expires_at <= now]
+            for full_key, entry in expired:
+                self._remove_locked(full_key, entry)
+                self._ns(full_key[0]).expirations += 1
+        return len(expired)
+
+    def start_sweeper(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            removed = self.sweep()
+            if removed:
+                print(f"🧹 Answer cache: {removed} expired entries removed")
+
+    # ── Stats ─────────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict:
+        with self._lock:
+            namespaces = {name: counters.as_dict() for name, counters in self._namespaces.items()}
+            totals = _Counters()
+            for counters in self._namespaces.values():
+                for field in _Counters.__slots__:
+                    setattr(totals, field, getattr(totals, field) + getattr(counters, field))
+            return {
+                **totals.as_dict(),
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "sweeper_running": self._sweeper is not None and not self._sweeper.done(),
+                "namespaces": namespaces,
+            }
@@ -0,0 +1,112 @@
+"""Sequence-numbered log of vector-store changes
+
+The shared RAG server records every chunk write/delete here so replicas can
+pull just what changed since their last sync (GET /changes?since=<seq>).
+
+Only the latest operation per chunk id matters to a replica, so superseded
+entries are skipped when reading and dropped on compaction; the log stays
+proportional to the number of chunks, not to the write history. Entries
+hold ids only — content and vectors are read from the index when served.
+
+`epoch` identifies one continuous history. A fresh log (new server, lost
+log file) gets a new epoch, which tells replicas to resync from scratch.
+"""
+import bisect
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Iterable, List, Tuple
+
+
+class Changelog:
+    def __init__(self, path: str):
+        self.path = path
+        self.epoch = uuid.uuid4().hex
+        self.head = 0
+        self._seqs: List[int] = []
+        self._entries: List[Tuple[int, str, str]] = []    # (seq, op, chunk id)
+        self._latest: Dict[str, int] = {}                  # chunk id → live seq
+        self._lock = threading.Lock()
+        self.dirty = False
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def record(self, op: str, ids: Iterable[str]) -> None:
+        """Append one entry per id; op is "upsert" or "delete"."""
+        with self._lock:
+            for chunk_id in ids:
+                self.head += 1
+                self._seqs.append(self.head)
+                self._entries.append((self.head, op, chunk_id))
+                self._latest[chunk_id] = self.head
+            self.dirty = True
+            if len(self._entries) > 2 * len(self._latest) + 1024:
+                self._compact_locked()
+
+    def _compact_locked(self) -> None:
+        live = [entry for entry in self._entries if self._latest.get(entry[2]) == entry[0]]
+        self._entries = live
+        self._seqs = [entry[0] for entry in live]
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def since(self, seq: int, limit: int) -> Tuple[List[Tuple[int, str, str]], int, bool]:
+        """
+        Live entries after `seq`, oldest first, at most `limit` of them.
+
+        Returns (entries, next, has_more); pass `next` as `seq` next time.
+        """
+        with self._lock:
+            page = []
+            position = bisect.bisect_right(self._seqs, seq)
+            while position < len(self._entries) and len(page) < limit:
+                entry = self._entries[position]
+                if self._latest.get(entry[2]) == entry[0]:
+                    page.append(entry)
+                position += 1
+            # May be one empty page early if only superseded entries remain.
+            has_more = len(page) >= limit and position < len(self._entries)
+            next_seq = page[-1][0] if has_more else self.head
+            return page, next_seq, has_more
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "epoch": self.epoch,
+                "version": self.head,
+                "tracked_chunks": len(self._latest),
+                "entries": len(self._entries),
+            }
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.dirty:
+                return
+            self._compact_locked()
+            payload = {"epoch": self.epoch, "head": self.head, "entries": self._entries}
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+    def load(self) -> bool:
+        """Load from disk; returns False when there is no saved log yet."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            payload = json.load(f)
+        with self._lock:
+            self.epoch = payload["epoch"]
+            self.head = payload["head"]
+            self._entries = [tuple(entry) for entry in payload["entries"]]
+            self._seqs = [entry[0] for entry in self._entries]
+            self._latest = {entry[2]: entry[0] for entry in self._entries}
+            self.dirty = False
+        return True
@@ -0,0 +1,112 @@
+"""Streaming document loaders for ingestion
+
+Instead of materializing a whole document (`PyPDFLoader(...).load()`), these
+loaders yield one page or text section at a time (PDF, TXT/MD, DOCX).
+`iter_chunks` splits each piece as it arrives, so ingestion memory is bounded
+by the embedding batch size rather than by the size of the document.
+"""
+from typing import Dict, Iterator, Optional
+from langchain.schema import Document
+from backend.services.embedding_cache import chunk_hash
+
+# Text files are cut into sections of roughly this many characters, always at
+# a blank line, before being handed to the splitter.
+TEXT_SECTION_CHARS = 64 * 1024
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[Document]:
+    """One Document per PDF page (same metadata as PyPDFLoader)."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    for page_number, page in enumerate(reader.pages):
+        yield Document(
+            page_content=page.extract_text() or "",
+            metadata={"source": file_path, "page": page_number},
+        )
+
+
+def iter_text_sections(file_path: str, section_chars: int = TEXT_SECTION_CHARS) -> Iterator[Document]:
+    """Paragraph-aligned sections of a text/markdown file."""
+    buffer = []
+    size = 0
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            buffer.append(line)
+            size += len(line)
+            if size >= section_chars and not line.strip():
+                yield Document(page_content="".join(buffer), metadata={"source": file_path})
+                buffer, size = [], 0
+    if buffer:
+        yield Document(page_content="".join(buffer), metadata={"source": file_path})
+
+
+def _docx_blocks(file_path: str) -> Iterator[str]:
+    """Paragraph and table text of a .docx in document order."""
+    import docx
+    from docx.table import Table, _Cell
+    from docx.text.paragraph import Paragraph
+
+    document = docx.Document(file_path)
+    body = document.element.body
+    # One pass over the body XML; no `document.paragraphs` / `document.tables`
+    # proxy lists, which would re-walk the tree and lose the interleaving.
+    for child in body.iterchildren():
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            text = Paragraph(child, body).text
+            if text.strip():
+                yield text
+        elif tag == "tbl":
+            table = Table(child, body)
+            for tr in child.tr_lst:
+                # Walk <w:tc> directly — row.cells repeats merged cells.
+                cells = [_Cell(tc, table).text.strip() for tc in tr.tc_lst]
+                if any(cells):
+                    yield " | ".join(cells)
+
+
+def iter_docx_sections(file_path: str, section_chars: int = TEXT_SECTION_CHARS) -> Iterator[Document]:
+    """Paragraph-aligned sections of a Word document, tables flattened to rows."""
+    buffer = []
+    size = 0
+    for block in _docx_blocks(file_path):
+        buffer.append(block)
+        size += len(block) + 2
+        if size >= section_chars:
+            yield Document(page_content="\n\n".join(buffer), metadata={"source": file_path})
+            buffer, size = [], 0
+    if buffer:
+        yield Document(page_content="\n\n".join(buffer), metadata={"source": file_path})
+
+
+def open_document(file_path: str) -> Iterator[Document]:
+    """Pick the streaming loader for a file; raises for unsupported types."""
+    if file_path.endswith('.pdf'):
+        return iter_pdf_pages(file_path)
+    if file_path.endswith(('.txt', '.md')):
+        return iter_text_sections(file_path)
+    if file_path.endswith('.docx'):
+        return iter_docx_sections(file_path)
+    raise ValueError(f"Unsupported file type: {file_path}")
+
+
+def iter_chunks(
+    file_path: str,
+    text_splitter,
+    document_id: str,
+    metadata: Optional[Dict] = None,
+) -> Iterator[Document]:
+    """Split pages/sections as they stream in and stamp chunk metadata."""
+    chunk_index = 0
+    for piece in open_document(file_path):
+        for chunk in text_splitter.split_documents([piece]):
+            chunk.metadata.update({
+                "document_id": document_id,
+                "chunk_index": chunk_index,
+                "source": file_path,
+                "content_hash": chunk_hash(chunk.page_content),
+                **(metadata or {})
+            })
+            chunk_index += 1
+            yield chunk
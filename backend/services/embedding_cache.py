@@ -0,0 +1,215 @@
+"""Persistent, content-addressed embedding cache
+
+Chunk vectors are stored as float32 blobs in SQLite, keyed by
+(model name, SHA-256 of the normalized chunk text). Re-uploading a manual
+whose text hasn't changed then costs a lookup instead of an encoder pass.
+
+Normalization only touches things the tokenizer ignores anyway (Unicode
+form and runs of whitespace), so a hit returns the same vector the model
+would have produced.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_chunk(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(normalize_chunk(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed (model, chunk hash) → vector store with size-based eviction.
+
+    When the stored vectors exceed `max_bytes`, the least recently used rows
+    are dropped until the cache is back under ~90% of the budget.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model     TEXT NOT NULL,
+                hash      TEXT NOT NULL,
+                vector    BLOB NOT NULL,
+                size      INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_lru ON embeddings(last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Vectors for `texts` in order; None where the cache has no entry."""
+        hashes = [chunk_hash(t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            unique = list(set(hashes))
+            # SQLite caps bound parameters; look up in slices.
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({marks})",
+                    [model, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[h] = vec.tolist()
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(time.time(), model, h) for h in found],
+                )
+                self._conn.commit()
+
+            results = [found.get(h) for h in hashes]
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]) -> None:
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = array("f", vector).tobytes()
+            rows.append((model, chunk_hash(text), blob, len(blob), now))
+
+        with self._lock:
+            for row in rows:
+                existing = self._conn.execute(
+                    "SELECT size FROM embeddings WHERE model = ? AND hash = ?", row[:2]
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, hash, vector, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    row,
+                )
+                self._total_bytes += row[3] - (existing[0] if existing else 0)
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT model, hash, size FROM embeddings ORDER BY last_used LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for model, h, size in rows:
+                self._conn.execute("DELETE FROM embeddings WHERE model = ? AND hash = ?", (model, h))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= target:
+                    break
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "size_mb": round(self._total_bytes / (1024 * 1024), 2),
+                "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class QueryEmbeddingLRU:
+    """
+    Bounded in-process LRU of query embeddings.
+
+    Keys are normalized query strings; when the model's tokenizer lower-cases
+    its input anyway (`casefold=True`), keys are case-folded as well so
+    "How do I auth?" and "how do I auth?" share one entry.
+    """
+
+    def __init__(self, max_entries: int, casefold: bool = False):
+        self.max_entries = max(1, max_entries)
+        self.casefold = casefold
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, query: str) -> str:
+        normalized = normalize_chunk(query)
+        return normalized.casefold() if self.casefold else normalized
+
+    def get(self, query: str) -> Optional[List[float]]:
+        key = self.key(query)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def peek(self, query: str) -> Optional[List[float]]:
+        """Like get(), without counting a hit/miss or refreshing LRU order."""
+        with self._lock:
+            return self._entries.get(self.key(query))
+
+    def put(self, query: str, vector: List[float]) -> None:
+        key = self.key(query)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -20,7 +20,7 @@ from sqlalchemy.sql import func
 from sqlalchemy.orm import Session
 import uuid
 import math
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from backend.db.database import Base
 
 
@@ -43,7 +43,7 @@ class FeedbackRecord(Base):
     # Query info
     query          = Column(Text, nullable=False)
     query_keywords = Column(JSON, default=list)   # top 5 words for clustering
-    db_scope       = Column(String(20), default="local")   # "local" | "shared"
+    db_scope       = Column(String(20), default="local")   # "local" | "shared" | "both"
     
     # Confidence (computed from ChromaDB similarity)
     raw_similarity_scores = Column(JSON, default=list)   # list of floats [0..1]
@@ -193,20 +193,10 @@ class FeedbackLearningService:
         Confidence is computed here; trust weight is looked up from cluster history.
         Returns the saved record (caller gets the id to send to frontend).
         """
-        conf = compute_confidence(similarity_scores, num_sources)
         keywords = extract_keywords(query)
-
-        # Look up average cluster trust for these keywords
-        cluster_trust = self._get_cluster_trust(db, keywords)
-        adjusted_conf = apply_trust_weight(conf["score"], cluster_trust)
-
-        # Re-label after adjustment
-        if adjusted_conf >= 0.70:
-            label = "high"
-        elif adjusted_conf >= 0.45:
-            label = "medium"
-        else:
-            label = "low"
+        adjusted_conf, label, cluster_trust = self.preview_confidence(
+            db, query, similarity_scores, num_sources, keywords
+        )
 
         record = FeedbackRecord(
             message_id=message_id,
@@ -225,6 +215,35 @@ class FeedbackLearningService:
         db.refresh(record)
         return record
 
+    def preview_confidence(
+        self,
+        db: Session,
+        query: str,
+        similarity_scores: List[float],
+        num_sources: int,
+        keywords: Optional[List[str]] = None,
+    ) -> Tuple[float, str, float]:
+        """
+        (confidence, label, trust weight) exactly as record_response would
+        store them, without saving anything — streaming sends this up front.
+        """
+        conf = compute_confidence(similarity_scores, num_sources)
+        if keywords is None:
+            keywords = extract_keywords(query)
+
+        # Look up average cluster trust for these keywords
+        cluster_trust = self._get_cluster_trust(db, keywords)
+        adjusted_conf = apply_trust_weight(conf["score"], cluster_trust)
+
+        # Re-label after adjustment
+        if adjusted_conf >= 0.70:
+            label = "high"
+        elif adjusted_conf >= 0.45:
+            label = "medium"
+        else:
+            label = "low"
+        return adjusted_conf, label, cluster_trust
+
     # ── apply user feedback ───────────────────────────────────────────────────
 
     def apply_feedback(
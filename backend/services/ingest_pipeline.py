@@ -0,0 +1,117 @@
+"""Batched, multi-core embedding pipeline for document ingestion
+
+Chunks are grouped into fixed-size batches. Each batch is embedded on a
+worker (threads sharing one model, or one model per process) and written to
+the vector store as soon as it is ready, so at most `max_in_flight` batches
+of vectors are ever held in memory at once.
+
+This module is imported by spawned worker processes — keep its top-level
+imports light (no langchain, no torch).
+"""
+import asyncio
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, Iterator, List
+
+
+@dataclass
+class ChunkBatch:
+    """One batch of chunks on its way into the vector store."""
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[Dict]
+    embeddings: List[List[float]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def batched_chunks(chunks: Iterable[Any], batch_size: int) -> Iterator[ChunkBatch]:
+    """Group langchain Documents into ChunkBatch objects of `batch_size`."""
+    batch = ChunkBatch(ids=[], texts=[], metadatas=[])
+    for chunk in chunks:
+        batch.ids.append(str(uuid.uuid4()))
+        batch.texts.append(chunk.page_content)
+        batch.metadatas.append(dict(chunk.metadata))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = ChunkBatch(ids=[], texts=[], metadatas=[])
+    if len(batch):
+        yield batch
+
+
+# ── Process-pool worker ───────────────────────────────────────────────────────
+# Each worker process loads its own copy of the model once and pins torch to a
+# single thread, so N processes use N cores without oversubscribing.
+
+_worker_model = None
+
+
+def embed_in_worker(model_name: str, texts: List[str]) -> List[List[float]]:
+    global _worker_model
+    if _worker_model is None:
+        import torch
+        from sentence_transformers import SentenceTransformer
+        torch.set_num_threads(1)
+        _worker_model = SentenceTransformer(model_name, device="cpu")
+    vectors = _worker_model.encode(texts, batch_size=len(texts), normalize_embeddings=True)
+    return vectors.tolist()
+
+
+# ── Pipeline ──────────────────────────────────────────────────────────────────
+
+class IngestPipeline:
+    """
+    Drives embed → write for a stream of chunk batches.
+
+    embed(texts) -> vectors   runs on the embedding workers
+    write(batch)              persists one embedded batch
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+        write: Callable[[ChunkBatch], Awaitable[None]],
+        max_in_flight: int,
+    ):
+        self.embed = embed
+        self.write = write
+        self.max_in_flight = max(1, max_in_flight)
+
+    async def run(self, batches: AsyncIterable[ChunkBatch]) -> int:
+        """
+        Embed and write every batch; returns the number of chunks written.
+
+        Batches are pulled lazily: the next one is only requested once there
+        is room in flight, so the producer (page loading + splitting) never
+        runs more than `max_in_flight` batches ahead of the writer.
+        """
+        written = 0
+        in_flight: set = set()
+        try:
+            async for batch in batches:
+                if len(in_flight) >= self.max_in_flight:
+                    written += await self._drain(in_flight)
+                in_flight.add(asyncio.create_task(self._embed_batch(batch)))
+            while in_flight:
+                written += await self._drain(in_flight)
+        except BaseException:
+            for task in in_flight:
+                task.cancel()
+            raise
+        return written
+
+    async def _embed_batch(self, batch: ChunkBatch) -> ChunkBatch:
+        batch.embeddings = await self.embed(batch.texts)
+        return batch
+
+    async def _drain(self, in_flight: set) -> int:
+        """Wait for the next finished batch(es), write them, drop their vectors."""
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        written = 0
+        for task in done:
+            in_flight.discard(task)
+            batch = task.result()
+            await self.write(batch)
+            written += len(batch)
+        return written
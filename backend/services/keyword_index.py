@@ -0,0 +1,166 @@
+"""Keyword (BM25) inverted index kept alongside the vector store
+
+MiniLM similarity is good at intent but poor at exact strings — function
+names, error codes, config keys. This index scores chunks with BM25 over
+identifier-aware tokens so those queries get precise hits; RAGService fuses
+its ranking with the vector ranking (reciprocal-rank fusion).
+
+The index is plain Python dicts guarded by a lock and persisted as JSON next
+to the Chroma directory.
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Whole identifiers, keeping inner . - : / so `spring.datasource.url`,
+# `ERR_CONNECTION_REFUSED` and `max-retries` survive as single tokens.
+_TOKEN = re.compile(r"[A-Za-z0-9_](?:[A-Za-z0-9_.\-:/]*[A-Za-z0-9_])?")
+_SEPARATORS = re.compile(r"[._\-:/]+")
+_CAMEL = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased identifier tokens plus their snake/camel/dotted parts."""
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        token = match.group(0)
+        tokens.append(token.lower())
+        parts = [
+            piece.lower()
+            for part in _SEPARATORS.split(token) if part
+            for piece in _CAMEL.findall(part)
+        ]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class KeywordIndex:
+    """BM25 inverted index over chunk ids."""
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._chunk_terms: Dict[str, List[str]] = {}
+        self._chunk_document: Dict[str, str] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self.dirty = False
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def add_many(self, ids: List[str], texts: List[str], metadatas: List[Dict]) -> None:
+        with self._lock:
+            for chunk_id, text, meta in zip(ids, texts, metadatas):
+                if chunk_id in self._lengths:
+                    self._remove_locked(chunk_id)
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    self._postings.setdefault(term, {})[chunk_id] = tf
+                length = sum(counts.values())
+                self._chunk_terms[chunk_id] = list(counts)
+                self._lengths[chunk_id] = length
+                self._total_length += length
+                self._chunk_document[chunk_id] = (meta or {}).get("document_id", "")
+            self.dirty = True
+
+    def remove_ids(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for chunk_id in ids:
+                if chunk_id in self._lengths:
+                    self._remove_locked(chunk_id)
+            self.dirty = True
+
+    def remove_document(self, document_id: str) -> None:
+        with self._lock:
+            self.remove_ids(
+                [cid for cid, doc in self._chunk_document.items() if doc == document_id]
+            )
+
+    def _remove_locked(self, chunk_id: str) -> None:
+        for term in self._chunk_terms.pop(chunk_id, []):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+        self._chunk_document.pop(chunk_id, None)
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def search(self, query: str, k: int, document_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, bm25_score), optionally limited to one document."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._lengths)
+            if not n or not terms:
+                return []
+            avg_length = self._total_length / n
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    if document_id and self._chunk_document.get(chunk_id) != document_id:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.dirty:
+                return
+            payload = {
+                "postings": self._postings,
+                "lengths": self._lengths,
+                "chunk_document": self._chunk_document,
+            }
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+    def load(self) -> bool:
+        """Load from disk; returns False when there is no saved index yet."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            payload = json.load(f)
+        with self._lock:
+            self._postings = payload["postings"]
+            self._lengths = payload["lengths"]
+            self._chunk_document = payload["chunk_document"]
+            # Per-chunk term lists aren't saved; rebuild them from the postings.
+            self._chunk_terms = {}
+            for term, postings in self._postings.items():
+                for chunk_id in postings:
+                    self._chunk_terms.setdefault(chunk_id, []).append(term)
+            self._total_length = sum(self._lengths.values())
+            self.dirty = False
+        return True
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked id lists: score(id) = Σ 1 / (k + rank)."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
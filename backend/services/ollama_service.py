@@ -3,38 +3,79 @@ import httpx
 import json
 import hashlib
 import time
-from typing import Optional, List, Dict, AsyncGenerator
-from backend.core.config import OLLAMA_BASE_URL, OLLAMA_MODEL
+from collections import deque
+from typing import Optional, List, Dict, AsyncGenerator, Tuple
+from backend.core.config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MAX_KEEPALIVE,
+    OLLAMA_KEEPALIVE_EXPIRY,
+    ANSWER_CACHE_MAX_MB,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_SWEEP_SECONDS,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MIN_CONTEXT_OVERLAP,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+)
+from backend.services.answer_cache import AnswerCache
+from backend.services.embedding_cache import chunk_hash
+from backend.services.semantic_cache import SemanticAnswerCache
+from backend.services.single_flight import SingleFlight
 
-# ── Simple in-process semantic cache ─────────────────────────────────────────
-# Key: SHA256(scope + model + full_prompt)  →  (answer, timestamp)
+# ── Answer cache ──────────────────────────────────────────────────────────────
+# Namespace: db_scope · key: SHA256(model + full prompt) → answer
 #
-# FIX: The cache key previously only used the first 300 chars of the prompt.
-# This caused the same question asked with different db_scope (local vs shared)
-# to return the cached answer from whichever scope was asked FIRST — completely
-# ignoring the new context. The fix: include db_scope in the key + use the
-# full prompt so different context always produces a different cache entry.
+# The scope is its own namespace so the same question asked against local
+# vs shared DBs never returns the answer built from the other scope's
+# context, and the full prompt (not [:300]) ensures different context means
+# a different entry.
 
-_CACHE: dict[str, tuple[str, float]] = {}
-_CACHE_TTL_SECONDS = 3600   # 1 hour — tune as needed
+answer_cache = AnswerCache(
+    max_bytes=int(ANSWER_CACHE_MAX_MB * 1024 * 1024),
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    sweep_interval=ANSWER_CACHE_SWEEP_SECONDS,
+)
 
 
-def _cache_key(model: str, prompt: str, scope: str = "local") -> str:
-    # scope is prepended so local and shared answers never collide
-    # full prompt (not [:300]) ensures different context = different entry
-    raw = f"{scope}||{model}||{prompt}"
+# In front of it, generate_with_context looks answers up by the question's
+# embedding (the one retrieval already computed) — see semantic_cache.py.
+semantic_cache = SemanticAnswerCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    min_context_overlap=SEMANTIC_CACHE_MIN_CONTEXT_OVERLAP,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+)
+
+
+def _cache_key(model: str, prompt: str) -> str:
+    raw = f"{model}||{prompt}"
     return hashlib.sha256(raw.encode()).hexdigest()
 
 
-def _cache_get(key: str) -> Optional[str]:
-    entry = _CACHE.get(key)
-    if entry and (time.time() - entry[1]) < _CACHE_TTL_SECONDS:
-        return entry[0]
-    return None
+# ── Connection metrics ────────────────────────────────────────────────────────
+
+class _ConnectTimer:
+    """
+    httpcore trace hook for one request: time spent opening a new TCP
+    connection (and TLS, if any). Stays 0 when a pooled connection is reused.
+    """
 
+    def __init__(self):
+        self.opened = False
+        self.seconds = 0.0
+        self._started: Optional[float] = None
 
-def _cache_set(key: str, value: str) -> None:
-    _CACHE[key] = (value, time.time())
+    async def __call__(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.started":
+            self.opened = True
+            self._started = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._started is not None:
+                self.seconds = time.perf_counter() - self._started
 
 
 # ── Service ───────────────────────────────────────────────────────────────────
@@ -44,16 +85,88 @@ class OllamaService:
         self.base_url = OLLAMA_BASE_URL
         self.model = OLLAMA_MODEL
         self.is_connected = False
+        # Long-lived pooled client — created in the FastAPI lifespan (start),
+        # or lazily on first use outside the app (scripts, notebooks).
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.requests = 0
+        self.connections_opened = 0
+        self.connect_seconds = 0.0
+        self._recent_connect_ms: deque = deque(maxlen=100)
+        # Identical prompts already being generated are awaited, not re-sent.
+        self.generations = SingleFlight("ollama.generate")
+
+    # ── HTTP client ───────────────────────────────────────────────────────────
+
+    async def start(self):
+        """Create the shared HTTP client and start cache sweeping; call once at app startup."""
+        answer_cache.start_sweeper()
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+                    keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+                ),
+            )
+
+    async def close(self):
+        await answer_cache.stop_sweeper()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    def _start_request(self) -> _ConnectTimer:
+        self.requests += 1
+        return _ConnectTimer()
+
+    def _record(self, timer: _ConnectTimer) -> None:
+        if timer.opened:
+            self.connections_opened += 1
+            self.connect_seconds += timer.seconds
+        self._recent_connect_ms.append(timer.seconds * 1000)
+
+    def connection_stats(self) -> dict:
+        """Connection reuse: after warm-up, recent connect time should be ~0."""
+        recent = list(self._recent_connect_ms)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reused": self.requests - self.connections_opened,
+            "avg_connect_ms_per_new_connection": round(
+                self.connect_seconds * 1000 / self.connections_opened, 2
+            ) if self.connections_opened else 0.0,
+            "avg_connect_ms_recent": round(sum(recent) / len(recent), 2) if recent else 0.0,
+            "last_connect_ms": round(recent[-1], 2) if recent else None,
+            "pool": {
+                "max_connections": OLLAMA_MAX_CONNECTIONS,
+                "max_keepalive": OLLAMA_MAX_KEEPALIVE,
+                "keepalive_expiry_s": OLLAMA_KEEPALIVE_EXPIRY,
+                "connect_timeout_s": OLLAMA_CONNECT_TIMEOUT,
+                "read_timeout_s": OLLAMA_READ_TIMEOUT,
+            },
+        }
 
     async def check_connection(self) -> bool:
         try:
-            async with httpx.AsyncClient() as client:
-                r = await client.get(f"{self.base_url}/api/tags", timeout=5.0)
-                if r.status_code == 200:
-                    self.is_connected = True
-                    models = r.json().get("models", [])
-                    print(f"✅ Ollama connected. Models: {[m['name'] for m in models]}")
-                    return True
+            client = await self._http()
+            timer = self._start_request()
+            try:
+                r = await client.get("/api/tags", timeout=5.0, extensions={"trace": timer})
+            finally:
+                self._record(timer)
+            if r.status_code == 200:
+                self.is_connected = True
+                models = r.json().get("models", [])
+                print(f"✅ Ollama connected. Models: {[m['name'] for m in models]}")
+                return True
         except Exception as e:
             print(f"❌ Ollama not connected: {e}\n💡 Run: ollama serve")
             self.is_connected = False
@@ -84,73 +197,99 @@ class OllamaService:
 
         # Cache check — scope-aware so local and shared never collide
         if use_cache:
-            key = _cache_key(self.model, (system_prompt or "") + prompt, scope=db_scope)
-            cached = _cache_get(key)
+            key = _cache_key(self.model, (system_prompt or "") + prompt)
+            cached = answer_cache.get(db_scope, key)
             if cached:
                 print(f"⚡ Cache hit (scope={db_scope})")
                 return cached
 
-        try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                r = await client.post(f"{self.base_url}/api/generate", json=payload)
+        async def call() -> str:
+            try:
+                client = await self._http()
+                timer = self._start_request()
+                try:
+                    r = await client.post("/api/generate", json=payload, extensions={"trace": timer})
+                finally:
+                    self._record(timer)
                 r.raise_for_status()
                 answer = r.json()["response"]
                 if use_cache:
-                    _cache_set(key, answer)
+                    answer_cache.put(db_scope, key, answer)
                 return answer
-        except Exception as e:
-            raise Exception(f"Ollama generation failed: {str(e)}")
+            except Exception as e:
+                raise Exception(f"Ollama generation failed: {str(e)}")
+
+        if not use_cache:
+            return await call()
+        # Same miss from several users at once → one generation, shared.
+        return await self.generations.run((db_scope, key), call)
 
     async def generate_stream(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
+        max_tokens: int = 400,
+        raise_errors: bool = False,
     ) -> AsyncGenerator[str, None]:
+        """Tokens as Ollama produces them. Errors end the stream with an
+        "Error: …" token, or are raised with raise_errors=True."""
+        try:
+            async for token in self._stream(prompt, system_prompt, temperature, max_tokens):
+                yield token
+        except Exception as e:
+            if raise_errors:
+                raise
+            yield f"Error: {str(e)}"
+
+    async def _stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: float,
+        max_tokens: int,
+    ) -> AsyncGenerator[str, None]:
+        """Tokens as Ollama produces them; errors are raised, not yielded."""
         payload = {
             "model": self.model,
             "prompt": prompt,
             "stream": True,
             "options": {
                 "temperature": temperature,
-                "num_predict": 400,
+                "num_predict": max_tokens,
                 "num_ctx": 2048,
             }
         }
         if system_prompt:
             payload["system"] = system_prompt
 
+        client = await self._http()
+        timer = self._start_request()
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                async with client.stream("POST", f"{self.base_url}/api/generate", json=payload) as r:
-                    async for line in r.aiter_lines():
-                        if line.strip():
-                            try:
-                                data = json.loads(line)
-                                if "response" in data:
-                                    yield data["response"]
-                                if data.get("done", False):
-                                    break
-                            except json.JSONDecodeError:
-                                continue
-        except Exception as e:
-            yield f"Error: {str(e)}"
+            async with client.stream(
+                "POST", "/api/generate", json=payload, extensions={"trace": timer}
+            ) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if line.strip():
+                        try:
+                            data = json.loads(line)
+                            if "response" in data:
+                                yield data["response"]
+                            if data.get("done", False):
+                                break
+                        except json.JSONDecodeError:
+                            continue
+        finally:
+            self._record(timer)
 
-    async def generate_with_context(
+    def _rag_prompt(
         self,
         question: str,
         context: List[str],
         chat_history: Optional[List[Dict]] = None,
-        use_cache: bool = True,
-        db_scope: str = "local",        # ← FIX: scope is now part of cache key
-    ) -> str:
-        """
-        RAG response — concise by default.
-
-        FIX: db_scope is now included in the cache key so that the same
-        question asked against local vs shared DBs never returns a cached
-        answer from the other scope.
-        """
+    ) -> Tuple[str, str]:
+        """(system_prompt, prompt) for a question over retrieved chunks."""
         # Limit context to top 3 chunks to reduce prompt size
         top_context = context[:3]
         context_text = "\n\n".join(
@@ -176,8 +315,38 @@ class OllamaService:
 {f"History:{chr(10)}{history}" if history else ""}
 Q: {question}
 A:"""
+        return system_prompt, prompt
 
-        return await self.generate(
+    async def generate_with_context(
+        self,
+        question: str,
+        context: List[str],
+        chat_history: Optional[List[Dict]] = None,
+        use_cache: bool = True,
+        db_scope: str = "local",        # ← FIX: scope is now part of cache key
+        query_embedding: Optional[List[float]] = None,
+        index_version: Optional[str] = None,
+    ) -> str:
+        """
+        RAG response — concise by default.
+
+        FIX: db_scope is now included in the cache key so that the same
+        question asked against local vs shared DBs never returns a cached
+        answer from the other scope.
+
+        With `query_embedding` and `index_version` (from
+        rag_manager.search_with_version) a close-enough earlier question in the
+        same scope reuses its answer. Only first turns: a follow-up's answer
+        depends on history the cache doesn't see.
+        """
+        semantic = self._semantic_key(context, chat_history, use_cache, query_embedding, index_version)
+        if semantic:
+            cached = self._semantic_lookup(db_scope, index_version, query_embedding, semantic)
+            if cached:
+                return cached
+
+        system_prompt, prompt = self._rag_prompt(question, context, chat_history)
+        answer = await self.generate(
             prompt=prompt,
             system_prompt=system_prompt,
             temperature=0.2,
@@ -185,6 +354,79 @@ A:"""
             use_cache=use_cache,
             db_scope=db_scope,          # ← pass scope through to cache key
         )
+        if semantic:
+            semantic_cache.store(db_scope, index_version, question, query_embedding, semantic, answer)
+        return answer
+
+    async def stream_with_context(
+        self,
+        question: str,
+        context: List[str],
+        chat_history: Optional[List[Dict]] = None,
+        use_cache: bool = True,
+        db_scope: str = "local",
+        query_embedding: Optional[List[float]] = None,
+        index_version: Optional[str] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        generate_with_context, token by token. A cached answer (exact or
+        semantic) arrives as one piece; a fresh one is cached once the
+        stream has run to the end. Errors are raised.
+        """
+        semantic = self._semantic_key(context, chat_history, use_cache, query_embedding, index_version)
+        if semantic:
+            cached = self._semantic_lookup(db_scope, index_version, query_embedding, semantic)
+            if cached:
+                yield cached
+                return
+
+        system_prompt, prompt = self._rag_prompt(question, context, chat_history)
+        key = _cache_key(self.model, system_prompt + prompt)
+        if use_cache:
+            cached = answer_cache.get(db_scope, key)
+            if cached:
+                print(f"⚡ Cache hit (scope={db_scope})")
+                yield cached
+                return
+
+        parts = []
+        async for token in self._stream(prompt, system_prompt, temperature=0.2, max_tokens=600):
+            parts.append(token)
+            yield token
+
+        answer = "".join(parts)
+        if use_cache:
+            answer_cache.put(db_scope, key, answer)
+        if semantic:
+            semantic_cache.store(db_scope, index_version, question, query_embedding, semantic, answer)
+
+    def _semantic_key(
+        self,
+        context: List[str],
+        chat_history: Optional[List[Dict]],
+        use_cache: bool,
+        query_embedding: Optional[List[float]],
+        index_version: Optional[str],
+    ) -> Optional[List[str]]:
+        """Chunk ids the semantic cache matches on, or None when it doesn't apply."""
+        if (use_cache and SEMANTIC_CACHE_ENABLED and not chat_history
+                and query_embedding is not None and index_version is not None):
+            return [chunk_hash(doc) for doc in context[:3]]
+        return None
+
+    def _semantic_lookup(
+        self,
+        db_scope: str,
+        index_version: str,
+        query_embedding: List[float],
+        context_ids: List[str],
+    ) -> Optional[str]:
+        hit = semantic_cache.lookup(db_scope, index_version, query_embedding, context_ids)
+        if not hit:
+            return None
+        answer, similarity, original = hit
+        print(f"⚡ Semantic cache hit (scope={db_scope}, sim={similarity:.3f}, was: {original[:60]!r})")
+        return answer
 
     async def generate_code(self, description: str, language: str = "python") -> str:
         system_prompt = (
@@ -199,11 +441,13 @@ A:"""
             max_tokens=800,
         )
 
+    def coalescing_stats(self) -> dict:
+        """How many generate calls were served by an identical in-flight one."""
+        return self.generations.stats()
+
     def cache_stats(self) -> dict:
-        """Quick stats for debugging."""
-        now = time.time()
-        live = sum(1 for _, (_, ts) in _CACHE.items() if now - ts < _CACHE_TTL_SECONDS)
-        return {"total_entries": len(_CACHE), "live_entries": live, "ttl_seconds": _CACHE_TTL_SECONDS}
+        """Answer cache size, budget and hit/miss/eviction counters per scope."""
+        return {**answer_cache.stats(), "semantic": semantic_cache.stats()}
 
 
 ollama_service = OllamaService()
\ No newline at end of file
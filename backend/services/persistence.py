@@ -0,0 +1,119 @@
+"""Write-behind (group commit) persistence for the local vector store
+
+Flushing the store after every document means a bulk upload of forty files
+pays forty full flushes. Writers call `mark_dirty()` instead; the scheduler
+coalesces everything that arrives within a time window — or flushes early
+once enough writes pile up — and `close()` flushes whatever is left at
+shutdown.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class WriteBehindPersister:
+    def __init__(
+        self,
+        flush: Callable[[], Awaitable[None]],
+        window_seconds: float,
+        max_pending: int,
+    ):
+        self._flush_fn = flush
+        self.window_seconds = window_seconds
+        self.max_pending = max(1, max_pending)
+
+        self.pending_ops = 0
+        self._dirty_since: Optional[float] = None
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.failed_flushes = 0
+        self.last_flush_at: Optional[float] = None
+        self.last_flush_ms = 0.0
+        self.max_lag_seconds = 0.0
+
+    def mark_dirty(self, ops: int = 1) -> None:
+        """Record `ops` unflushed writes (chunks added/removed/updated)."""
+        if ops <= 0:
+            return
+        if self._dirty_since is None:
+            self._dirty_since = time.time()
+        self.pending_ops += ops
+
+        if self.pending_ops >= self.max_pending or self.window_seconds <= 0:
+            self._schedule(0)
+        elif self._timer is None or self._timer.done():
+            self._schedule(self.window_seconds)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.done():
+            # A flush already in progress re-arms itself for late writes.
+            if delay > 0 or self._lock.locked():
+                return
+            self._timer.cancel()
+        self._timer = asyncio.create_task(self._flush_after(delay))
+
+    async def _flush_after(self, delay: float) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        # From here on this task is just a flush, not a pending timer: writes
+        # landing mid-flush must be able to arm a new one (flush() re-arms).
+        if self._timer is asyncio.current_task():
+            self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            # Keep the writes marked dirty; the next write or shutdown retries.
+            print(f"❌ Write-behind flush failed: {e}")
+
+    async def flush(self) -> None:
+        """Flush now if anything is pending."""
+        async with self._lock:
+            if not self.pending_ops:
+                return
+            ops, dirty_since = self.pending_ops, self._dirty_since
+            # Writes that land while we flush start a new window.
+            self.pending_ops = 0
+            self._dirty_since = None
+
+            started = time.time()
+            try:
+                await self._flush_fn()
+            except BaseException:
+                self.failed_flushes += 1
+                self.pending_ops += ops
+                self._dirty_since = min(dirty_since, self._dirty_since or dirty_since)
+                raise
+
+            finished = time.time()
+            self.flushes += 1
+            self.flushed_ops += ops
+            self.last_flush_at = finished
+            self.last_flush_ms = (finished - started) * 1000
+            self.max_lag_seconds = max(self.max_lag_seconds, finished - dirty_since)
+
+            if self.pending_ops and (self._timer is None or self._timer.done()):
+                self._schedule(self.window_seconds)
+
+    async def close(self) -> None:
+        """Cancel the timer and flush everything still pending."""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        await self.flush()
+
+    def stats(self) -> Dict:
+        now = time.time()
+        return {
+            "window_seconds": self.window_seconds,
+            "max_pending": self.max_pending,
+            "pending_ops": self.pending_ops,
+            # How far the on-disk state trails the in-memory state right now.
+            "durability_lag_seconds": round(now - self._dirty_since, 3) if self._dirty_since else 0.0,
+            "max_durability_lag_seconds": round(self.max_lag_seconds, 3),
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "avg_ops_per_flush": round(self.flushed_ops / self.flushes, 2) if self.flushes else 0.0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
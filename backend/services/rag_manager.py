@@ -17,24 +17,92 @@ Upload scope is chosen per-call:
 Search scope works the same way:
     scope="local"   → only your docs
     scope="shared"  → only company-wide docs
+    scope="both"    → both at once, merged into one ranking
+
+With SHARED_RAG_REPLICA=true, shared searches are answered from a local
+mirror of the shared index (see shared_replica.py) while it is up to date.
+
+SHARED_RAG_URLS spreads the shared corpus over several server laptops:
+each document goes to one node, searches ask all of them (shared_pool.py).
 """
 
+import asyncio
+import json
 import os
 import httpx
-from typing import List, Dict, Optional, Literal
+from typing import List, Dict, Optional, Literal, Tuple
 
 # Your existing, untouched local RAG service
 from backend.services.rag_service import rag_service   # ← unchanged import
+from backend.services.embedding_cache import chunk_hash
+from backend.services.shared_client import CircuitBreaker, SharedClient
+from backend.services.shared_pool import SharedNode, SharedPool
+from backend.services.shared_replica import SharedReplica
+from backend.services.single_flight import SingleFlight
+from backend.services.wire_format import CHUNK_PAYLOAD_CONTENT_TYPE, encode_chunk_payload
+from backend.core.config import CHROMA_PERSIST_DIR
 
 # ── Config ────────────────────────────────────────────────────────────────────
 # Put the server laptop's LAN IP here, or set the env var SHARED_RAG_URL.
 # Example: http://192.168.1.50:8001
 SHARED_RAG_URL = os.environ.get("SHARED_RAG_URL", "http://192.168.1.50:8001").rstrip("/")
 
-# How long to wait for the shared server before giving up (seconds)
+# Several shared nodes, comma-separated — overrides SHARED_RAG_URL. Every
+# laptop must list the same nodes: the list decides which node owns which
+# document. Example: http://192.168.1.50:8001,http://192.168.1.51:8001
+SHARED_RAG_URLS = [
+    url.strip().rstrip("/")
+    for url in os.environ.get("SHARED_RAG_URLS", SHARED_RAG_URL).split(",")
+    if url.strip()
+]
+
+# How long to wait for the shared server's response before giving up (seconds)
 SHARED_TIMEOUT = float(os.environ.get("SHARED_RAG_TIMEOUT", "30"))
 
+# Separate, much shorter deadlines: opening the TCP connection (a LAN peer
+# answers in milliseconds or not at all) and reading a search response.
+SHARED_CONNECT_TIMEOUT = float(os.environ.get("SHARED_RAG_CONNECT_TIMEOUT", "1.5"))
+SHARED_SEARCH_TIMEOUT = float(os.environ.get("SHARED_RAG_SEARCH_TIMEOUT", "8"))
+
+# With several nodes: how long a search waits for each node before merging
+# without it (batches get 4×).
+SHARED_SHARD_DEADLINE = float(os.environ.get("SHARED_RAG_SHARD_DEADLINE", "3"))
+
+# Resilience: retries for idempotent calls, circuit breaker, hedged search.
+# SHARED_RAG_HEDGE_MS=0 disables hedging.
+SHARED_RETRIES = int(os.environ.get("SHARED_RAG_RETRIES", "2"))
+SHARED_BREAKER_THRESHOLD = int(os.environ.get("SHARED_RAG_BREAKER_THRESHOLD", "3"))
+SHARED_BREAKER_RESET = float(os.environ.get("SHARED_RAG_BREAKER_RESET", "15"))
+SHARED_HEDGE_DELAY = float(os.environ.get("SHARED_RAG_HEDGE_MS", "0")) / 1000.0
+
+# Local replica of the shared index: chunks + vectors pulled from the server's
+# changelog so shared searches run on this laptop. Searches fall back to HTTP
+# once the last complete sync is older than SHARED_RAG_REPLICA_MAX_STALENESS.
+SHARED_REPLICA_ENABLED = os.environ.get("SHARED_RAG_REPLICA", "false").lower() == "true"
+SHARED_REPLICA_DIR = os.environ.get(
+    "SHARED_RAG_REPLICA_DIR", os.path.join(CHROMA_PERSIST_DIR, "shared_replica")
+)
+SHARED_REPLICA_MAX_STALENESS = float(os.environ.get("SHARED_RAG_REPLICA_MAX_STALENESS", "60"))
+SHARED_REPLICA_SYNC_INTERVAL = float(os.environ.get("SHARED_RAG_REPLICA_SYNC_INTERVAL", "10"))
+
+# Shared uploads: parse, chunk and embed on this laptop and send chunks plus
+# vectors (wire_format.py), so the server only stores them. Falls back to
+# sending the raw file if the server can't accept vectors.
+SHARED_UPLOAD_VECTORS = os.environ.get("SHARED_RAG_UPLOAD_VECTORS", "true").lower() == "true"
+
+# scope="both": each source gets its own deadline so a slow shared server
+# can't hold up the answer — whatever arrives in time is used.
+BOTH_LOCAL_DEADLINE = float(os.environ.get("RAG_BOTH_LOCAL_DEADLINE", "5"))
+BOTH_SHARED_DEADLINE = float(os.environ.get("RAG_BOTH_SHARED_DEADLINE", "3"))
+
+# Calibration weights applied to each source's similarity before merging.
+# Both sides score with the same embedding model, so 1.0/1.0 is a fair start;
+# lower one to prefer the other source on near-ties.
+BOTH_LOCAL_WEIGHT = float(os.environ.get("RAG_BOTH_LOCAL_WEIGHT", "1.0"))
+BOTH_SHARED_WEIGHT = float(os.environ.get("RAG_BOTH_SHARED_WEIGHT", "1.0"))
+
 Scope = Literal["local", "shared"]
+SearchScope = Literal["local", "shared", "both"]
 
 
 class RAGManager:
@@ -42,17 +110,34 @@ class RAGManager:
     Single entry-point for all RAG operations.
 
     local  → delegates to rag_service (your existing ChromaDB on this laptop)
-    shared → HTTP calls to shared_rag_service running on the server laptop
+    shared → HTTP calls to shared_rag_service on the server laptop(s)
     """
 
     def __init__(self):
         # The local service is already a singleton; we just hold a reference.
         self.local = rag_service
-        # Shared HTTP client — persistent connection pool, reused across calls.
-        self._http = httpx.AsyncClient(
-            base_url=SHARED_RAG_URL,
-            timeout=SHARED_TIMEOUT,
+        # One HTTP client per shared node — persistent connection pool, reused
+        # across calls, behind its own circuit breaker so a missing server
+        # fails fast without affecting the others.
+        self.shared = SharedPool(
+            [
+                SharedNode(url, SharedClient(
+                    base_url=url,
+                    connect_timeout=SHARED_CONNECT_TIMEOUT,
+                    read_timeout=SHARED_TIMEOUT,
+                    retries=SHARED_RETRIES,
+                    hedge_delay=SHARED_HEDGE_DELAY,
+                    breaker=CircuitBreaker(SHARED_BREAKER_THRESHOLD, SHARED_BREAKER_RESET),
+                ))
+                for url in SHARED_RAG_URLS
+            ],
+            search_timeout=SHARED_SEARCH_TIMEOUT,
+            shard_deadline=SHARED_SHARD_DEADLINE,
         )
+        # Cleared when the server turns out not to accept pre-embedded uploads
+        self._upload_vectors = SHARED_UPLOAD_VECTORS
+        # Concurrent identical searches (same scope, query, k, filter) share one.
+        self.searches = SingleFlight("rag.search")
 
     # ── Initialization ────────────────────────────────────────────────────────
 
@@ -63,16 +148,31 @@ class RAGManager:
         """
         await self.local.initialize()
 
-        # Sanity-check: can we reach the shared server?
-        try:
-            resp = await self._http.get("/health")
-            resp.raise_for_status()
-            data = resp.json()
-            print(f"🌐 Shared RAG reachable — {data.get('total_chunks', '?')} chunks in store.")
-        except Exception as e:
-            # Not fatal — local RAG still works if shared server is unreachable.
-            print(f"⚠️  Shared RAG server not reachable at {SHARED_RAG_URL}: {e}")
-            print("   Local RAG is still fully operational.")
+        if SHARED_REPLICA_ENABLED:
+            for node in self.shared.nodes:
+                # One mirror (and changelog cursor) per node; a single node
+                # keeps the original directory.
+                directory = SHARED_REPLICA_DIR
+                if len(self.shared.nodes) > 1:
+                    directory = os.path.join(SHARED_REPLICA_DIR, node.key)
+                node.replica = SharedReplica(
+                    client=node.client,
+                    local=self.local,
+                    directory=directory,
+                    max_staleness=SHARED_REPLICA_MAX_STALENESS,
+                    sync_interval=SHARED_REPLICA_SYNC_INTERVAL,
+                )
+                await node.replica.start()
+
+        # Sanity-check: can we reach the shared server(s)?
+        for health in await self.shared.health():
+            if health.get("status") == "unreachable":
+                # Not fatal — local RAG still works if shared server is unreachable.
+                print(f"⚠️  Shared RAG server not reachable at {health['url']}: {health.get('detail')}")
+                print("   Local RAG is still fully operational.")
+            else:
+                print(f"🌐 Shared RAG {health['url']} reachable — "
+                      f"{health.get('total_chunks', '?')} chunks in store.")
 
     # ── Add document ──────────────────────────────────────────────────────────
 
@@ -96,29 +196,118 @@ class RAGManager:
                 metadata=metadata,
             )
 
-        # scope == "shared": upload the file bytes to the shared server
+        # scope == "shared": embed here and send vectors, or upload the file,
+        # to the node that owns this document
+        node = self.shared.owner(document_id)
         try:
             ext = os.path.splitext(file_path)[1]
             original_name = (metadata or {}).get("original_filename", os.path.basename(file_path))
 
+            if self._upload_vectors and self.local.is_initialized:
+                chunks = await self._upload_vectors_to_shared(node, file_path, document_id, original_name, metadata)
+                if chunks is not None:
+                    return chunks
+
             with open(file_path, "rb") as f:
-                resp = await self._http.post(
+                resp = await node.client.post(
                     "/documents/upload",
                     files={"file": (original_name, f, _mime(ext))},
+                    # Same id as the local record, so delete/update hit it.
+                    data={"document_id": document_id},
                 )
             resp.raise_for_status()
             data = resp.json()
-            print(f"✅ Shared upload: {data.get('chunks_indexed')} chunks indexed.")
+            print(f"✅ Shared upload to {node.url}: {data.get('chunks_indexed')} chunks indexed.")
+            if node.replica is not None:
+                node.replica.request_sync()
             return data.get("chunks_indexed", 0)
 
         except httpx.HTTPStatusError as e:
             raise RuntimeError(f"Shared server error {e.response.status_code}: {e.response.text}") from e
         except httpx.RequestError as e:
             raise RuntimeError(
-                f"Cannot reach shared RAG server at {SHARED_RAG_URL}. "
+                f"Cannot reach shared RAG server at {node.url}. "
                 "Is it running? Is the laptop on the same WiFi?"
             ) from e
 
+    async def _upload_vectors_to_shared(
+        self,
+        node: SharedNode,
+        file_path: str,
+        document_id: str,
+        original_name: str,
+        metadata: Optional[Dict],
+    ) -> Optional[int]:
+        """
+        Chunk and embed locally, POST the binary payload. Returns None when
+        the server can't take it (older server, different embedding model)
+        and the caller should upload the file instead.
+        """
+        batch = await self.local.embed_document(
+            file_path, document_id, {**(metadata or {}), "source": original_name}
+        )
+        payload = await asyncio.to_thread(
+            encode_chunk_payload,
+            document_id,
+            self.local.embedding_model,
+            batch.ids,
+            batch.texts,
+            batch.metadatas,
+            batch.embeddings,
+            original_name,
+        )
+        resp = await node.client.post(
+            "/documents/upload-vectors",
+            content=payload,
+            headers={"Content-Type": CHUNK_PAYLOAD_CONTENT_TYPE},
+        )
+        if resp.status_code in (404, 405, 415):
+            print("⚠️  Shared server doesn't accept pre-embedded uploads — sending files from now on")
+            self._upload_vectors = False
+            return None
+        if resp.status_code == 409:
+            print(f"⚠️  Shared server rejected our vectors ({resp.json().get('detail')}) — sending the file")
+            return None
+        resp.raise_for_status()
+        data = resp.json()
+        print(f"✅ Shared upload to {node.url}: {data.get('chunks_indexed')} pre-embedded chunks "
+              f"({len(payload) / 1024:.0f} KB) stored.")
+        if node.replica is not None:
+            node.replica.request_sync()
+        return data.get("chunks_indexed", 0)
+
+    # ── Update document ───────────────────────────────────────────────────────
+
+    async def update_document(
+        self,
+        file_path: str,
+        document_id: str,
+        metadata: Optional[Dict] = None,
+        scope: Scope = "local",
+    ) -> Dict:
+        """
+        Re-index an existing document from a new version of its file.
+
+        scope="local"  — incremental: only changed chunks are re-embedded
+        scope="shared" — the file is re-uploaded under the same document_id;
+                         the server swaps the chunks in place, so a failed
+                         upload leaves the old version searchable
+        """
+        if scope == "local":
+            return await self.local.update_document(
+                file_path=file_path,
+                document_id=document_id,
+                metadata=metadata,
+            )
+
+        count = await self.add_document(file_path, document_id, metadata, scope="shared")
+        # A copy uploaded before the node list changed may sit on another
+        # node; only now that the new version is in is it safe to drop.
+        owner = self.shared.owner(document_id)
+        await asyncio.gather(*[self._delete_on_node(node, document_id) for node in self.shared.others(owner)])
+        return {"total_chunks": count, "added": count, "removed": None,
+                "renumbered": 0, "unchanged": 0}
+
     # ── Search ────────────────────────────────────────────────────────────────
 
     async def search(
@@ -126,41 +315,128 @@ class RAGManager:
         query: str,
         k: int = 5,
         filter_metadata: Optional[Dict] = None,
-        scope: Scope = "local",              # ← caller decides
+        scope: SearchScope = "local",        # ← caller decides
     ) -> List[Dict]:
         """
         Search local or shared DB — results are completely separate.
 
         scope="local"  → only this laptop's documents
         scope="shared" → only the company-wide shared documents
+        scope="both"   → both concurrently, fused into one top-k
+
+        Results from either scope have the same shape: content, metadata,
+        source and `relevance_score` (cosine similarity, 1.0 = identical).
+        Identical searches already in flight are joined, not repeated —
+        treat the returned list as read-only, other callers share it.
+        """
+        return (await self.search_with_version(query, k, filter_metadata, scope))[0]
+
+    async def search_with_version(
+        self,
+        query: str,
+        k: int = 5,
+        filter_metadata: Optional[Dict] = None,
+        scope: SearchScope = "local",
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        search(), plus the version of the index(es) the results were read
+        from — answers cached under one version are never reused under
+        another. None when it isn't known (a shared node that didn't answer,
+        or an older server).
         """
+        key = (scope, query, k, json.dumps(filter_metadata, sort_keys=True, default=str))
+        results, version = await self.searches.run(
+            key, lambda: self._search_many_versioned([query], k, filter_metadata, scope)
+        )
+        return results[0], version
+
+    async def _search_many_versioned(
+        self,
+        queries: List[str],
+        k: int,
+        filter_metadata: Optional[Dict],
+        scope: SearchScope,
+    ) -> Tuple[List[List[Dict]], Optional[str]]:
+        if scope == "both":
+            return await self._search_both(queries, k, filter_metadata)
+
         if scope == "local":
-            return await self.local.search(
-                query=query,
-                k=k,
-                filter_metadata=filter_metadata,
+            # Read before searching: a write landing mid-search can only make
+            # the results newer than the version they're labelled with.
+            version = f"local={self.local.index_version}"
+            return await self.local.search_many(queries, k=k, filter_metadata=filter_metadata), version
+
+        # scope == "shared": every shared node, merged into one top-k
+        return tuple(await self.shared.search_many_versioned(queries, k=k, filter_metadata=filter_metadata))
+
+    async def _search_both(
+        self,
+        queries: List[str],
+        k: int,
+        filter_metadata: Optional[Dict],
+    ) -> Tuple[List[List[Dict]], Optional[str]]:
+        """
+        Fan out to local and shared at the same time and merge per query.
+
+        Latency is the slower of the two searches, capped by its deadline;
+        a source that errors or misses its deadline just contributes nothing
+        (and leaves the combined version unknown).
+        """
+        async def within(scope: Scope, deadline: float) -> Tuple[List[List[Dict]], Optional[str]]:
+            if scope == "local" and not self.local.is_initialized:
+                return [[] for _ in queries], None
+            try:
+                return await asyncio.wait_for(
+                    self._search_many_versioned(queries, k, filter_metadata, scope),
+                    timeout=deadline,
+                )
+            except asyncio.TimeoutError:
+                print(f"⚠️  {scope} search missed its {deadline:.1f}s deadline — using the other source only")
+            except Exception as e:
+                print(f"❌ {scope} search failed: {e}")
+            return [[] for _ in queries], None
+
+        (local_results, local_version), (shared_results, shared_version) = await asyncio.gather(
+            within("local", BOTH_LOCAL_DEADLINE),
+            within("shared", BOTH_SHARED_DEADLINE),
+        )
+        fused = [
+            _fuse_results(
+                {"local": mine, "shared": theirs},
+                {"local": BOTH_LOCAL_WEIGHT, "shared": BOTH_SHARED_WEIGHT},
+                k,
             )
+            for mine, theirs in zip(local_results, shared_results)
+        ]
+        version = f"{local_version},{shared_version}" if local_version and shared_version else None
+        return fused, version
 
-        # scope == "shared"
-        try:
-            payload = {
-                "query": query,
-                "k": k,
-            }
-            if filter_metadata and "document_id" in filter_metadata:
-                payload["document_id"] = filter_metadata["document_id"]
-
-            resp = await self._http.post("/search", json=payload)
-            resp.raise_for_status()
-            return resp.json().get("results", [])
+    async def search_many(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filter_metadata: Optional[Dict] = None,
+        scope: SearchScope = "local",
+    ) -> List[List[Dict]]:
+        """
+        Search many queries in one go; result lists line up with `queries`.
 
-        except httpx.HTTPStatusError as e:
-            print(f"❌ Shared search HTTP error {e.response.status_code}: {e.response.text}")
-            return []
-        except httpx.RequestError as e:
-            print(f"❌ Shared server unreachable: {e}")
+        local  → one batched encoder call + one job on the query lane
+        shared → one POST /search/batch per shared node (or its replica)
+        both   → both of the above concurrently, fused per query
+        """
+        if not queries:
             return []
 
+        if scope == "local":
+            return await self.local.search_many(queries, k=k, filter_metadata=filter_metadata)
+
+        if scope == "both":
+            return (await self._search_both(queries, k, filter_metadata))[0]
+
+        # scope == "shared" — one request per node (or its replica)
+        return await self.shared.search_many(queries, k=k, filter_metadata=filter_metadata)
+
     # ── Delete ────────────────────────────────────────────────────────────────
 
     async def delete_document(
@@ -172,14 +448,25 @@ class RAGManager:
         if scope == "local":
             return await self.local.delete_document(document_id)
 
+        # The owner first; a document uploaded before the node list changed
+        # may still sit on another node, so a miss there asks the rest.
+        owner = self.shared.owner(document_id)
+        if await self._delete_on_node(owner, document_id):
+            return True
+        others = self.shared.others(owner)
+        return any(await asyncio.gather(*[self._delete_on_node(node, document_id) for node in others]))
+
+    async def _delete_on_node(self, node: SharedNode, document_id: str) -> bool:
         try:
-            resp = await self._http.delete(f"/documents/{document_id}")
+            resp = await node.client.delete(f"/documents/{document_id}")
             if resp.status_code == 404:
                 return False
             resp.raise_for_status()
+            if node.replica is not None:
+                node.replica.request_sync()
             return True
         except httpx.RequestError as e:
-            print(f"❌ Shared delete failed: {e}")
+            print(f"❌ Shared delete on {node.url} failed: {e}")
             return False
 
     # ── List documents ────────────────────────────────────────────────────────
@@ -190,13 +477,17 @@ class RAGManager:
             ids = await self.local.list_documents() if hasattr(self.local, "list_documents") else []
             return [{"document_id": i} for i in ids]
 
-        try:
-            resp = await self._http.get("/documents")
-            resp.raise_for_status()
-            return resp.json().get("documents", [])
-        except httpx.RequestError as e:
-            print(f"❌ Cannot list shared documents: {e}")
-            return []
+        async def on_node(node: SharedNode) -> List[Dict]:
+            try:
+                resp = await node.client.get("/documents")
+                resp.raise_for_status()
+                return [{**doc, "shard": node.url} for doc in resp.json().get("documents", [])]
+            except httpx.RequestError as e:
+                print(f"❌ Cannot list shared documents on {node.url}: {e}")
+                return []
+
+        per_node = await asyncio.gather(*[on_node(node) for node in self.shared.nodes])
+        return [doc for docs in per_node for doc in docs]
 
     # ── Statistics ────────────────────────────────────────────────────────────
 
@@ -205,27 +496,59 @@ class RAGManager:
         return self.local.get_statistics()
 
     async def get_shared_statistics(self) -> Dict:
-        """Stats for the shared server DB."""
-        try:
-            resp = await self._http.get("/health")
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            return {"status": "unreachable", "detail": str(e)}
+        """Stats for the shared server DB(s), plus this client's circuit state per node."""
+        nodes = await self.shared.health()
+        reachable = [node for node in nodes if node.get("status") != "unreachable"]
+        if len(nodes) == 1:
+            return nodes[0]
+        return {
+            "status": "ok" if len(reachable) == len(nodes) else ("degraded" if reachable else "unreachable"),
+            "total_chunks": sum(node.get("total_chunks", 0) for node in reachable),
+            "nodes_reachable": len(reachable),
+            "nodes": nodes,
+        }
 
     # ── Cleanup ───────────────────────────────────────────────────────────────
 
+    async def flush(self):
+        """Persist any local writes still sitting in the write-behind window."""
+        await self.local.flush()
+
     async def close(self):
-        """Call in FastAPI shutdown to cleanly close the HTTP client."""
-        await self._http.aclose()
+        """Call in FastAPI shutdown to cleanly close the HTTP client and local workers."""
+        await self.shared.aclose()
+        await self.local.close()
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
+def _fuse_results(results_by_scope: Dict[str, List[Dict]], weights: Dict[str, float], k: int) -> List[Dict]:
+    """
+    Merge per-source result lists into one top-k.
+
+    Every hit is ranked by weight × relevance_score (both sides report
+    cosine similarity from the same model, so the scores are comparable).
+    The same passage indexed in both stores is kept once — the copy with the
+    better score — and every result is tagged with the `scope` it came from.
+    """
+    best: Dict[str, Dict] = {}
+    for scope, results in results_by_scope.items():
+        weight = weights.get(scope, 1.0)
+        for rank, result in enumerate(results):
+            score = result.get("relevance_score")
+            # Unscored hits sort after every scored one, in their source order.
+            fused = weight * score if score is not None else -1.0 - rank
+            key = chunk_hash(result.get("content", ""))
+            if key not in best or fused > best[key]["fused_score"]:
+                best[key] = {**result, "scope": scope, "fused_score": round(fused, 4)}
+    return sorted(best.values(), key=lambda r: r["fused_score"], reverse=True)[:k]
+
+
 def _mime(ext: str) -> str:
     return {
         ".pdf": "application/pdf",
         ".txt": "text/plain",
         ".md":  "text/markdown",
+        ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
     }.get(ext.lower(), "application/octet-stream")
 
 
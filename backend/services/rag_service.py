@@ -1,58 +1,272 @@
 """RAG service for document retrieval"""
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import Chroma
-from langchain.document_loaders import PyPDFLoader, TextLoader
-from typing import List, Dict, Optional
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, List, Dict, Optional
+import asyncio
+import functools
+import multiprocessing
 import os
-from backend.core.config import CHROMA_PERSIST_DIR
+import threading
+import time
+import numpy as np
+from backend.core.config import (
+    CHROMA_PERSIST_DIR,
+    EMBEDDING_MODEL,
+    RAG_QUERY_WORKERS,
+    RAG_QUERY_QUEUE_LIMIT,
+    RAG_INGEST_WORKERS,
+    RAG_INGEST_QUEUE_LIMIT,
+    RAG_EMBED_BATCH_SIZE,
+    RAG_EMBED_WORKERS,
+    RAG_EMBED_POOL,
+    RAG_EMBED_CACHE_ENABLED,
+    RAG_EMBED_CACHE_PATH,
+    RAG_EMBED_CACHE_MAX_MB,
+    RAG_QUERY_CACHE_SIZE,
+    RAG_HYBRID_SEARCH,
+    RAG_RRF_K,
+    RAG_KEYWORD_INDEX_PATH,
+    RAG_PERSIST_WINDOW_SECONDS,
+    RAG_PERSIST_MAX_PENDING,
+    RAG_VECTOR_BACKEND,
+    RAG_FLAT_INDEX_DIR,
+    RAG_FLAT_DTYPE,
+    RAG_FLAT_RESCORE,
+    RAG_FLAT_RESCORE_FACTOR,
+)
+from backend.services.vector_backends import VectorBackend, create_backend, quantization_recall_report
+from backend.services.persistence import WriteBehindPersister
+from backend.services.embedding_cache import EmbeddingCache, QueryEmbeddingLRU, chunk_hash
+from backend.services.document_loaders import iter_chunks
+from backend.services.keyword_index import KeywordIndex, reciprocal_rank_fusion
+from backend.services.ingest_pipeline import ChunkBatch, IngestPipeline, batched_chunks, embed_in_worker
+
+
+# ── Execution layer ───────────────────────────────────────────────────────────
+# Chroma and the HuggingFace embedder are synchronous. Calling them inline from
+# an `async def` blocks the whole uvicorn worker, so every call is pushed onto
+# a lane: a bounded pool with its own concurrency limit and wait-time counters.
+# Search and ingestion get separate lanes so indexing a 300-page PDF never
+# delays an interactive query.
+
+class LaneSaturatedError(RuntimeError):
+    """Raised when a lane's waiting queue is already at its limit."""
+
+
+class _WorkLane:
+    """One bounded worker pool plus the counters exposed in get_statistics()."""
+
+    def __init__(self, name: str, max_workers: int, queue_limit: int = 0, kind: str = "thread"):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.queue_limit = max(0, queue_limit)
+
+        if kind == "process":
+            # Process lanes only accept picklable, module-level callables.
+            # "spawn" keeps workers from inheriting the parent's torch threads.
+            self._pool: Executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=f"rag-{name}",
+            )
+
+        # At most `max_workers` calls are handed to the pool; the rest wait
+        # here, on the event loop, where we can count and time them.
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on this lane and await its result."""
+        with self._lock:
+            if self.queue_limit and self.queued >= self.queue_limit:
+                raise LaneSaturatedError(
+                    f"RAG {self.name} lane is saturated ({self.queued} calls waiting)"
+                )
+            self.queued += 1
+
+        enqueued = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            raise
+
+        started = time.perf_counter()
+        with self._lock:
+            wait = started - enqueued
+            self.queued -= 1
+            self.running += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        ok = False
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+            ok = True
+            return result
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.running -= 1
+                self._run_total += time.perf_counter() - started
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            finished = self.completed + self.failed
+            started = finished + self.running
+            return {
+                "kind": self.kind,
+                "workers": self.max_workers,
+                "queue_limit": self.queue_limit or None,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": round(self._wait_total / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 2),
+                "avg_run_ms": round(self._run_total / finished * 1000, 2) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+class RAGExecutor:
+    """Query-time, ingest-time and chunk-embedding lanes used by RAGService."""
+
+    def __init__(self):
+        self.query = _WorkLane("query", RAG_QUERY_WORKERS, RAG_QUERY_QUEUE_LIMIT)
+        self.ingest = _WorkLane("ingest", RAG_INGEST_WORKERS, RAG_INGEST_QUEUE_LIMIT)
+        self.embed = _WorkLane("embed", RAG_EMBED_WORKERS, kind=RAG_EMBED_POOL)
+
+    def lanes(self) -> List[_WorkLane]:
+        return [self.query, self.ingest, self.embed]
+
+    def stats(self) -> Dict:
+        return {lane.name: lane.snapshot() for lane in self.lanes()}
+
+    def shutdown(self):
+        for lane in self.lanes():
+            lane.shutdown()
+
+
+# ── Service ───────────────────────────────────────────────────────────────────
 
 class RAGService:
     def __init__(self):
         self.persist_directory = CHROMA_PERSIST_DIR
+        self.embedding_model = EMBEDDING_MODEL
         self.embeddings = None
-        self.vectorstore = None
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self.query_cache = QueryEmbeddingLRU(RAG_QUERY_CACHE_SIZE)
+        self.keyword_index = KeywordIndex(RAG_KEYWORD_INDEX_PATH)
+        self.persister = WriteBehindPersister(
+            flush=lambda: self.executor.ingest.run(self._persist_sync),
+            window_seconds=RAG_PERSIST_WINDOW_SECONDS,
+            max_pending=RAG_PERSIST_MAX_PENDING,
+        )
+        self.backend: Optional[VectorBackend] = None
         self.is_initialized = False
-        
+        self.executor = RAGExecutor()
+        self._change_listeners: List[Callable[[str, List[str]], None]] = []
+        # Bumped on every index write; caches keyed on it go stale with it.
+        self.index_version = 0
+
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
             separators=["\n\n", "\n", " ", ""]
         )
-    
+
+    def add_change_listener(self, listener: Callable[[str, List[str]], None]) -> None:
+        """
+        Call `listener(op, chunk_ids)` after every index write, with op
+        "upsert" or "delete". Listeners may run on worker threads.
+        """
+        self._change_listeners.append(listener)
+
+    def _notify(self, op: str, ids: List[str]) -> None:
+        if ids:
+            self.index_version += 1
+            for listener in self._change_listeners:
+                listener(op, ids)
+
     async def initialize(self):
         """Initialize embeddings and vector store"""
         try:
-            print("📦 Loading embedding model...")
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
-            )
-            
-            if os.path.exists(self.persist_directory):
-                print("📂 Loading existing vector database...")
-                self.vectorstore = Chroma(
-                    persist_directory=self.persist_directory,
-                    embedding_function=self.embeddings
-                )
-            else:
-                print("🆕 Creating new vector database...")
-                os.makedirs(self.persist_directory, exist_ok=True)
-                self.vectorstore = Chroma(
-                    persist_directory=self.persist_directory,
-                    embedding_function=self.embeddings
-                )
-            
+            # Loading the model takes seconds — keep it off the event loop too.
+            await self.executor.ingest.run(self._initialize_sync)
             self.is_initialized = True
             print("✅ RAG service initialized!")
-            
+
         except Exception as e:
             print(f"❌ RAG initialization failed: {e}")
             self.is_initialized = False
             raise
-    
+
+    def _initialize_sync(self):
+        print("📦 Loading embedding model...")
+        self.embeddings = HuggingFaceEmbeddings(
+            model_name=self.embedding_model,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+        # Case-folding query cache keys is only safe for uncased tokenizers.
+        tokenizer = getattr(self.embeddings.client, "tokenizer", None)
+        self.query_cache.casefold = bool(getattr(tokenizer, "do_lower_case", False))
+
+        if os.path.exists(self.persist_directory):
+            print(f"📂 Loading existing vector database ({RAG_VECTOR_BACKEND})...")
+        else:
+            print(f"🆕 Creating new vector database ({RAG_VECTOR_BACKEND})...")
+            os.makedirs(self.persist_directory, exist_ok=True)
+        self.backend = create_backend(
+            RAG_VECTOR_BACKEND,
+            persist_directory=self.persist_directory,
+            embeddings=self.embeddings,
+            flat_directory=RAG_FLAT_INDEX_DIR,
+            flat_dtype=RAG_FLAT_DTYPE,
+            flat_rescore=RAG_FLAT_RESCORE,
+            flat_rescore_factor=RAG_FLAT_RESCORE_FACTOR,
+        )
+
+        if RAG_EMBED_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                RAG_EMBED_CACHE_PATH,
+                max_bytes=RAG_EMBED_CACHE_MAX_MB * 1024 * 1024,
+            )
+
+        if not self.keyword_index.load():
+            self._rebuild_keyword_index()
+
+    def _rebuild_keyword_index(self):
+        """Backfill the keyword index from chunks indexed before it existed."""
+        stored = self.backend.get(include=["documents", "metadatas"])
+        if stored["ids"]:
+            print(f"🔤 Building keyword index for {len(stored['ids'])} existing chunks...")
+            self.keyword_index.add_many(stored["ids"], stored["documents"], stored["metadatas"])
+            self.keyword_index.save()
+
     async def add_document(
         self,
         file_path: str,
@@ -62,108 +276,570 @@ class RAGService:
         """Add document to vector store"""
         if not self.is_initialized:
             raise Exception("RAG service not initialized")
-        
+
+        written_ids: List[str] = []
         try:
-            # Load document
-            if file_path.endswith('.pdf'):
-                loader = PyPDFLoader(file_path)
-            elif file_path.endswith(('.txt', '.md')):
-                loader = TextLoader(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_path}")
-            
-            documents = loader.load()
-            chunks = self.text_splitter.split_documents(documents)
-            
-            # Add metadata
-            for i, chunk in enumerate(chunks):
-                chunk.metadata.update({
-                    "document_id": document_id,
-                    "chunk_index": i,
-                    "source": file_path,
-                    **(metadata or {})
-                })
-            
-            # Add to vector store
-            self.vectorstore.add_documents(chunks)
-            self.vectorstore.persist()
-            
-            print(f"✅ Added {len(chunks)} chunks from {file_path}")
-            return len(chunks)
-            
-        except Exception as e:
+            # Pages are loaded, split, embed and written batch by batch —
+            # the whole document is never held in memory.
+            chunks = iter_chunks(file_path, self.text_splitter, document_id, metadata)
+            count = await self._ingest_chunks(chunks, written_ids)
+            self.persister.mark_dirty(count)
+
+            print(f"✅ Added {count} chunks from {file_path}")
+            return count
+
+        except BaseException as e:
             print(f"❌ Failed to add document: {e}")
+            # Batches written before the failure would leave a half-indexed
+            # document searchable while its upload is reported failed.
+            if written_ids:
+                await self._remove_chunks(written_ids)
+                self.persister.mark_dirty(len(written_ids))
+            raise
+
+    def _load_chunks_sync(self, file_path: str, document_id: str, metadata: Optional[Dict]) -> List:
+        return list(iter_chunks(file_path, self.text_splitter, document_id, metadata))
+
+    async def _ingest_chunks(self, chunks: Iterable, written_ids: Optional[List[str]] = None) -> int:
+        """Embed and write `chunks`; every id about to be written goes into `written_ids`."""
+        async def write(batch: ChunkBatch) -> None:
+            if written_ids is not None:
+                written_ids.extend(batch.ids)   # before the write: a partial one is undone too
+            await self._write_batch(batch)
+
+        pipeline = IngestPipeline(
+            embed=self._embed_texts,
+            write=write,
+            # One batch per embed worker plus one being written
+            max_in_flight=self.executor.embed.max_workers + 1,
+        )
+        return await pipeline.run(
+            self._pull_on_ingest_lane(batched_chunks(chunks, RAG_EMBED_BATCH_SIZE))
+        )
+
+    async def _pull_on_ingest_lane(self, iterator: Iterator) -> AsyncIterator:
+        """Drive a blocking iterator (PDF parsing, splitting) from the ingest lane."""
+        done = object()
+        while True:
+            item = await self.executor.ingest.run(next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed chunk texts, serving unchanged chunks from the embedding cache."""
+        if self.embedding_cache is None:
+            return await self._encode(texts)
+
+        vectors = await self.executor.ingest.run(
+            self.embedding_cache.get_many, self.embedding_model, texts
+        )
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            fresh = await self._encode([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+            await self.executor.ingest.run(
+                self.embedding_cache.put_many,
+                self.embedding_model,
+                [texts[i] for i in missing],
+                fresh,
+            )
+        return vectors
+
+    async def _encode(self, texts: List[str]) -> List[List[float]]:
+        if self.executor.embed.kind == "process":
+            return await self.executor.embed.run(embed_in_worker, self.embedding_model, texts)
+        return await self.executor.embed.run(self.embeddings.embed_documents, texts)
+
+    async def _write_batch(self, batch: ChunkBatch) -> None:
+        await self.executor.ingest.run(self._write_batch_sync, batch)
+
+    def _write_batch_sync(self, batch: ChunkBatch) -> None:
+        # Vectors are already computed — the backend only stores them.
+        self.backend.upsert(
+            ids=batch.ids,
+            embeddings=batch.embeddings,
+            documents=batch.texts,
+            metadatas=batch.metadatas,
+        )
+        self.keyword_index.add_many(batch.ids, batch.texts, batch.metadatas)
+        self._notify("upsert", batch.ids)
+
+    async def _remove_chunks(self, ids: List[str]) -> None:
+        await self.executor.ingest.run(self.backend.delete, ids)
+        self.keyword_index.remove_ids(ids)
+        self._notify("delete", ids)
+
+    def _persist_sync(self) -> None:
+        self.backend.persist()
+        self.keyword_index.save()
+
+    async def update_document(
+        self,
+        file_path: str,
+        document_id: str,
+        metadata: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Re-index a document in place, touching only the chunks that changed.
+
+        The new chunk set is diffed against the stored one by content hash:
+        identical chunks are kept (and re-numbered if they moved), stale ones
+        are deleted and only genuinely new text is embedded.
+
+        New chunks are written first and the old ones touched only after, so
+        a failed embed leaves the previous version intact (the chunks it did
+        write are removed again).
+        """
+        if not self.is_initialized:
+            raise Exception("RAG service not initialized")
+
+        try:
+            chunks = await self.executor.ingest.run(
+                self._load_chunks_sync, file_path, document_id, metadata
+            )
+            stored = await self.executor.ingest.run(
+                self.backend.get,
+                where={"document_id": document_id},
+                include=["documents", "metadatas"],
+            )
+            plan = _diff_chunks(chunks, stored)
+
+            added_ids: List[str] = []
+            try:
+                added = await self._ingest_chunks(plan["added"], added_ids) if plan["added"] else 0
+            except BaseException:
+                if added_ids:
+                    await self._remove_chunks(added_ids)
+                    self.persister.mark_dirty(len(added_ids))
+                raise
+
+            if plan["delete_ids"]:
+                await self._remove_chunks(plan["delete_ids"])
+            if plan["update_ids"]:
+                await self.executor.ingest.run(
+                    self.backend.update_metadatas,
+                    plan["update_ids"],
+                    plan["update_metadatas"],
+                )
+                self._notify("upsert", plan["update_ids"])
+            self.persister.mark_dirty(added + len(plan["delete_ids"]) + len(plan["update_ids"]))
+
+            summary = {
+                "total_chunks": len(chunks),
+                "added": added,
+                "removed": len(plan["delete_ids"]),
+                "renumbered": len(plan["update_ids"]),
+                "unchanged": plan["unchanged"],
+            }
+            print(f"✅ Updated {file_path}: {summary}")
+            return summary
+
+        except Exception as e:
+            print(f"❌ Failed to update document: {e}")
             raise
-    
+
+    # ── Pre-embedded chunks (shared uploads) ──────────────────────────────────
+
+    @property
+    def embedding_dimension(self) -> int:
+        return self.embeddings.client.get_sentence_embedding_dimension()
+
+    async def embed_document(
+        self,
+        file_path: str,
+        document_id: str,
+        metadata: Optional[Dict] = None
+    ) -> ChunkBatch:
+        """
+        Load, split and embed a document without storing it — the client
+        half of a pre-embedded shared upload. Returns every chunk in order.
+        """
+        if not self.is_initialized:
+            raise Exception("RAG service not initialized")
+
+        batches: List[ChunkBatch] = []
+
+        async def collect(batch: ChunkBatch) -> None:
+            batches.append(batch)
+
+        pipeline = IngestPipeline(
+            embed=self._embed_texts,
+            write=collect,
+            max_in_flight=self.executor.embed.max_workers + 1,
+        )
+        chunks = iter_chunks(file_path, self.text_splitter, document_id, metadata)
+        await pipeline.run(self._pull_on_ingest_lane(batched_chunks(chunks, RAG_EMBED_BATCH_SIZE)))
+
+        # Batches finish out of order; chunk_index restores document order.
+        batches.sort(key=lambda b: b.metadatas[0].get("chunk_index", 0))
+        document = ChunkBatch(ids=[], texts=[], metadatas=[])
+        for batch in batches:
+            document.ids.extend(batch.ids)
+            document.texts.extend(batch.texts)
+            document.metadatas.extend(batch.metadatas)
+            document.embeddings.extend(batch.embeddings)
+        return document
+
+    async def store_embedded_document(self, document_id: str, batch: ChunkBatch) -> int:
+        """
+        Replace a document's chunks with ones embedded elsewhere — the server
+        half. Nothing is embedded here; the new chunks are written before the
+        old ones are removed, so searches never see the document missing.
+        """
+        if not self.is_initialized:
+            raise Exception("RAG service not initialized")
+
+        try:
+            stored = await self.executor.ingest.run(
+                self.backend.get, where={"document_id": document_id}, include=[]
+            )
+            for start in range(0, len(batch), RAG_EMBED_BATCH_SIZE):
+                end = start + RAG_EMBED_BATCH_SIZE
+                await self._write_batch(ChunkBatch(
+                    ids=batch.ids[start:end],
+                    texts=batch.texts[start:end],
+                    metadatas=batch.metadatas[start:end],
+                    embeddings=batch.embeddings[start:end],
+                ))
+
+            keep = set(batch.ids)
+            stale = [chunk_id for chunk_id in stored["ids"] if chunk_id not in keep]
+            if stale:
+                await self.executor.ingest.run(self.backend.delete, stale)
+                self.keyword_index.remove_ids(stale)
+                self._notify("delete", stale)
+            self.persister.mark_dirty(len(batch) + len(stale))
+
+            print(f"✅ Stored {len(batch)} pre-embedded chunks for {document_id}")
+            return len(batch)
+
+        except Exception as e:
+            print(f"❌ Failed to store pre-embedded chunks: {e}")
+            raise
+
     async def search(
         self,
         query: str,
         k: int = 5,
         filter_metadata: Optional[Dict] = None
     ) -> List[Dict]:
-        """Search for relevant documents"""
+        """
+        Search for relevant documents.
+
+        Each result carries `relevance_score`: the cosine similarity of the
+        chunk to the query (normalized embeddings, so 1.0 = identical).
+        """
         if not self.is_initialized:
             raise Exception("RAG service not initialized")
-        
+
         try:
-            if filter_metadata:
-                results = self.vectorstore.similarity_search(
-                    query,
-                    k=k,
-                    filter=filter_metadata
-                )
-            else:
-                results = self.vectorstore.similarity_search(query, k=k)
-            
-            formatted_results = []
-            for doc in results:
-                formatted_results.append({
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "source": doc.metadata.get("source", "unknown")
-                })
-            
-            return formatted_results
-            
+            embedding = await self.embed_query(query)
+            return await self.executor.query.run(
+                self._search_sync, query, embedding, k, filter_metadata or None
+            )
+
         except Exception as e:
             print(f"❌ Search failed: {e}")
             return []
-    
+
+    def _search_sync(
+        self,
+        query: str,
+        embedding: List[float],
+        k: int,
+        filter_metadata: Optional[Dict],
+    ) -> List[Dict]:
+        return hybrid_search(self.backend, self.keyword_index, query, embedding, k, filter_metadata)
+
+    async def search_many(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filter_metadata: Optional[Dict] = None
+    ) -> List[List[Dict]]:
+        """
+        Search several queries at once; results line up with `queries`.
+
+        Query embeddings missing from the LRU are encoded in one batch, and
+        all the index lookups run as a single job on the query lane.
+        """
+        if not self.is_initialized:
+            raise Exception("RAG service not initialized")
+        if not queries:
+            return []
+
+        try:
+            embeddings = await self.embed_queries(queries)
+            return await self.executor.query.run(
+                self._search_many_sync, queries, embeddings, k, filter_metadata or None
+            )
+
+        except Exception as e:
+            print(f"❌ Batch search failed: {e}")
+            return [[] for _ in queries]
+
+    def _search_many_sync(
+        self,
+        queries: List[str],
+        embeddings: List[List[float]],
+        k: int,
+        filter_metadata: Optional[Dict],
+    ) -> List[List[Dict]]:
+        return [
+            hybrid_search(self.backend, self.keyword_index, query, embedding, k, filter_metadata)
+            for query, embedding in zip(queries, embeddings)
+        ]
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Like embed_query for many queries: LRU misses share one encoder call."""
+        embeddings = [self.query_cache.get(q) for q in queries]
+        misses = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+        if misses:
+            # HuggingFaceEmbeddings.embed_query is embed_documents([q])[0], so
+            # batching gives exactly the vectors single queries would get.
+            encoded = dict(zip(misses, await self.executor.query.run(self.embeddings.embed_documents, misses)))
+            for q, vector in encoded.items():
+                self.query_cache.put(q, vector)
+            embeddings = [e if e is not None else encoded[q] for q, e in zip(queries, embeddings)]
+        return embeddings
+
+    async def embed_query(self, query: str) -> List[float]:
+        """Query embedding via the shared LRU — every search path goes through here."""
+        embedding = self.query_cache.get(query)
+        if embedding is None:
+            embedding = await self.executor.query.run(self.embeddings.embed_query, query)
+            self.query_cache.put(query, embedding)
+        return embedding
+
     async def delete_document(self, document_id: str) -> bool:
         """Delete document chunks"""
         if not self.is_initialized:
             raise Exception("RAG service not initialized")
-        
+
         try:
-            results = self.vectorstore.get(
-                where={"document_id": document_id}
-            )
-            
-            if results and "ids" in results:
-                self.vectorstore.delete(ids=results["ids"])
-                self.vectorstore.persist()
-                print(f"✅ Deleted document {document_id}")
-                return True
-            
-            return False
-            
+            deleted = await self.executor.ingest.run(self._delete_document_sync, document_id)
+            if deleted is None:
+                return False
+            self.persister.mark_dirty(max(deleted, 1))
+            print(f"✅ Deleted document {document_id}")
+            return True
+
         except Exception as e:
             print(f"❌ Failed to delete: {e}")
             return False
-    
+
+    def _delete_document_sync(self, document_id: str) -> Optional[int]:
+        results = self.backend.get(
+            where={"document_id": document_id}
+        )
+
+        if results and "ids" in results:
+            self.backend.delete(results["ids"])
+            self.keyword_index.remove_ids(results["ids"])
+            self._notify("delete", results["ids"])
+            return len(results["ids"])
+
+        return None
+
     def get_statistics(self) -> Dict:
         """Get vector store stats"""
         if not self.is_initialized:
             return {"error": "Not initialized"}
-        
+
         try:
-            collection = self.vectorstore._collection
             return {
-                "total_chunks": collection.count(),
-                "persist_directory": self.persist_directory
+                "total_chunks": self.backend.count(),
+                "persist_directory": self.persist_directory,
+                "vector_backend": self.backend.stats(),
+                "executor": self.executor.stats(),
+                "persistence": self.persister.stats(),
+                "query_embedding_cache": self.query_cache.stats(),
+                "embedding_cache": (
+                    self.embedding_cache.stats() if self.embedding_cache else {"enabled": False}
+                ),
             }
         except Exception as e:
             return {"error": str(e)}
 
+    async def quantization_report(
+        self,
+        queries: Optional[List[str]] = None,
+        k: int = 10,
+        sample_size: int = 200,
+        rescore_factor: int = RAG_FLAT_RESCORE_FACTOR,
+    ) -> Dict:
+        """
+        Recall@k of float16 / int8 storage against the float32 vectors.
+
+        With no `queries`, a random sample of stored chunks is used as
+        queries (each one excluded from its own ranking).
+        """
+        if not self.is_initialized:
+            raise Exception("RAG service not initialized")
+
+        query_vectors = [await self.embed_query(q) for q in queries] if queries else None
+        return await self.executor.query.run(
+            self._quantization_report_sync, query_vectors, k, sample_size, rescore_factor
+        )
+
+    def _quantization_report_sync(self, query_vectors, k, sample_size, rescore_factor) -> Dict:
+        exported = self.backend.full_precision_matrix()
+        if exported is None:
+            return {
+                "error": "No full-precision vectors to compare against — the index is empty, "
+                         "or it stores quantized vectors without RAG_FLAT_RESCORE"
+            }
+        _, matrix = exported
+        query_rows = None
+        if query_vectors is None:
+            rng = np.random.default_rng(0)
+            query_rows = rng.choice(len(matrix), size=min(sample_size, len(matrix)), replace=False)
+            query_vectors = matrix[query_rows]
+        report = quantization_recall_report(
+            matrix, np.asarray(query_vectors, dtype=np.float32),
+            k=k, rescore_factor=rescore_factor, query_rows=query_rows,
+        )
+        report["current"] = self.backend.stats()
+        return report
+
+    async def flush(self):
+        """Force the write-behind scheduler to persist everything pending now."""
+        if self.is_initialized:
+            await self.persister.flush()
+
+    async def close(self):
+        """Flush pending writes, drain in-flight work and stop the worker pools."""
+        await self.flush()
+        await asyncio.to_thread(self.executor.shutdown)
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+def _diff_chunks(chunks: List, stored: Dict) -> Dict:
+    """
+    Match new chunks to stored ones by content hash.
+
+    Returns the stored ids to delete, the stored ids whose metadata must be
+    rewritten (moved chunk_index, new filename, ...), and the new chunks that
+    have no stored counterpart and need embedding.
+    """
+    by_hash: Dict[str, List] = {}
+    for chunk_id, text, meta in zip(
+        stored.get("ids") or [], stored.get("documents") or [], stored.get("metadatas") or []
+    ):
+        # Chunks indexed before content hashes were recorded: hash them now.
+        h = (meta or {}).get("content_hash") or chunk_hash(text or "")
+        by_hash.setdefault(h, []).append((chunk_id, meta or {}))
+
+    added, update_ids, update_metadatas = [], [], []
+    unchanged = 0
+    for chunk in chunks:
+        candidates = by_hash.get(chunk.metadata["content_hash"])
+        if not candidates:
+            added.append(chunk)
+            continue
+        chunk_id, old_meta = candidates.pop(0)
+        if old_meta != chunk.metadata:
+            update_ids.append(chunk_id)
+            update_metadatas.append(dict(chunk.metadata))
+        else:
+            unchanged += 1
+
+    delete_ids = [chunk_id for leftovers in by_hash.values() for chunk_id, _ in leftovers]
+    return {
+        "added": added,
+        "delete_ids": delete_ids,
+        "update_ids": update_ids,
+        "update_metadatas": update_metadatas,
+        "unchanged": unchanged,
+    }
+
+
+def hybrid_search(
+    backend: VectorBackend,
+    keyword_index: KeywordIndex,
+    query: str,
+    embedding: List[float],
+    k: int,
+    filter_metadata: Optional[Dict],
+) -> List[Dict]:
+    """
+    Vector top-k fused with BM25 keyword hits (reciprocal-rank fusion).
+
+    Shared by RAGService and the local replica of the shared index, so both
+    rank results identically.
+    """
+    # Each retriever contributes a few extra candidates so fusion can
+    # promote a keyword hit without the prompt growing beyond k chunks.
+    candidates = k * 2 if RAG_HYBRID_SEARCH else k
+
+    vector = backend.query(embedding, candidates, where=filter_metadata)
+    rows = {
+        chunk_id: (text, meta, similarity)
+        for chunk_id, text, meta, similarity in zip(
+            vector["ids"], vector["documents"], vector["metadatas"], vector["similarities"]
+        )
+    }
+    ranked = list(vector["ids"])
+
+    if RAG_HYBRID_SEARCH and len(keyword_index):
+        filter_metadata = filter_metadata or {}
+        # The keyword index can only narrow by document_id; any other filter
+        # key is checked below, so over-fetch to still have enough matches.
+        narrowed = set(filter_metadata) <= {"document_id"}
+        keyword_ids = [
+            chunk_id for chunk_id, _ in keyword_index.search(
+                query, candidates if narrowed else candidates * 4,
+                document_id=filter_metadata.get("document_id"),
+            )
+        ]
+
+        # Keyword-only hits need their text and metadata — and must pass the
+        # filter *before* fusion, so RRF ranks only the filtered set — plus a
+        # similarity on the same scale as the vector hits.
+        missing = [chunk_id for chunk_id in keyword_ids if chunk_id not in rows]
+        if missing:
+            extra = backend.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            query_vector = np.asarray(embedding, dtype=np.float32)
+            for chunk_id, text, meta, vec in zip(
+                extra["ids"], extra["documents"], extra["metadatas"], extra["embeddings"]
+            ):
+                if _matches(meta, filter_metadata):
+                    similarity = float(np.dot(np.asarray(vec, dtype=np.float32), query_vector))
+                    rows[chunk_id] = (text, meta, similarity)
+        keyword_ids = [chunk_id for chunk_id in keyword_ids if chunk_id in rows][:candidates]
+
+        fused = reciprocal_rank_fusion([ranked, keyword_ids], k=RAG_RRF_K)
+        ranked = [chunk_id for chunk_id, _ in fused]
+
+    formatted_results = []
+    for chunk_id in ranked:
+        if chunk_id not in rows:
+            continue
+        text, meta, similarity = rows[chunk_id]
+        formatted_results.append({
+            "id": chunk_id,
+            "content": text,
+            "metadata": meta,
+            "source": meta.get("source", "unknown"),
+            "relevance_score": round(similarity, 4),
+        })
+        if len(formatted_results) == k:
+            break
+
+    return formatted_results
+
+
+def _matches(metadata: Optional[Dict], filter_metadata: Optional[Dict]) -> bool:
+    """Equality check of a metadata dict against a simple Chroma-style filter."""
+    if not filter_metadata:
+        return True
+    metadata = metadata or {}
+    return all(metadata.get(key) == value for key, value in filter_metadata.items())
+
+
 # Singleton instance
-rag_service = RAGService()
\ No newline at end of file
+rag_service = RAGService()
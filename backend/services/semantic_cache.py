@@ -0,0 +1,181 @@
+"""
+semantic_cache.py
+─────────────────
+Answer cache matched by meaning, not by exact prompt.
+
+"how do I auth?" and "How do I authenticate?" embed to nearly the same
+vector and retrieve nearly the same chunks, so the first one's answer is a
+good answer for the second. Each entry keeps the question's embedding (the
+one retrieval already computed), the set of chunks the answer was built
+from, and the answer. A lookup hits when, within the same scope and index
+version:
+
+  • cosine(question, cached question) ≥ `threshold`, and
+  • the retrieved chunk sets overlap by at least `min_context_overlap`
+    (Jaccard) — similar wording that pulled different documents still
+    gets a fresh answer
+
+Any write to an index bumps its version. A lookup at any other version
+than the scope's just misses; the first store at a new version empties the
+scope, so answers never outlive the documents they were built from — and a
+lookup from a request that read the index before a write can't discard the
+entries stored after it.
+"""
+
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class _Entry(NamedTuple):
+    query: str
+    context: frozenset
+    answer: str
+    created_at: float
+
+
+class _Namespace:
+    """One scope's entries plus their query vectors as a single matrix."""
+
+    def __init__(self, index_version: str):
+        self.index_version = index_version
+        self.entries: List[_Entry] = []
+        self.last_used: List[float] = []
+        self.vectors: Optional[np.ndarray] = None     # (capacity, dim), rows [0, len)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold: float,
+        min_context_overlap: float,
+        max_entries: int,
+        ttl_seconds: float,
+    ):
+        self.threshold = threshold
+        self.min_context_overlap = min_context_overlap
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._hit_similarity_sum = 0.0
+
+    def _namespace_for_store_locked(self, scope: str, index_version: str) -> _Namespace:
+        namespace = self._namespaces.get(scope)
+        if namespace is None or namespace.index_version != index_version:
+            if namespace is not None and len(namespace):
+                self.invalidations += 1
+            namespace = self._namespaces[scope] = _Namespace(index_version)
+        return namespace
+
+    # ── Lookup / store ────────────────────────────────────────────────────────
+
+    def lookup(
+        self,
+        scope: str,
+        index_version: str,
+        embedding: Sequence[float],
+        context_ids: Sequence[str],
+    ) -> Optional[Tuple[str, float, str]]:
+        """Best cached (answer, similarity, original question), or None."""
+        query_vector = _unit(embedding)
+        context = frozenset(context_ids)
+        with self._lock:
+            namespace = self._namespaces.get(scope)
+            if namespace is None or namespace.index_version != index_version or not len(namespace):
+                self.misses += 1
+                return None
+
+            similarities = namespace.vectors[:len(namespace)] @ query_vector
+            cutoff = time.time() - self.ttl_seconds
+            for row in np.argsort(-similarities):
+                similarity = float(similarities[row])
+                if similarity < self.threshold:
+                    break
+                entry = namespace.entries[row]
+                if entry.created_at < cutoff:
+                    continue
+                if _jaccard(entry.context, context) < self.min_context_overlap:
+                    continue
+                namespace.last_used[row] = time.time()
+                self.hits += 1
+                self._hit_similarity_sum += similarity
+                return entry.answer, similarity, entry.query
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        scope: str,
+        index_version: str,
+        query: str,
+        embedding: Sequence[float],
+        context_ids: Sequence[str],
+        answer: str,
+    ) -> None:
+        query_vector = _unit(embedding)
+        now = time.time()
+        with self._lock:
+            namespace = self._namespace_for_store_locked(scope, index_version)
+            if namespace.vectors is None or namespace.vectors.shape[1] != query_vector.shape[0]:
+                namespace.vectors = np.zeros((self.max_entries, query_vector.shape[0]), dtype=np.float32)
+                namespace.entries, namespace.last_used = [], []
+
+            entry = _Entry(query, frozenset(context_ids), answer, now)
+            if len(namespace) < self.max_entries:
+                row = len(namespace)
+                namespace.entries.append(entry)
+                namespace.last_used.append(now)
+            else:
+                # Full: expired entries go first, then the least recently used.
+                cutoff = now - self.ttl_seconds
+                row = min(
+                    range(len(namespace)),
+                    key=lambda i: (namespace.entries[i].created_at >= cutoff, namespace.last_used[i]),
+                )
+                namespace.entries[row] = entry
+                namespace.last_used[row] = now
+                self.evictions += 1
+            namespace.vectors[row] = query_vector
+
+    # ── Stats ─────────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "threshold": self.threshold,
+                "min_context_overlap": self.min_context_overlap,
+                "entries": {scope: len(ns) for scope, ns in self._namespaces.items()},
+                "index_versions": {scope: ns.index_version for scope, ns in self._namespaces.items()},
+                "max_entries_per_scope": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "avg_hit_similarity": round(self._hit_similarity_sum / self.hits, 4) if self.hits else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+def _unit(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,266 @@
+"""
+shared_client.py
+────────────────
+Resilient HTTP client for the shared RAG server.
+
+The shared server is somebody's laptop: it sleeps, changes Wi-Fi, reboots.
+A plain httpx client waits out the full timeout on every call while it is
+gone. This wrapper adds:
+
+  • a circuit breaker  — after a few consecutive failures calls fail
+                         immediately; one half-open probe is let through
+                         every `reset_timeout` seconds to detect recovery
+  • split deadlines    — a short connect timeout (LAN peers answer in ms or
+                         not at all) and a separate read timeout
+  • retry with jitter  — for idempotent calls only, on connection errors and
+                         502/503/504
+  • hedged requests    — optionally, if a request hasn't answered after
+                         `hedge_delay`, an identical second one is sent and
+                         whichever finishes first wins
+  • negotiated bodies  — every request advertises the formats and
+                         compression we can read (wire_format.py); read()
+                         decodes large bodies off the event loop
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from backend.services.wire_format import DECODE_OFFLOAD_BYTES, accept_headers, read_response
+
+
+class CircuitOpenError(httpx.RequestError):
+    """Raised without touching the network while the breaker is open."""
+
+
+# Status codes that mean "server alive but can't serve right now".
+_RETRYABLE_STATUS = {502, 503, 504}
+
+
+class CircuitBreaker:
+    """
+    closed    → calls flow; `failure_threshold` consecutive failures open it
+    open      → calls fail fast until `reset_timeout` has passed
+    half_open → a single probe call is allowed; success closes the breaker,
+                failure re-opens it for another `reset_timeout`
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 15.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.short_circuited = 0
+        self.last_error: Optional[str] = None
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def release_probe(self):
+        """The probe was cancelled before it could tell us anything."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        if self.state != "closed":
+            print("🔌 Shared RAG circuit closed — server is answering again")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self, error: str):
+        self.last_error = error
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                print(f"🔌 Shared RAG circuit open for {self.reset_timeout:.0f}s — {error}")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict:
+        retry_in = None
+        if self.state == "open":
+            retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited,
+            "probe_in": retry_in,
+            "last_error": self.last_error,
+        }
+
+
+class SharedClient:
+    """httpx.AsyncClient wrapper with a breaker, retries and hedging."""
+
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float,
+        read_timeout: float,
+        retries: int = 2,
+        backoff: float = 0.2,
+        hedge_delay: float = 0.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._http = httpx.AsyncClient(base_url=base_url, timeout=self.timeout, headers=accept_headers())
+
+        self.requests = 0
+        self.failures = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.bytes_read = 0
+        self.decode_seconds = 0.0
+
+    @property
+    def base_url(self) -> httpx.URL:
+        return self._http.base_url
+
+    def read_timeout(self, seconds: float) -> httpx.Timeout:
+        """Same connect deadline, different read deadline (e.g. for search)."""
+        return httpx.Timeout(seconds, connect=self.timeout.connect)
+
+    # ── Requests ──────────────────────────────────────────────────────────────
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        idempotent: Optional[bool] = None,
+        hedge: bool = False,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Send one logical request. GET/DELETE count as idempotent unless told
+        otherwise; only idempotent requests are retried or hedged.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in ("GET", "HEAD", "DELETE")
+        attempts = 1 + (self.retries if idempotent else 0)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(
+                    f"Shared RAG server marked down ({self.breaker.last_error}); "
+                    f"next probe in {self.breaker.snapshot()['probe_in']}s"
+                )
+            # Half-open lets exactly one call through: this one is the probe.
+            is_probe = self.breaker.state == "half_open"
+            self.requests += 1
+            try:
+                if hedge and idempotent and self.hedge_delay > 0:
+                    response = await self._send_hedged(method, url, **kwargs)
+                else:
+                    response = await self._http.request(method, url, **kwargs)
+            except asyncio.CancelledError:
+                if is_probe:
+                    self.breaker.release_probe()
+                raise
+            except httpx.TransportError as e:
+                self.failures += 1
+                self.breaker.record_failure(f"{type(e).__name__}: {e}" if str(e) else type(e).__name__)
+                if attempt + 1 >= attempts or self.breaker.state == "open":
+                    raise
+            else:
+                if response.status_code >= 500:
+                    self.failures += 1
+                    self.breaker.record_failure(f"HTTP {response.status_code}")
+                else:
+                    self.breaker.record_success()
+                if (response.status_code not in _RETRYABLE_STATUS
+                        or attempt + 1 >= attempts or self.breaker.state == "open"):
+                    return response
+
+            self.retried += 1
+            # Full jitter: a random wait in [0, backoff · 2^attempt].
+            await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    async def _send_hedged(self, method: str, url: str, **kwargs) -> httpx.Response:
+        first = asyncio.create_task(self._http.request(method, url, **kwargs))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+        if done:
+            return first.result()
+
+        self.hedged += 1
+        second = asyncio.create_task(self._http.request(method, url, **kwargs))
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def read(self, response: httpx.Response) -> Any:
+        """Decode a negotiated body (msgpack or JSON, maybe compressed)."""
+        started = time.perf_counter()
+        content = response.content
+        if len(content) > DECODE_OFFLOAD_BYTES:
+            body = await asyncio.to_thread(read_response, content, response.headers)
+        else:
+            body = read_response(content, response.headers)
+        self.bytes_read += len(content)
+        self.decode_seconds += time.perf_counter() - started
+        return body
+
+    # ── Introspection / cleanup ───────────────────────────────────────────────
+
+    def stats(self) -> Dict:
+        return {
+            "base_url": str(self.base_url),
+            "circuit": self.breaker.snapshot(),
+            "connect_timeout_s": self.timeout.connect,
+            "read_timeout_s": self.timeout.read,
+            "requests": self.requests,
+            "failures": self.failures,
+            "retries": self.retried,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "accept": self._http.headers.get("accept"),
+            "bytes_read": self.bytes_read,
+            "decode_ms": round(self.decode_seconds * 1000, 1),
+        }
+
+    async def aclose(self):
+        await self._http.aclose()
@@ -0,0 +1,337 @@
+"""
+shared_pool.py
+──────────────
+The shared corpus spread over one or more server laptops.
+
+SHARED_RAG_URLS lists the nodes. Every document lives on exactly one of
+them, picked by rendezvous (highest-random-weight) hashing of its
+document_id: each node scores hash(node, document_id) and the highest
+score owns the document. Adding a node moves only the ~1/n of documents
+that now score highest on it; nothing else changes owner.
+
+Searches scatter to every node at once, each under its own deadline, and
+the per-node top-k lists are merged into one global top-k by
+relevance_score (all nodes embed with the same model, so the scores are
+comparable). A node that is down or slow drops out of that one answer
+instead of failing it.
+
+Each node has its own SharedClient (and so its own circuit breaker) and,
+with SHARED_RAG_REPLICA=true, its own local replica and changelog cursor.
+"""
+
+import asyncio
+import hashlib
+from typing import Dict, List, NamedTuple, Optional
+
+import httpx
+
+from backend.services.embedding_cache import chunk_hash
+from backend.services.shared_client import SharedClient
+from backend.services.shared_replica import SharedReplica
+
+
+class ShardAnswer(NamedTuple):
+    """One result list per query, and the index version they were read at."""
+    results: List[List[Dict]]
+    index_version: Optional[str]
+
+
+def rendezvous_owner(document_id: str, keys: List[str]) -> int:
+    """Index of the key with the highest hash(key, document_id)."""
+    def weight(key: str) -> int:
+        digest = hashlib.blake2b(f"{key}\x00{document_id}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    return max(range(len(keys)), key=lambda i: weight(keys[i]))
+
+
+def node_key(url: str) -> str:
+    """Stable short name for a node — its replica directory, its hash input."""
+    return hashlib.sha1(url.rstrip("/").lower().encode("utf-8")).hexdigest()[:12]
+
+
+class SharedNode:
+    """One shared server: its client, and optionally a local replica of it."""
+
+    def __init__(self, url: str, client: SharedClient):
+        self.url = url
+        self.key = node_key(url)
+        self.client = client
+        self.replica: Optional[SharedReplica] = None
+
+        self.searches = 0
+        self.deadline_misses = 0
+        self.failures = 0
+
+    # ── Search ────────────────────────────────────────────────────────────────
+
+    async def search_many(
+        self,
+        queries: List[str],
+        k: int,
+        filter_metadata: Optional[Dict],
+        search_timeout: float,
+    ) -> Optional[ShardAnswer]:
+        """
+        This node's top-k per query: from the replica while it is current,
+        otherwise over HTTP, otherwise from a stale replica. None when none
+        of those could answer.
+        """
+        if self.replica is not None:
+            # Read before searching: a sync landing mid-search can only make
+            # the results newer than the version they're labelled with.
+            version = self._replica_version()
+            results = await self.replica.search_many(queries, k=k, filter_metadata=filter_metadata)
+            if results is not None:
+                return ShardAnswer(results, version)
+
+        answer = await self._search_http(queries, k, filter_metadata, search_timeout)
+        if answer is None and self.replica is not None:
+            # Server unreachable — a slightly stale mirror beats no answer.
+            version = self._replica_version()
+            results = await self.replica.search_many(
+                queries, k=k, filter_metadata=filter_metadata, allow_stale=True
+            )
+            if results is not None:
+                print(f"⚠️  Shared server {self.url} unreachable — answered from replica "
+                      f"({self.replica.staleness():.0f}s behind)")
+                answer = ShardAnswer(results, version)
+        return answer
+
+    def _replica_version(self) -> Optional[str]:
+        if self.replica.epoch is None:
+            return None
+        return f"{self.replica.epoch}:{self.replica.version}"
+
+    async def _search_http(
+        self,
+        queries: List[str],
+        k: int,
+        filter_metadata: Optional[Dict],
+        search_timeout: float,
+    ) -> Optional[ShardAnswer]:
+        payload = {"k": k}
+        if filter_metadata and "document_id" in filter_metadata:
+            payload["document_id"] = filter_metadata["document_id"]
+        single_timeout = self.client.read_timeout(search_timeout)
+
+        try:
+            if len(queries) == 1:
+                # Search is read-only: safe to retry and to hedge.
+                return await self._post_search(
+                    "/search", {**payload, "query": queries[0]}, hedge=True, timeout=single_timeout
+                )
+            try:
+                return await self._post_search(
+                    "/search/batch", {**payload, "queries": queries},
+                    timeout=self.client.read_timeout(search_timeout * 4),
+                )
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                # Older shared server without the batch route: one call per query.
+                per_query = await asyncio.gather(*[
+                    self._post_search("/search", {**payload, "query": q}, hedge=True, timeout=single_timeout)
+                    for q in queries
+                ])
+                versions = {answer.index_version for answer in per_query}
+                return ShardAnswer(
+                    [answer.results[0] for answer in per_query],
+                    versions.pop() if len(versions) == 1 else None,
+                )
+
+        except httpx.HTTPStatusError as e:
+            print(f"❌ Shared search HTTP error from {self.url} {e.response.status_code}: {e.response.text}")
+        except httpx.RequestError as e:
+            print(f"❌ Shared server {self.url} unreachable: {e}")
+        self.failures += 1
+        return None
+
+    async def _post_search(self, path: str, payload: Dict, **kwargs) -> ShardAnswer:
+        """
+        POST /search or /search/batch: one result list per query, plus the
+        changelog position the server read them at.
+
+        With a synced replica the server is asked for ids and snippets only
+        (fields="ids") and text/metadata come from the mirror; if the mirror
+        is missing any of the hits, the search is repeated for full results.
+        """
+        result_lists = None
+        if self.replica is not None and self.replica.can_hydrate():
+            ids_only = await self._search_request(path, payload, "ids", **kwargs)
+            result_lists = await self.replica.hydrate(ids_only.results)
+            version = ids_only.index_version
+        if result_lists is None:
+            result_lists, version = await self._search_request(path, payload, "full", **kwargs)
+        return ShardAnswer([[normalize_result(r) for r in hits] for hits in result_lists], version)
+
+    async def _search_request(self, path: str, payload: Dict, fields: str, **kwargs) -> ShardAnswer:
+        resp = await self.client.post(path, json={**payload, "fields": fields}, idempotent=True, **kwargs)
+        resp.raise_for_status()
+        body = await self.client.read(resp)
+        results = body.get("results", [])
+        return ShardAnswer(
+            [results] if path == "/search" else results,
+            f"{body['epoch']}:{body['version']}" if "epoch" in body else None,
+        )
+
+    # ── Introspection ─────────────────────────────────────────────────────────
+
+    async def health(self) -> Dict:
+        try:
+            resp = await self.client.get("/health")
+            resp.raise_for_status()
+            stats = resp.json()
+        except Exception as e:
+            stats = {"status": "unreachable", "detail": str(e)}
+        stats.update(
+            url=self.url,
+            client=self.client.stats(),
+            searches=self.searches,
+            deadline_misses=self.deadline_misses,
+            search_failures=self.failures,
+        )
+        if self.replica is not None:
+            stats["replica"] = self.replica.stats()
+        return stats
+
+
+class SharedPool:
+    """Routes writes to a document's owner node and scatters searches to all."""
+
+    def __init__(self, nodes: List[SharedNode], search_timeout: float, shard_deadline: float):
+        if not nodes:
+            raise ValueError("SharedPool needs at least one node")
+        self.nodes = nodes
+        self.search_timeout = search_timeout
+        self.shard_deadline = shard_deadline
+        self._keys = [node.key for node in nodes]
+
+    @property
+    def urls(self) -> List[str]:
+        return [node.url for node in self.nodes]
+
+    def owner(self, document_id: str) -> SharedNode:
+        return self.nodes[rendezvous_owner(document_id, self._keys)]
+
+    def others(self, node: SharedNode) -> List[SharedNode]:
+        return [other for other in self.nodes if other is not node]
+
+    async def search_many(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filter_metadata: Optional[Dict] = None,
+    ) -> List[List[Dict]]:
+        """Scatter to every node, gather what arrives in time, merge per query."""
+        return (await self.search_many_versioned(queries, k, filter_metadata)).results
+
+    async def search_many_versioned(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filter_metadata: Optional[Dict] = None,
+    ) -> ShardAnswer:
+        """
+        search_many, plus where it read every node's index ("key=epoch:version,…").
+        The version is None when any node didn't answer or didn't report one —
+        the results then aren't a function of a known index state.
+        """
+        if len(self.nodes) == 1:
+            # Nothing to merge, and no deadline shorter than the client's own.
+            node = self.nodes[0]
+            node.searches += 1
+            answer = await node.search_many(queries, k, filter_metadata, self.search_timeout)
+            if answer is None:
+                return ShardAnswer([[] for _ in queries], None)
+            return ShardAnswer(answer.results, _pool_version([node], [answer]))
+
+        # A batch gets the same allowance over the single-query deadline as
+        # its read timeout has over the single-query one.
+        deadline = self.shard_deadline * (1 if len(queries) == 1 else 4)
+
+        async def within(node: SharedNode) -> Optional[ShardAnswer]:
+            node.searches += 1
+            try:
+                return await asyncio.wait_for(
+                    node.search_many(queries, k, filter_metadata, self.search_timeout),
+                    timeout=deadline,
+                )
+            except asyncio.TimeoutError:
+                node.deadline_misses += 1
+                print(f"⚠️  Shard {node.url} missed its {deadline:.1f}s deadline — answering without it")
+            except Exception as e:
+                node.failures += 1
+                print(f"❌ Shard {node.url} search failed: {e}")
+            return None
+
+        per_node = await asyncio.gather(*[within(node) for node in self.nodes])
+        merged = [
+            merge_shard_results(
+                {node.url: answer.results[i] for node, answer in zip(self.nodes, per_node) if answer is not None},
+                k,
+            )
+            for i in range(len(queries))
+        ]
+        return ShardAnswer(merged, _pool_version(self.nodes, per_node))
+
+    async def health(self) -> List[Dict]:
+        return list(await asyncio.gather(*[node.health() for node in self.nodes]))
+
+    async def aclose(self):
+        for node in self.nodes:
+            if node.replica is not None:
+                await node.replica.stop()
+            await node.client.aclose()
+
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+def _pool_version(nodes: List[SharedNode], answers: List[Optional[ShardAnswer]]) -> Optional[str]:
+    if any(answer is None or answer.index_version is None for answer in answers):
+        return None
+    return ",".join(f"{node.key}={answer.index_version}" for node, answer in zip(nodes, answers))
+
+
+def merge_shard_results(results_by_node: Dict[str, List[Dict]], k: int) -> List[Dict]:
+    """Global top-k over per-node lists, each hit tagged with its `shard`."""
+    merged = [
+        {**hit, "shard": url}
+        for url, hits in results_by_node.items()
+        for hit in hits
+    ]
+    # Unscored hits (very old servers) sort last, in their node's order.
+    merged.sort(key=lambda hit: hit["relevance_score"] if hit.get("relevance_score") is not None else -1.0,
+                reverse=True)
+    seen, top = set(), []
+    for hit in merged:
+        # A document briefly on two nodes (mid-rebalance) counts once.
+        key = chunk_hash(hit.get("content", ""))
+        if key in seen:
+            continue
+        seen.add(key)
+        top.append(hit)
+        if len(top) == k:
+            break
+    return top
+
+
+def normalize_result(result: Dict) -> Dict:
+    """
+    Give a shared-server hit the same shape as a local one.
+
+    Older shared servers report `similarity_score`, or a raw Chroma
+    `distance` (squared L2 on unit vectors: d = 2 - 2·cos).
+    """
+    score = result.get("relevance_score")
+    if score is None:
+        score = result.get("similarity_score")
+    if score is None and result.get("distance") is not None:
+        score = 1.0 - float(result["distance"]) / 2.0
+    metadata = result.get("metadata") or {}
+    return {
+        **result,
+        "metadata": metadata,
+        "source": result.get("source") or metadata.get("source", "unknown"),
+        "relevance_score": None if score is None else round(float(score), 4),
+    }
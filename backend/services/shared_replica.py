@@ -0,0 +1,332 @@
+"""
+shared_replica.py
+─────────────────
+Optional read-through mirror of the shared server's index on this laptop.
+
+The replica pulls chunks *with their vectors* from the shared server's
+changelog (GET /changes?since=<seq>) and keeps them in a local flat index
+plus keyword index. Shared-scope searches are then answered here — query
+embedding and ranking on this laptop, no LAN round trip, no load on the
+server — as long as the last complete sync is within `max_staleness`
+seconds. When the mirror is behind, RAGManager falls back to HTTP.
+
+Changelog protocol (served by shared_rag_service.py):
+
+  GET /changes?since=<seq>&limit=<n>
+  → {
+      "epoch": "…",            # changes when the server's log restarts
+      "version": 1234,         # head sequence number
+      "next": 1200,            # pass as `since` for the next page
+      "has_more": true,
+      "embedding_model": "sentence-transformers/all-MiniLM-L6-v2",
+      "changes": [
+        {"seq": 1199, "op": "upsert", "id": "…", "content": "…",
+         "metadata": {…}, "embedding": [...]},   # float32 bytes in msgpack
+        {"seq": 1200, "op": "delete", "id": "…"}
+      ]
+    }
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from backend.core.config import EMBEDDING_MODEL
+from backend.services.keyword_index import KeywordIndex
+from backend.services.rag_service import RAGService, hybrid_search
+from backend.services.shared_client import SharedClient
+from backend.services.vector_backends import FlatIndexBackend
+from backend.services.wire_format import as_vector
+
+
+class SharedReplica:
+    """Local flat-index copy of the shared corpus, kept current by polling."""
+
+    def __init__(
+        self,
+        client: SharedClient,
+        local: RAGService,
+        directory: str,
+        max_staleness: float,
+        sync_interval: float,
+        page_size: int = 500,
+    ):
+        self.client = client
+        self.local = local
+        self.directory = directory
+        self.max_staleness = max_staleness
+        self.sync_interval = sync_interval
+        self.page_size = page_size
+
+        self.backend: Optional[FlatIndexBackend] = None
+        self.keyword_index: Optional[KeywordIndex] = None
+        self.epoch: Optional[str] = None
+        self.version = 0
+        self.server_version: Optional[int] = None
+        self.synced_at: Optional[float] = None        # wall clock, for display
+        self._synced_mono: Optional[float] = None     # monotonic, for staleness
+        self.disabled_reason: Optional[str] = None
+
+        self.served = 0
+        self.fallbacks = 0
+        self.changes_applied = 0
+        self.hydrated = 0
+        self.hydration_misses = 0
+        self.last_error: Optional[str] = None
+
+        self._sync_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    @property
+    def _state_path(self) -> str:
+        return os.path.join(self.directory, "replica.json")
+
+    async def start(self):
+        """Open the on-disk mirror and start the background sync loop."""
+        await asyncio.to_thread(self._open_sync)
+        print(f"🪞 Shared replica loaded — {self.backend.count()} chunks at version {self.version}")
+        self._task = asyncio.create_task(self._run())
+
+    def _open_sync(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.backend = FlatIndexBackend(os.path.join(self.directory, "flat_index"))
+        self.keyword_index = KeywordIndex(os.path.join(self.directory, "keyword_index.json"))
+        self.keyword_index.load()
+        if os.path.exists(self._state_path):
+            with open(self._state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.epoch = state.get("epoch")
+            self.version = state.get("version", 0)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def request_sync(self):
+        """Wake the sync loop now (e.g. right after we wrote to the shared DB)."""
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e) or type(e).__name__
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    # ── Sync ──────────────────────────────────────────────────────────────────
+
+    async def sync(self) -> int:
+        """Pull changelog pages until caught up; returns the changes applied."""
+        if self.disabled_reason:
+            return 0
+        applied = 0
+        async with self._sync_lock:
+            while True:
+                resp = await self.client.get(
+                    "/changes", params={"since": self.version, "limit": self.page_size}
+                )
+                resp.raise_for_status()
+                page = await self.client.read(resp)
+
+                model = page.get("embedding_model")
+                if model and model != EMBEDDING_MODEL:
+                    # Vectors from another model can't be compared with our
+                    # query embeddings; leave shared search to the server.
+                    self.disabled_reason = f"shared server embeds with {model}, this laptop with {EMBEDDING_MODEL}"
+                    print(f"⚠️  Shared replica disabled — {self.disabled_reason}")
+                    return applied
+
+                if page.get("epoch") != self.epoch:
+                    if self.epoch is not None or self.version:
+                        print("🪞 Shared changelog restarted — rebuilding replica from scratch")
+                    await asyncio.to_thread(self._reset_sync)
+                    self.epoch = page.get("epoch")
+                    if self.version:
+                        self.version = 0
+                        continue
+
+                changes = page.get("changes", [])
+                if changes:
+                    await asyncio.to_thread(self._apply_sync, changes)
+                    applied += len(changes)
+                self.version = page.get("next", self.version)
+                self.server_version = page.get("version", self.version)
+
+                if not page.get("has_more"):
+                    break
+
+            if applied:
+                await asyncio.to_thread(self._persist_sync)
+            self.synced_at = time.time()
+            self._synced_mono = time.monotonic()
+            self.last_error = None
+        return applied
+
+    def _apply_sync(self, changes: List[Dict]):
+        """Apply changelog entries in order, batching runs of the same op."""
+        run: List[Dict] = []
+        for change in changes + [None]:
+            if run and (change is None or change["op"] != run[0]["op"]):
+                ids = [c["id"] for c in run]
+                if run[0]["op"] == "upsert":
+                    texts = [c["content"] for c in run]
+                    metadatas = [c.get("metadata") or {} for c in run]
+                    self.backend.upsert(ids, [as_vector(c["embedding"]) for c in run], texts, metadatas)
+                    self.keyword_index.add_many(ids, texts, metadatas)
+                else:
+                    self.backend.delete(ids)
+                    self.keyword_index.remove_ids(ids)
+                run = []
+            if change is not None:
+                run.append(change)
+        self.changes_applied += len(changes)
+
+    def _reset_sync(self):
+        ids = self.backend.get(include=[])["ids"]
+        self.backend.delete(ids)
+        self.keyword_index.remove_ids(ids)
+
+    def _persist_sync(self):
+        self.backend.persist()
+        self.keyword_index.save()
+        tmp = self._state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"epoch": self.epoch, "version": self.version}, f)
+        os.replace(tmp, self._state_path)
+
+    # ── Search ────────────────────────────────────────────────────────────────
+
+    def staleness(self) -> Optional[float]:
+        """Seconds since the mirror last caught up with the server."""
+        if self._synced_mono is None:
+            return None
+        return time.monotonic() - self._synced_mono
+
+    def _usable(self) -> bool:
+        """Synced at least once and able to embed queries, however long ago."""
+        return (
+            self.disabled_reason is None
+            and self.backend is not None
+            and self.local.is_initialized
+            and self.synced_at is not None
+        )
+
+    def is_fresh(self) -> bool:
+        age = self.staleness()
+        return self._usable() and age is not None and age <= self.max_staleness
+
+    async def search(
+        self,
+        query: str,
+        k: int = 5,
+        filter_metadata: Optional[Dict] = None,
+        allow_stale: bool = False,
+    ) -> Optional[List[Dict]]:
+        """
+        Answer a shared-scope search locally. Returns None when the mirror is
+        too far behind (or unusable) and the caller should ask the server.
+        """
+        if not self.is_fresh() and not (allow_stale and self._usable()):
+            self.fallbacks += 1
+            return None
+
+        results = await self.search_many([query], k, filter_metadata, allow_stale=True)
+        return results[0]
+
+    async def search_many(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filter_metadata: Optional[Dict] = None,
+        allow_stale: bool = False,
+    ) -> Optional[List[List[Dict]]]:
+        """Batch form of search(); one encoder call for all the queries."""
+        if not self.is_fresh() and not (allow_stale and self._usable()):
+            self.fallbacks += 1
+            return None
+
+        embeddings = await self.local.embed_queries(queries)
+        results = await self.local.executor.query.run(self._search_many_sync, queries, embeddings, k, filter_metadata)
+        self.served += len(queries)
+        return results
+
+    def _search_many_sync(self, queries, embeddings, k, filter_metadata) -> List[List[Dict]]:
+        return [
+            hybrid_search(self.backend, self.keyword_index, query, embedding, k, filter_metadata or None)
+            for query, embedding in zip(queries, embeddings)
+        ]
+
+    def can_hydrate(self) -> bool:
+        """Worth asking the server for ids only (see hydrate())."""
+        return self._usable()
+
+    async def hydrate(self, result_lists: List[List[Dict]]) -> Optional[List[List[Dict]]]:
+        """
+        Fill in content and metadata for id-only hits (fields="ids") from the
+        mirror. Returns None if any hit is a chunk the mirror hasn't pulled
+        yet — the caller should then ask the server for full results.
+        """
+        return await self.local.executor.query.run(self._hydrate_sync, result_lists)
+
+    def _hydrate_sync(self, result_lists: List[List[Dict]]) -> Optional[List[List[Dict]]]:
+        wanted = list({hit["id"] for hits in result_lists for hit in hits if "content" not in hit})
+        rows = {}
+        if wanted:
+            stored = self.backend.get(ids=wanted, include=["documents", "metadatas"])
+            rows = {
+                chunk_id: (text, meta)
+                for chunk_id, text, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])
+            }
+            if len(rows) < len(wanted):
+                self.hydration_misses += 1
+                return None
+
+        hydrated = []
+        for hits in result_lists:
+            full = []
+            for hit in hits:
+                if "content" not in hit:
+                    text, meta = rows[hit["id"]]
+                    hit = {key: value for key, value in hit.items() if key != "snippet"}
+                    hit.update(content=text, metadata=meta)
+                full.append(hit)
+            hydrated.append(full)
+        self.hydrated += len(wanted)
+        return hydrated
+
+    def stats(self) -> Dict:
+        age = self.staleness()
+        return {
+            "enabled": self.disabled_reason is None,
+            "disabled_reason": self.disabled_reason,
+            "fresh": self.is_fresh(),
+            "chunks": self.backend.count() if self.backend else 0,
+            "version": self.version,
+            "server_version": self.server_version,
+            "staleness_seconds": round(age, 1) if age is not None else None,
+            "max_staleness_seconds": self.max_staleness,
+            "last_synced_at": self.synced_at,
+            "changes_applied": self.changes_applied,
+            "searches_served": self.served,
+            "fallbacks_to_http": self.fallbacks,
+            "chunks_hydrated": self.hydrated,
+            "hydration_misses": self.hydration_misses,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,57 @@
+"""
+single_flight.py
+────────────────
+Request coalescing: concurrent calls with the same key share one execution.
+
+When several teammates ask the same question at the same moment, each one
+misses the answer cache and would start its own identical Ollama generation
+(or search), queueing behind the others. With SingleFlight the first caller
+for a key runs the work; everyone who arrives while it is still running
+awaits that same result — or that same exception.
+
+  • the work runs in its own task, so a caller that disconnects (and is
+    cancelled) doesn't cancel the answer the others are waiting for
+  • a key is forgotten as soon as its execution finishes — this is not a
+    cache, later callers start a fresh run
+  • counters: calls, executions, coalesced calls and the dedup ratio
+    (coalesced / calls)
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await `fn()`, or the identical call already running under `key`."""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            task.exception()        # retrieved, even if every caller gave up
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "dedup_ratio": round(self.coalesced / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._in_flight),
+        }
@@ -0,0 +1,661 @@
+"""Pluggable vector storage behind RAGService
+
+RAG_VECTOR_BACKEND selects the store per deployment:
+
+  chroma  → the existing langchain Chroma collection (default)
+  flat    → exact brute-force search over a memory-mapped float32 .npy
+            matrix plus a JSON metadata sidecar. Embeddings are normalized,
+            so a dot product is the cosine similarity; top-k comes from a
+            vectorized argpartition. Ideal for per-laptop corpora of a few
+            tens of thousands of chunks: no HNSW overhead, exact recall.
+            Vectors can be stored as float16 or int8 (RAG_FLAT_DTYPE) with
+            optional float32 rescoring of the top candidates;
+            `quantization_recall_report` measures what that costs.
+
+Both backends expose the same small API (upsert / query / get / delete /
+update_metadatas / count / persist). Results use Chroma's dict-of-lists
+shape so callers don't care which backend answered.
+"""
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class VectorBackend:
+    """Interface shared by every vector store implementation."""
+
+    name = "base"
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]],
+               documents: List[str], metadatas: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def query(self, embedding: List[float], k: int, where: Optional[Dict] = None) -> Dict:
+        """Top-k by cosine similarity: {"ids", "documents", "metadatas", "similarities"}."""
+        raise NotImplementedError
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Sequence[str] = ("documents", "metadatas"), limit: Optional[int] = None) -> Dict:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def persist(self) -> None:
+        raise NotImplementedError
+
+    def full_precision_matrix(self) -> Optional[Tuple[List[str], np.ndarray]]:
+        """(ids, float32 vectors) of every stored chunk, or None when only
+        quantized vectors are kept."""
+        result = self.get(include=["embeddings"])
+        if not result["ids"]:
+            return None
+        return result["ids"], np.asarray(result["embeddings"], dtype=np.float32)
+
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+
+# ── Chroma ────────────────────────────────────────────────────────────────────
+
+class ChromaBackend(VectorBackend):
+    name = "chroma"
+
+    def __init__(self, persist_directory: str, embeddings):
+        from langchain.vectorstores import Chroma
+
+        self.vectorstore = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=embeddings
+        )
+        self._collection = self.vectorstore._collection
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, embedding, k, where=None):
+        n = min(k, self._collection.count())
+        if n <= 0:
+            return {"ids": [], "documents": [], "metadatas": [], "similarities": []}
+        result = self._collection.query(
+            query_embeddings=[embedding],
+            n_results=n,
+            where=where or None,
+            include=["documents", "metadatas", "distances"],
+        )
+        # langchain's collection uses squared L2; on unit vectors
+        # ||a - b||² = 2 - 2·cos(a, b).
+        return {
+            "ids": result["ids"][0],
+            "documents": result["documents"][0],
+            "metadatas": result["metadatas"][0],
+            "similarities": [1.0 - d / 2.0 for d in result["distances"][0]],
+        }
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas"), limit=None):
+        return self._collection.get(ids=ids, where=where or None, include=list(include), limit=limit)
+
+    def delete(self, ids):
+        if ids:
+            self._collection.delete(ids=ids)
+
+    def update_metadatas(self, ids, metadatas):
+        if ids:
+            self._collection.update(ids=ids, metadatas=metadatas)
+
+    def count(self):
+        return self._collection.count()
+
+    def persist(self):
+        self.vectorstore.persist()
+
+
+# ── Scalar quantization ───────────────────────────────────────────────────────
+# float16 halves the matrix; int8 quarters it, with one float32 scale per
+# vector (max |component| / 127) so every row uses the full code range.
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+# Rows are widened to float32 in blocks of this many before the dot product,
+# so scoring a quantized matrix never materializes a full float32 copy.
+_SCORE_BLOCK = 16384
+
+
+def encode_vectors(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(codes, per-row scales) for float32 `vectors`; scales only for int8."""
+    if dtype == "float32":
+        return vectors.astype(np.float32, copy=False), None
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown storage dtype: {dtype}")
+
+
+def decode_vectors(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    vectors = codes.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+    return vectors
+
+
+def score_vectors(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+    """Approximate dot products of every stored row with `query`."""
+    if codes.dtype == np.float32:
+        return codes @ query
+    scores = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], _SCORE_BLOCK):
+        block = codes[start:start + _SCORE_BLOCK].astype(np.float32)
+        scores[start:start + _SCORE_BLOCK] = block @ query
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def _top_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        picked = np.argpartition(-scores, k - 1)[:k]
+    else:
+        picked = np.arange(len(scores))
+    return picked[np.argsort(-scores[picked])][:k]
+
+
+def bytes_per_vector(dim: int, dtype: str) -> int:
+    return dim * np.dtype(dtype).itemsize + (4 if dtype == "int8" else 0)
+
+
+def quantization_recall_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    dtypes: Sequence[str] = ("float16", "int8"),
+    rescore_factor: int = 4,
+    query_rows: Optional[np.ndarray] = None,
+) -> Dict:
+    """
+    Recall@k of each storage dtype against exact float32 search.
+
+    `vectors` is the full-precision corpus matrix and `queries` the query
+    vectors. When the queries are corpus rows themselves, pass their row
+    numbers as `query_rows` so the trivial self-match is left out of every
+    ranking. "recall_rescored" re-ranks the top k × rescore_factor
+    approximate candidates with the float32 vectors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    n, dim = vectors.shape
+    k = min(k, n - (1 if query_rows is not None else 0))
+    if k <= 0 or not len(queries):
+        return {"error": "Not enough vectors to measure recall"}
+
+    def ranking(scores: np.ndarray, i: int, top: int) -> np.ndarray:
+        if query_rows is not None:
+            scores[query_rows[i]] = -np.inf
+        return _top_rows(scores, top)
+
+    truth = [set(ranking(vectors @ q, i, k).tolist()) for i, q in enumerate(queries)]
+    full_bytes = bytes_per_vector(dim, "float32")
+    report = {
+        "k": k,
+        "vectors": n,
+        "queries": len(queries),
+        "dimension": dim,
+        "rescore_factor": rescore_factor,
+        "modes": {
+            "float32": {"recall": 1.0, "bytes_per_vector": full_bytes, "size_ratio": 1.0},
+        },
+    }
+    for dtype in dtypes:
+        if dtype == "float32":
+            continue
+        codes, scales = encode_vectors(vectors, dtype)
+        plain = rescored = 0
+        for i, q in enumerate(queries):
+            approx = score_vectors(codes, scales, q)
+            candidates = ranking(approx, i, min(n, k * max(1, rescore_factor)))
+            if query_rows is not None:
+                # With few vectors the -inf self row is still among the picks.
+                candidates = candidates[candidates != query_rows[i]]
+            plain += len(truth[i] & set(candidates[:k].tolist()))
+            exact = vectors[candidates] @ q
+            reranked = candidates[np.argsort(-exact)][:k]
+            rescored += len(truth[i] & set(reranked.tolist()))
+        size = bytes_per_vector(dim, dtype)
+        report["modes"][dtype] = {
+            "recall": round(plain / (k * len(queries)), 4),
+            "recall_rescored": round(rescored / (k * len(queries)), 4),
+            "bytes_per_vector": size,
+            "size_ratio": round(size / full_bytes, 3),
+        }
+    return report
+
+
+# ── Flat (NumPy, memory-mapped) ───────────────────────────────────────────────
+
+class FlatIndexBackend(VectorBackend):
+    """
+    Exact search over a memory-mapped (capacity × dim) vector matrix.
+
+    Rows are appended; deletes leave tombstones that are compacted away on
+    persist once they make up a quarter of the matrix. The JSON sidecar is
+    the commit record: rows past its `count` are ignored on load, so a crash
+    between persists never surfaces half-written vectors.
+
+    `dtype` selects how vectors are stored (float32, float16 or int8). With
+    `rescore`, a float32 copy is kept on disk as well: the quantized matrix
+    picks the top k × rescore_factor candidates and only those rows of the
+    full-precision copy are read to re-rank them.
+    """
+
+    name = "flat"
+
+    def __init__(self, directory: str, dtype: str = "float32", rescore: bool = False, rescore_factor: int = 4):
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown storage dtype: {dtype} (expected one of {', '.join(STORAGE_DTYPES)})")
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+
+        self.dtype = dtype
+        # A float32 matrix is already exact; there is nothing to rescore with.
+        self.rescore = rescore and dtype != "float32"
+        self.rescore_factor = max(1, rescore_factor)
+
+        self.dim: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._full: Optional[np.ndarray] = None
+        self._generation: Optional[str] = None
+        self._count = 0
+        self._ids: List[Optional[str]] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict]] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_of: Dict[str, int] = {}
+        self._rows_by_document: Dict[str, set] = {}
+        self._stale_files: List[str] = []
+        self._load()
+
+    # ── Storage ───────────────────────────────────────────────────────────────
+
+    @property
+    def _sidecar_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def _files(self, generation: Optional[str], dtype: str, rescore: bool) -> List[str]:
+        """Matrix files making up one generation of the index."""
+        if generation is None:
+            return []
+        names = [f"vectors-{generation}.npy"]
+        if dtype == "int8":
+            names.append(f"scales-{generation}.npy")
+        if rescore:
+            names.append(f"full-{generation}.npy")
+        return names
+
+    def _open(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.directory, name), mmap_mode="r+")
+
+    def _load(self):
+        if not os.path.exists(self._sidecar_path):
+            self._remove_orphans()
+            return
+        with open(self._sidecar_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self._count = meta["count"]
+        self._ids = meta["ids"]
+        self._documents = meta["documents"]
+        self._metadatas = meta["metadatas"]
+        # Indexes written before quantization existed only carry vectors_file.
+        stored_dtype = meta.get("dtype", "float32")
+        stored_rescore = meta.get("rescore", False)
+        self._generation = meta.get("generation") or meta["vectors_file"][len("vectors-"):-len(".npy")]
+
+        self._vectors = self._open(f"vectors-{self._generation}.npy")
+        if stored_dtype == "int8":
+            self._scales = self._open(f"scales-{self._generation}.npy")
+        if stored_rescore:
+            self._full = self._open(f"full-{self._generation}.npy")
+        self._alive = np.zeros(self._vectors.shape[0], dtype=bool)
+        for row, chunk_id in enumerate(self._ids):
+            if chunk_id is not None:
+                self._alive[row] = True
+                self._index_row(row)
+
+        if (stored_dtype, stored_rescore) != (self.dtype, self.rescore):
+            self._reencode(stored_dtype, stored_rescore)
+        self._remove_orphans()
+
+    def _reencode(self, stored_dtype: str, stored_rescore: bool):
+        """Rewrite the matrix after RAG_FLAT_DTYPE / RAG_FLAT_RESCORE changed."""
+        if stored_dtype != "float32" and not stored_rescore and self.dtype != stored_dtype:
+            print(f"⚠️ Flat index: converting {stored_dtype} → {self.dtype} without a float32 copy; "
+                  f"re-upload documents for full precision")
+        print(f"📦 Flat index: re-encoding {self._count} rows as {self.dtype}"
+              f"{' + float32 rescore copy' if self.rescore else ''}")
+        source = self._float32_rows(0, self._count)
+        old_files = self._files(self._generation, stored_dtype, stored_rescore)
+        self._vectors = self._scales = self._full = None
+        self._generation = None
+        capacity = max(1024, self._count * 2)
+        alive = self._alive[:self._count].copy()
+        self._allocate(capacity, copy_prefix=False)
+        self._write_rows(np.arange(self._count), source)
+        self._alive[:self._count] = alive
+        self._stale_files.extend(old_files)
+        self.persist()
+
+    def _remove_orphans(self):
+        """Matrices from a grow/compaction that never reached the sidecar."""
+        current = set(self._files(self._generation, self.dtype, self.rescore))
+        for name in os.listdir(self.directory):
+            if name.startswith(("vectors-", "scales-", "full-")) and name.endswith(".npy") and name not in current:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _index_row(self, row: int):
+        self._row_of[self._ids[row]] = row
+        document_id = (self._metadatas[row] or {}).get("document_id")
+        if document_id is not None:
+            self._rows_by_document.setdefault(document_id, set()).add(row)
+
+    def _unindex_row(self, row: int):
+        self._row_of.pop(self._ids[row], None)
+        document_id = (self._metadatas[row] or {}).get("document_id")
+        rows = self._rows_by_document.get(document_id)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self._rows_by_document[document_id]
+
+    def _allocate(self, capacity: int, copy_prefix: bool = True):
+        """New memmapped matrices holding the live prefix of the old ones."""
+        generation = uuid.uuid4().hex[:12]
+
+        def new(prefix: str, dtype, shape) -> np.ndarray:
+            return np.lib.format.open_memmap(
+                os.path.join(self.directory, f"{prefix}-{generation}.npy"), mode="w+", dtype=dtype, shape=shape
+            )
+
+        vectors = new("vectors", np.dtype(self.dtype), (capacity, self.dim))
+        scales = new("scales", np.float32, (capacity,)) if self.dtype == "int8" else None
+        full = new("full", np.float32, (capacity, self.dim)) if self.rescore else None
+        if copy_prefix and self._vectors is not None and self._count:
+            vectors[:self._count] = self._vectors[:self._count]
+            if scales is not None:
+                scales[:self._count] = self._scales[:self._count]
+            if full is not None:
+                full[:self._count] = self._full[:self._count]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._count] = self._alive[:self._count]
+        # Readers may still hold the old mappings; delete them after persist.
+        self._stale_files.extend(self._files(self._generation, self.dtype, self.rescore))
+        self._vectors, self._scales, self._full = vectors, scales, full
+        self._generation, self._alive = generation, alive
+
+    def _ensure_capacity(self, rows_needed: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows_needed <= capacity:
+            return
+        self._allocate(max(1024, capacity * 2, rows_needed))
+
+    def _write_rows(self, rows: np.ndarray, vectors: np.ndarray):
+        codes, scales = encode_vectors(vectors, self.dtype)
+        self._vectors[rows] = codes
+        if self._scales is not None:
+            self._scales[rows] = scales
+        if self._full is not None:
+            self._full[rows] = vectors
+
+    def _float32_rows(self, start: int, stop: int) -> np.ndarray:
+        """Best available float32 version of rows [start, stop)."""
+        if self._full is not None:
+            return np.array(self._full[start:stop])
+        scales = None if self._scales is None else self._scales[start:stop]
+        return decode_vectors(self._vectors[start:stop], scales)
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != index dimension {self.dim}")
+
+            new = [i for i, chunk_id in enumerate(ids) if chunk_id not in self._row_of]
+            self._ensure_capacity(self._count + len(new))
+
+            rows = []
+            for i, chunk_id in enumerate(ids):
+                row = self._row_of.get(chunk_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._ids.append(chunk_id)
+                    self._documents.append(documents[i])
+                    self._metadatas.append(dict(metadatas[i] or {}))
+                else:
+                    self._unindex_row(row)
+                    self._documents[row] = documents[i]
+                    self._metadatas[row] = dict(metadatas[i] or {})
+                self._alive[row] = True
+                self._index_row(row)
+                rows.append(row)
+            self._write_rows(np.asarray(rows), vectors)
+
+    def delete(self, ids):
+        with self._lock:
+            for chunk_id in ids:
+                row = self._row_of.get(chunk_id)
+                if row is None:
+                    continue
+                self._unindex_row(row)
+                self._alive[row] = False
+                self._ids[row] = None
+                self._documents[row] = None
+                self._metadatas[row] = None
+
+    def update_metadatas(self, ids, metadatas):
+        with self._lock:
+            for chunk_id, meta in zip(ids, metadatas):
+                row = self._row_of.get(chunk_id)
+                if row is None:
+                    continue
+                self._unindex_row(row)
+                self._metadatas[row] = dict(meta or {})
+                self._index_row(row)
+
+    def persist(self):
+        with self._lock:
+            if self._vectors is None:
+                return
+            tombstones = self._count - len(self._row_of)
+            if tombstones and tombstones * 4 >= self._count:
+                self._compact()
+            for matrix in (self._vectors, self._scales, self._full):
+                if matrix is not None:
+                    matrix.flush()
+            payload = {
+                "dim": self.dim,
+                "count": self._count,
+                "dtype": self.dtype,
+                "rescore": self.rescore,
+                "generation": self._generation,
+                "vectors_file": f"vectors-{self._generation}.npy",
+                "ids": self._ids,
+                "documents": self._documents,
+                "metadatas": self._metadatas,
+            }
+            tmp = self._sidecar_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp, self._sidecar_path)
+
+            for name in self._stale_files:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass  # still mapped somewhere (Windows) — retried next persist
+            self._stale_files = [
+                name for name in self._stale_files
+                if os.path.exists(os.path.join(self.directory, name))
+            ]
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._count])
+        old_vectors, old_scales, old_full = self._vectors, self._scales, self._full
+        self._ids = [self._ids[r] for r in keep]
+        self._documents = [self._documents[r] for r in keep]
+        self._metadatas = [self._metadatas[r] for r in keep]
+        self._count = 0
+        self._allocate(max(1024, len(keep) * 2), copy_prefix=False)
+        self._vectors[:len(keep)] = old_vectors[keep]
+        if old_scales is not None:
+            self._scales[:len(keep)] = old_scales[keep]
+        if old_full is not None:
+            self._full[:len(keep)] = old_full[keep]
+        self._count = len(keep)
+        self._alive[:self._count] = True
+        self._row_of, self._rows_by_document = {}, {}
+        for row in range(self._count):
+            self._index_row(row)
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def _candidate_mask(self, where: Optional[Dict], n: int, alive: np.ndarray) -> np.ndarray:
+        if not where:
+            return alive
+        mask = np.zeros(n, dtype=bool)
+        if set(where) == {"document_id"}:
+            rows = [r for r in self._rows_by_document.get(where["document_id"], ()) if r < n]
+            mask[rows] = True
+        else:
+            for row in np.flatnonzero(alive):
+                meta = self._metadatas[row] or {}
+                mask[row] = all(meta.get(key) == value for key, value in where.items())
+        return mask & alive
+
+    def query(self, embedding, k, where=None):
+        empty = {"ids": [], "documents": [], "metadatas": [], "similarities": []}
+        with self._lock:
+            n = self._count
+            if not n or self._vectors is None:
+                return empty
+            matrix, scales, full = self._vectors, self._scales, self._full
+            # Rows are mapped back through these same lists: _compact() swaps
+            # in new, reordered ones, so a persist mid-query can't shift them.
+            ids, documents, metadatas = self._ids, self._documents, self._metadatas
+            mask = self._candidate_mask(where, n, self._alive[:n].copy())
+
+        candidates = int(mask.sum())
+        if not candidates:
+            return empty
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = score_vectors(matrix[:n], None if scales is None else scales[:n], query)
+        scores[~mask] = -np.inf
+
+        top = min(k, candidates)
+        if full is not None:
+            # Over-fetch on the quantized scores, re-rank with float32 rows.
+            picked = _top_rows(scores, min(candidates, top * self.rescore_factor))
+            exact = full[picked] @ query
+            order = np.argsort(-exact)[:top]
+            picked = picked[order]
+            similarities = dict(zip(picked.tolist(), exact[order].tolist()))
+        else:
+            picked = _top_rows(scores, top)
+            similarities = scores
+
+        with self._lock:
+            rows = [int(r) for r in picked if ids[r] is not None]
+            return {
+                "ids": [ids[r] for r in rows],
+                "documents": [documents[r] for r in rows],
+                "metadatas": [metadatas[r] for r in rows],
+                "similarities": [float(similarities[r]) for r in rows],
+            }
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas"), limit=None):
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+            else:
+                n = self._count
+                alive = self._alive[:n].copy() if n else np.zeros(0, dtype=bool)
+                rows = [int(r) for r in np.flatnonzero(self._candidate_mask(where, n, alive))]
+            if limit is not None:
+                rows = rows[:limit]
+            result = {"ids": [self._ids[r] for r in rows]}
+            if "documents" in include:
+                result["documents"] = [self._documents[r] for r in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[r] for r in rows]
+            if "embeddings" in include:
+                result["embeddings"] = [self._float32_rows(r, r + 1)[0].tolist() for r in rows]
+            return result
+
+    def full_precision_matrix(self):
+        with self._lock:
+            if self._vectors is None or not self._row_of:
+                return None
+            if self._full is None and self.dtype != "float32":
+                return None
+            rows = np.flatnonzero(self._alive[:self._count])
+            source = self._full if self._full is not None else self._vectors
+            return [self._ids[r] for r in rows], np.array(source[rows], dtype=np.float32)
+
+    def count(self):
+        with self._lock:
+            return len(self._row_of)
+
+    def stats(self):
+        with self._lock:
+            capacity = 0 if self._vectors is None else self._vectors.shape[0]
+            dim = self.dim or 0
+            return {
+                "backend": self.name,
+                "directory": self.directory,
+                "dimension": self.dim,
+                "dtype": self.dtype,
+                "rescore": self.rescore,
+                "rescore_factor": self.rescore_factor if self.rescore else None,
+                "rows": self._count,
+                "live_rows": len(self._row_of),
+                "capacity": capacity,
+                "vector_bytes": capacity * bytes_per_vector(dim, self.dtype),
+                "rescore_bytes": capacity * dim * 4 if self.rescore else 0,
+            }
+
+
+def create_backend(kind: str, persist_directory: str, embeddings, flat_directory: str,
+                   flat_dtype: str = "float32", flat_rescore: bool = False,
+                   flat_rescore_factor: int = 4) -> VectorBackend:
+    if kind == "flat":
+        return FlatIndexBackend(flat_directory, dtype=flat_dtype, rescore=flat_rescore,
+                                rescore_factor=flat_rescore_factor)
+    if kind == "chroma":
+        return ChromaBackend(persist_directory, embeddings)
+    raise ValueError(f"Unknown vector backend: {kind}")
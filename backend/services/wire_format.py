@@ -0,0 +1,301 @@
+"""
+wire_format.py
+──────────────
+Byte-level formats spoken between RAGManager and the shared RAG server.
+
+1. Pre-embedded chunk uploads (POST /documents/upload-vectors)
+
+JSON-encoding 384 floats per chunk costs ~8 KB of text and a slow parse on
+the server; the raw float32 bytes are 1.5 KB and load with one memcpy.
+
+Layout:
+
+    b"RAGC"                       magic
+    u8   version                  = 1
+    u32  header length (big-endian)
+    ...  header, UTF-8 JSON:
+           {"document_id", "filename", "embedding_model", "dim", "count",
+            "dtype": "float32",
+            "chunks": [{"id", "text", "metadata"}, ...]}
+    ...  count × dim little-endian float32 — row i is chunks[i]'s vector
+
+2. Negotiated response bodies (/search, /search/batch, /changes)
+
+The client lists what it can read in Accept / Accept-Encoding; the server
+answers in the best format both sides have:
+
+    Accept: application/msgpack, application/json;q=0.9
+    Accept-Encoding: zstd, gzip
+
+msgpack (optional `msgpack` package) is smaller and faster to parse than
+JSON and carries vectors as raw float32 bytes; JSON is written with orjson
+when installed. Bodies over COMPRESS_MIN_BYTES are compressed with zstd
+(optional `zstandard`) or gzip. A client that sends no Accept header gets
+plain JSON, so old clients and curl keep working.
+"""
+
+import gzip
+import json
+import struct
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_PAYLOAD_MAGIC = b"RAGC"
+CHUNK_PAYLOAD_VERSION = 1
+CHUNK_PAYLOAD_CONTENT_TYPE = "application/x-rag-chunks"
+
+_PREFIX = struct.Struct(">4sBI")
+_VECTOR_DTYPE = np.dtype("<f4")
+
+
+class PayloadError(ValueError):
+    """The payload is truncated, from another format version, or inconsistent."""
+
+
+def encode_chunk_payload(
+    document_id: str,
+    embedding_model: str,
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[Dict],
+    embeddings,
+    filename: Optional[str] = None,
+) -> bytes:
+    if not (len(ids) == len(texts) == len(metadatas) == len(embeddings)):
+        raise PayloadError("ids, texts, metadatas and embeddings must have the same length")
+    if ids:
+        vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=_VECTOR_DTYPE).reshape(len(ids), -1))
+    else:
+        vectors = np.zeros((0, 0), dtype=_VECTOR_DTYPE)
+
+    header = json.dumps({
+        "document_id": document_id,
+        "filename": filename,
+        "embedding_model": embedding_model,
+        "dim": int(vectors.shape[1]),
+        "count": len(ids),
+        "dtype": "float32",
+        "chunks": [
+            {"id": chunk_id, "text": text, "metadata": meta}
+            for chunk_id, text, meta in zip(ids, texts, metadatas)
+        ],
+    }, separators=(",", ":")).encode("utf-8")
+
+    return b"".join((
+        _PREFIX.pack(CHUNK_PAYLOAD_MAGIC, CHUNK_PAYLOAD_VERSION, len(header)),
+        header,
+        vectors.tobytes(),
+    ))
+
+
+def decode_chunk_payload(payload: bytes) -> Dict:
+    """
+    Parse and sanity-check a payload. Returns the header dict with
+    `embeddings` set to a read-only (count, dim) float32 array.
+    """
+    if len(payload) < _PREFIX.size:
+        raise PayloadError("Payload too short")
+    magic, version, header_len = _PREFIX.unpack_from(payload)
+    if magic != CHUNK_PAYLOAD_MAGIC:
+        raise PayloadError("Not a chunk payload")
+    if version != CHUNK_PAYLOAD_VERSION:
+        raise PayloadError(f"Unsupported payload version {version}")
+
+    body_start = _PREFIX.size + header_len
+    if len(payload) < body_start:
+        raise PayloadError("Truncated header")
+    try:
+        header = json.loads(payload[_PREFIX.size:body_start].decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise PayloadError(f"Malformed header: {e}") from e
+
+    count, dim = int(header.get("count", -1)), int(header.get("dim", -1))
+    if header.get("dtype") != "float32" or count < 0 or dim < 0:
+        raise PayloadError("Header must declare dtype float32, count and dim")
+    if len(header.get("chunks") or []) != count:
+        raise PayloadError(f"Header lists {len(header.get('chunks') or [])} chunks, declares {count}")
+    if len(payload) - body_start != count * dim * _VECTOR_DTYPE.itemsize:
+        raise PayloadError(f"Expected {count}×{dim} float32 vectors, got {len(payload) - body_start} bytes")
+
+    vectors = np.frombuffer(payload, dtype=_VECTOR_DTYPE, count=count * dim, offset=body_start)
+    header["embeddings"] = vectors.reshape(count, dim)
+    return header
+
+
+# ── Negotiated response bodies ────────────────────────────────────────────────
+
+MEDIA_JSON = "application/json"
+MEDIA_MSGPACK = "application/msgpack"
+_MSGPACK_ALIASES = {MEDIA_MSGPACK, "application/x-msgpack", "application/vnd.msgpack"}
+
+# Below this a body isn't worth compressing — a search answer for a couple of
+# short chunks fits in one TCP segment either way.
+COMPRESS_MIN_BYTES = 1024
+
+# Bodies larger than this are decoded on a worker thread, not the event loop.
+DECODE_OFFLOAD_BYTES = 64 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def supported_media_types() -> List[str]:
+    """Body formats this process can read and write, best first."""
+    return ([MEDIA_MSGPACK] if msgpack is not None else []) + [MEDIA_JSON]
+
+
+def supported_encodings() -> List[str]:
+    """Compression schemes this process can read and write, best first."""
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def accept_headers() -> Dict[str, str]:
+    """Request headers advertising every format and compression we can decode."""
+    media = supported_media_types()
+    accept = ", ".join(
+        media_type if i == 0 else f"{media_type};q={0.9 - 0.1 * (i - 1):.1f}"
+        for i, media_type in enumerate(media)
+    )
+    return {"Accept": accept, "Accept-Encoding": ", ".join(supported_encodings())}
+
+
+def _preferences(header: str) -> List[Tuple[str, float]]:
+    """Parse an Accept-style header into (value, q) pairs, best first."""
+    prefs = []
+    for position, part in enumerate(header.split(",")):
+        fields = [field.strip() for field in part.split(";")]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        prefs.append((fields[0].lower(), q, position))
+    prefs.sort(key=lambda pref: (-pref[1], pref[2]))
+    return [(value, q) for value, q, _ in prefs if q > 0]
+
+
+def negotiate(accept: str, accept_encoding: str) -> Tuple[str, Optional[str]]:
+    """Pick (media type, content encoding or None) for a response."""
+    media_type = MEDIA_JSON
+    for value, _ in _preferences(accept or ""):
+        if value in _MSGPACK_ALIASES and msgpack is not None:
+            media_type = MEDIA_MSGPACK
+            break
+        if value in (MEDIA_JSON, "application/*", "*/*"):
+            break
+
+    encoding = None
+    available = supported_encodings()
+    for value, _ in _preferences(accept_encoding or ""):
+        if value in available:
+            encoding = value
+            break
+    return media_type, encoding
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def _msgpack_default(obj: Any) -> Any:
+    # Vectors travel as raw little-endian float32 — 4 bytes a dimension
+    # instead of msgpack's 9-byte float64.
+    if isinstance(obj, np.ndarray):
+        return np.ascontiguousarray(obj, dtype=_VECTOR_DTYPE).tobytes()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def encode_body(obj: Any, media_type: str) -> bytes:
+    if media_type == MEDIA_MSGPACK:
+        return msgpack.packb(obj, default=_msgpack_default, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def decode_body(data: bytes, media_type: str) -> Any:
+    if media_type in _MSGPACK_ALIASES:
+        if msgpack is None:
+            raise PayloadError("Response is msgpack but the msgpack package is not installed")
+        return msgpack.unpackb(data, raw=False)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def compress(data: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=5)
+    return data
+
+
+def decompress(data: bytes, encoding: Optional[str]) -> bytes:
+    """
+    Undo Content-Encoding if the HTTP client hasn't already. httpx inflates
+    gzip itself, and zstd only in newer versions — so check the magic bytes
+    rather than trusting the header alone.
+    """
+    if encoding == "zstd" and data[:4] == _ZSTD_MAGIC:
+        if zstandard is None:
+            raise PayloadError("Response is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if encoding == "gzip" and data[:2] == _GZIP_MAGIC:
+        return gzip.decompress(data)
+    return data
+
+
+def render_response(
+    obj: Any,
+    media_type: str,
+    encoding: Optional[str],
+    min_compress: int = COMPRESS_MIN_BYTES,
+) -> Tuple[bytes, Dict[str, str]]:
+    """Encode (and maybe compress) a response body; returns (body, headers)."""
+    body = encode_body(obj, media_type)
+    headers = {"Content-Type": media_type, "Vary": "Accept, Accept-Encoding"}
+    if encoding and len(body) >= min_compress:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return body, headers
+
+
+def read_response(content: bytes, headers: Mapping[str, str]) -> Any:
+    """Decode a response body written by render_response (or plain JSON)."""
+    media_type = headers.get("content-type", MEDIA_JSON).split(";")[0].strip().lower()
+    encoding = (headers.get("content-encoding") or "").strip().lower() or None
+    return decode_body(decompress(content, encoding), media_type)
+
+
+def as_vector(value) -> np.ndarray:
+    """An embedding from a decoded body: a float list (JSON) or float32 bytes (msgpack)."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=_VECTOR_DTYPE)
+    return np.asarray(value, dtype=np.float32)
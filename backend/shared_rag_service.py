@@ -0,0 +1,616 @@
+"""
+shared_rag_service.py
+─────────────────────
+The shared RAG server — run this on the "server laptop" the team's
+rag_manager.py points SHARED_RAG_URL at.
+
+    uvicorn backend.shared_rag_service:app --host 0.0.0.0 --port 8001
+
+It serves the protocol RAGManager speaks on top of the same RAGService the
+main app uses locally:
+
+    GET    /health                  status, chunk count, changelog version
+    POST   /search                  {query, k, document_id?}
+    POST   /search/batch            {queries, k, document_id?}
+    POST   /documents/upload        multipart file (+ document_id, wait)
+    POST   /documents/upload-vectors  pre-embedded chunks (wire_format.py)
+    GET    /documents               indexed documents
+    GET    /documents/{id}          one document's status
+    DELETE /documents/{id}
+    GET    /changes?since=&limit=   changelog for local replicas
+
+Search and changelog responses are content-negotiated (msgpack / JSON,
+zstd / gzip) — see services/wire_format.py.
+
+Concurrency:
+  • handlers are async; embedding, index reads and writes run on
+    RAGService's worker lanes, never on the event loop
+  • uploads are saved and queued; SHARED_INGEST_WORKERS tasks drain the
+    queue, so a burst of uploads can't starve searches
+  • searches keep running while documents are being indexed — the query and
+    ingest lanes are separate and the vector store serves reads mid-write
+  • run ONE uvicorn worker process: the index lives in this process, and
+    several processes would each hold a diverging copy. Scale searches with
+    RAG_QUERY_WORKERS and ingestion with SHARED_INGEST_WORKERS /
+    RAG_EMBED_WORKERS instead.
+
+All data lives under SHARED_RAG_DATA_DIR (default ./shared_rag_data), so the
+server can run next to the main app on the same laptop.
+"""
+import os
+
+# Point the vector store at the server's own directory before the config
+# module reads it, so it never shares ./vectordb with a local main app.
+SHARED_DATA_DIR = os.path.abspath(os.getenv("SHARED_RAG_DATA_DIR", "./shared_rag_data"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", os.path.join(SHARED_DATA_DIR, "vectordb"))
+
+import asyncio
+import json
+import shutil
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from backend.services.changelog import Changelog
+from backend.services.ingest_pipeline import ChunkBatch
+from backend.services.rag_service import rag_service
+from backend.services.wire_format import (
+    CHUNK_PAYLOAD_CONTENT_TYPE,
+    PayloadError,
+    decode_chunk_payload,
+    negotiate,
+    render_response,
+)
+
+# ── Config ────────────────────────────────────────────────────────────────────
+SHARED_RAG_PORT = int(os.getenv("SHARED_RAG_PORT", "8001"))
+SHARED_UPLOAD_DIR = os.path.join(SHARED_DATA_DIR, "uploads")
+
+# Documents indexed concurrently, and uploads that may wait in the queue
+# before new ones are turned away with 503.
+SHARED_INGEST_WORKERS = int(os.getenv("SHARED_INGEST_WORKERS", "2"))
+SHARED_INGEST_QUEUE_SIZE = int(os.getenv("SHARED_INGEST_QUEUE_SIZE", "100"))
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md", ".docx")
+MAX_BATCH_QUERIES = 256
+MAX_CHANGES_PAGE = 2000
+SNIPPET_CHARS = 200
+
+
+# ── Document registry ─────────────────────────────────────────────────────────
+
+class DocumentRegistry:
+    """document_id → {filename, path, status, chunks, ...}, saved as JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._docs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._docs = json.load(f)
+
+    def get(self, document_id: str) -> Optional[Dict]:
+        with self._lock:
+            doc = self._docs.get(document_id)
+            return dict(doc) if doc else None
+
+    def put(self, document_id: str, **fields) -> Dict:
+        with self._lock:
+            doc = self._docs.setdefault(document_id, {"document_id": document_id})
+            doc.update(fields)
+            return dict(doc)
+
+    def remove(self, document_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._docs.pop(document_id, None)
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            return [dict(doc) for doc in self._docs.values()]
+
+    def save(self) -> None:
+        with self._lock:
+            snapshot = json.dumps(self._docs)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(tmp, self.path)
+
+
+# ── Ingestion queue ───────────────────────────────────────────────────────────
+
+class IngestJob:
+    """A saved file to parse and embed, or chunks that arrived pre-embedded."""
+
+    def __init__(self, document_id: str, filename: str, file_path: Optional[str] = None,
+                 chunks: Optional[ChunkBatch] = None):
+        self.document_id = document_id
+        self.filename = filename
+        self.file_path = file_path
+        self.chunks = chunks
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.time()
+
+
+class IngestQueue:
+    """Bounded queue of uploads indexed by a fixed set of worker tasks."""
+
+    def __init__(self, workers: int, maxsize: int):
+        self.workers = max(1, workers)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks: List[asyncio.Task] = []
+        # document_id → [lock, jobs holding or waiting on it]; dropped at zero
+        self._doc_locks: Dict[str, list] = {}
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 30.0):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️  Shutting down with {self.queue.qsize()} uploads still queued")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def submit(self, job: IngestJob) -> IngestJob:
+        self.queue.put_nowait(job)          # raises asyncio.QueueFull
+        return job
+
+    async def _worker(self):
+        while True:
+            job: IngestJob = await self.queue.get()
+            self.active += 1
+            try:
+                # Two uploads of the same document_id never index concurrently.
+                async with self.document_lock(job.document_id):
+                    result = await _index_document(job)
+                self.completed += 1
+                if not job.done.done():
+                    job.done.set_result(result)
+            except Exception as e:
+                self.failed += 1
+                registry.put(job.document_id, status="failed", error=str(e))
+                if not job.done.done():
+                    job.done.set_exception(e)
+            finally:
+                self.active -= 1
+                self.queue.task_done()
+                await asyncio.to_thread(_save_state)
+
+    @asynccontextmanager
+    async def document_lock(self, document_id: str):
+        """Serializes indexing (and deleting) of one document_id."""
+        entry = self._doc_locks.get(document_id)
+        if entry is None:
+            entry = self._doc_locks[document_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._doc_locks[document_id]
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "queued": self.queue.qsize(),
+            "max_queued": self.queue.maxsize,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+async def _index_document(job: IngestJob) -> Dict:
+    previous = registry.get(job.document_id)
+    registry.put(job.document_id, status="processing", started_at=time.time())
+    metadata = {"source": job.filename, "original_filename": job.filename}
+
+    if job.chunks is not None:
+        # Parsed and embedded on the uploader's laptop: only a write here.
+        chunks = await rag_service.store_embedded_document(job.document_id, job.chunks)
+    elif previous and previous.get("status") == "completed":
+        # Re-upload of a known document: only changed chunks are re-embedded.
+        summary = await rag_service.update_document(job.file_path, job.document_id, metadata)
+        chunks = summary["total_chunks"]
+    else:
+        chunks = await rag_service.add_document(job.file_path, job.document_id, metadata)
+
+    if previous and previous.get("path") not in (None, job.file_path) and os.path.exists(previous["path"]):
+        os.remove(previous["path"])
+
+    return registry.put(
+        job.document_id,
+        status="completed",
+        filename=job.filename,
+        path=job.file_path,
+        chunks=chunks,
+        error=None,
+        indexed_at=time.time(),
+    )
+
+
+# ── State ─────────────────────────────────────────────────────────────────────
+
+os.makedirs(SHARED_UPLOAD_DIR, exist_ok=True)
+registry = DocumentRegistry(os.path.join(SHARED_DATA_DIR, "documents.json"))
+changelog = Changelog(os.path.join(SHARED_DATA_DIR, "changelog.json"))
+ingest_queue: Optional[IngestQueue] = None
+
+
+def _save_state():
+    registry.save()
+    changelog.save()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ingest_queue
+    print("🚀 Starting shared RAG server...")
+    await rag_service.initialize()
+
+    if not changelog.load():
+        # New log over an existing index: every stored chunk is a change.
+        existing = await rag_service.executor.query.run(rag_service.backend.get, None, None, [])
+        changelog.record("upsert", existing["ids"])
+        print(f"📜 New changelog (epoch {changelog.epoch[:8]}) seeded with {len(existing['ids'])} chunks")
+    rag_service.add_change_listener(changelog.record)
+
+    ingest_queue = IngestQueue(SHARED_INGEST_WORKERS, SHARED_INGEST_QUEUE_SIZE)
+    ingest_queue.start()
+    print(f"✅ Shared RAG ready — {rag_service.backend.count()} chunks, "
+          f"{SHARED_INGEST_WORKERS} ingest workers")
+
+    yield
+
+    print("🛑 Shutting down shared RAG server...")
+    await ingest_queue.stop()
+    await rag_service.flush()
+    await asyncio.to_thread(_save_state)
+    await rag_service.close()
+    print("✅ Cleanup complete")
+
+
+app = FastAPI(
+    title="Shared RAG Server",
+    description="Team-wide document store for the Enterprise Code Assistant",
+    version="1.0.0",
+    lifespan=lifespan,
+)
+
+
+# ── Schemas ───────────────────────────────────────────────────────────────────
+
+# fields="ids": each hit is just {id, relevance_score, source, snippet} —
+# for clients that hold a replica and fill in content/metadata themselves.
+ResultFields = Literal["full", "ids"]
+
+
+class SearchRequest(BaseModel):
+    query: str
+    k: int = 5
+    document_id: Optional[str] = None
+    fields: ResultFields = "full"
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = 5
+    document_id: Optional[str] = None
+    fields: ResultFields = "full"
+
+
+def _require_ready():
+    if not rag_service.is_initialized:
+        raise HTTPException(status_code=503, detail="Shared RAG server is still starting")
+
+
+# ── Health ────────────────────────────────────────────────────────────────────
+
+@app.get("/health")
+async def health():
+    ready = rag_service.is_initialized
+    return {
+        "status": "ok" if ready else "starting",
+        "total_chunks": rag_service.backend.count() if ready else 0,
+        "documents": len(registry.all()),
+        "embedding_model": rag_service.embedding_model,
+        "version": changelog.head,
+        "epoch": changelog.epoch,
+        "ingest": ingest_queue.stats() if ingest_queue else None,
+        "executor": rag_service.executor.stats(),
+    }
+
+
+# ── Search ────────────────────────────────────────────────────────────────────
+
+@app.post("/search")
+async def search(request: SearchRequest, http_request: Request):
+    _require_ready()
+    version = _index_version()
+    results = await rag_service.search(
+        query=request.query,
+        k=request.k,
+        filter_metadata={"document_id": request.document_id} if request.document_id else None,
+    )
+    return await _respond(http_request, {
+        "query": request.query,
+        "results": _select_fields(results, request.fields),
+        **version,
+    })
+
+
+@app.post("/search/batch")
+async def search_batch(request: BatchSearchRequest, http_request: Request):
+    _require_ready()
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    version = _index_version()
+    results = await rag_service.search_many(
+        queries=request.queries,
+        k=request.k,
+        filter_metadata={"document_id": request.document_id} if request.document_id else None,
+    )
+    return await _respond(
+        http_request,
+        {"results": [_select_fields(hits, request.fields) for hits in results], **version},
+        offload=len(request.queries) > 8,
+    )
+
+
+def _index_version() -> Dict:
+    """
+    Changelog position for search responses — clients key caches on it.
+    Read before searching: a write landing mid-search can only make the
+    results newer than the version they're labelled with, never older.
+    """
+    return {"epoch": changelog.epoch, "version": changelog.head}
+
+
+def _select_fields(results: List[Dict], fields: str) -> List[Dict]:
+    if fields == "full":
+        return results
+    return [
+        {
+            "id": hit["id"],
+            "relevance_score": hit["relevance_score"],
+            "source": hit["source"],
+            "snippet": hit["content"][:SNIPPET_CHARS],
+        }
+        for hit in results
+    ]
+
+
+async def _respond(http_request: Request, payload: Dict, offload: bool = False) -> Response:
+    """Encode `payload` in the format and compression the client asked for."""
+    media_type, encoding = negotiate(
+        http_request.headers.get("accept", ""), http_request.headers.get("accept-encoding", "")
+    )
+    if offload:
+        body, headers = await asyncio.to_thread(render_response, payload, media_type, encoding)
+    else:
+        body, headers = render_response(payload, media_type, encoding)
+    return Response(content=body, headers=headers)
+
+
+# ── Documents ─────────────────────────────────────────────────────────────────
+
+def _save_upload(source, destination: str):
+    with open(destination, "wb") as out:
+        shutil.copyfileobj(source, out, length=1024 * 1024)
+
+
+@app.post("/documents/upload")
+async def upload_document(
+    file: UploadFile = File(...),
+    document_id: Optional[str] = Form(None),
+    wait: bool = Form(True),
+):
+    """
+    Save the file and queue it for indexing.
+
+    wait=true (default) answers once the document is indexed, with
+    `chunks_indexed`; wait=false answers 202 right away — poll
+    GET /documents/{document_id} for the result.
+    """
+    _require_ready()
+    ext = os.path.splitext(file.filename or "")[1].lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext or 'none'}")
+
+    document_id = document_id or str(uuid.uuid4())
+    # A new name per upload: a re-upload never overwrites the file that an
+    # in-flight job of the same document may still be reading.
+    file_path = os.path.join(SHARED_UPLOAD_DIR, f"{document_id}-{uuid.uuid4().hex[:8]}{ext}")
+    await asyncio.to_thread(_save_upload, file.file, file_path)
+
+    try:
+        return await _enqueue(IngestJob(document_id, file.filename, file_path=file_path), wait)
+    except HTTPException as e:
+        if e.status_code == 503:        # never queued
+            os.remove(file_path)
+        raise
+
+
+@app.post("/documents/upload-vectors")
+async def upload_document_vectors(request: Request, wait: bool = True):
+    """
+    Store chunks the uploader already parsed and embedded (see
+    services/wire_format.py). The payload's embedding model and dimension
+    must match this server's — vectors from another model aren't comparable.
+    """
+    _require_ready()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type != CHUNK_PAYLOAD_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Expected {CHUNK_PAYLOAD_CONTENT_TYPE}")
+
+    body = await request.body()
+    try:
+        payload = await asyncio.to_thread(_decode_vectors_upload, body)
+    except PayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if payload["embedding_model"] != rag_service.embedding_model:
+        raise HTTPException(status_code=409, detail=(
+            f"Chunks were embedded with {payload['embedding_model']}, "
+            f"this server uses {rag_service.embedding_model}"
+        ))
+    if payload["count"] and payload["dim"] != rag_service.embedding_dimension:
+        raise HTTPException(status_code=409, detail=(
+            f"Vector dimension {payload['dim']} does not match the index ({rag_service.embedding_dimension})"
+        ))
+
+    document_id = payload.get("document_id") or str(uuid.uuid4())
+    filename = payload.get("filename") or document_id
+    for meta in payload["batch"].metadatas:
+        meta["document_id"] = document_id
+    return await _enqueue(IngestJob(document_id, filename, chunks=payload["batch"]), wait)
+
+
+def _decode_vectors_upload(body: bytes) -> Dict:
+    payload = decode_chunk_payload(body)
+    vectors = payload.pop("embeddings")
+    if not np.isfinite(vectors).all():
+        raise PayloadError("Vectors contain NaN or infinity")
+    chunks = payload.pop("chunks")
+    payload["batch"] = ChunkBatch(
+        ids=[str(chunk.get("id") or uuid.uuid4()) for chunk in chunks],
+        texts=[chunk["text"] for chunk in chunks],
+        metadatas=[dict(chunk.get("metadata") or {}) for chunk in chunks],
+        embeddings=vectors.tolist(),
+    )
+    return payload
+
+
+async def _enqueue(job: IngestJob, wait: bool):
+    """Queue an ingest job; answer 202 now, or once it is indexed."""
+    try:
+        ingest_queue.submit(job)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Ingestion queue is full — retry shortly")
+    if not registry.get(job.document_id):
+        registry.put(job.document_id, filename=job.filename, path=job.file_path, status="queued",
+                     chunks=0, uploaded_at=time.time())
+
+    if not wait:
+        return JSONResponse(status_code=202, content={
+            "document_id": job.document_id,
+            "filename": job.filename,
+            "status": "queued",
+            "queue_position": ingest_queue.queue.qsize(),
+        })
+
+    try:
+        # Shielded: a client that hangs up doesn't cancel the indexing.
+        doc = await asyncio.shield(job.done)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Indexing failed: {e}")
+    return {
+        "document_id": job.document_id,
+        "filename": job.filename,
+        "status": doc["status"],
+        "chunks_indexed": doc["chunks"],
+    }
+
+
+@app.get("/documents")
+async def list_documents():
+    return {"documents": [_public(doc) for doc in registry.all()]}
+
+
+@app.get("/documents/{document_id}")
+async def get_document(document_id: str):
+    doc = registry.get(document_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return _public(doc)
+
+
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str):
+    _require_ready()
+    # Under the ingest lock: an upload of this id already being indexed
+    # finishes first, instead of writing its chunks back after the delete.
+    async with ingest_queue.document_lock(document_id):
+        doc = registry.get(document_id)
+        if not doc:
+            # Chunks indexed before the registry existed can still be deleted.
+            stored = await rag_service.executor.query.run(
+                rag_service.backend.get, None, {"document_id": document_id}, [], 1
+            )
+            if not stored["ids"]:
+                raise HTTPException(status_code=404, detail="Document not found")
+        if not await rag_service.delete_document(document_id):
+            raise HTTPException(status_code=500, detail="Delete failed")
+        registry.remove(document_id)
+        if doc and doc.get("path") and os.path.exists(doc["path"]):
+            os.remove(doc["path"])
+        await asyncio.to_thread(_save_state)
+        return {"status": "deleted", "document_id": document_id}
+
+
+def _public(doc: Dict) -> Dict:
+    return {key: value for key, value in doc.items() if key != "path"}
+
+
+# ── Changelog (for replicas) ──────────────────────────────────────────────────
+
+@app.get("/changes")
+async def changes(http_request: Request, since: int = 0, limit: int = 500):
+    """Chunk upserts (with vectors) and deletes after sequence number `since`."""
+    _require_ready()
+    limit = max(1, min(limit, MAX_CHANGES_PAGE))
+    entries, next_seq, has_more = changelog.since(since, limit)
+    page = await rag_service.executor.query.run(_hydrate_changes, entries)
+    return await _respond(http_request, {
+        "epoch": changelog.epoch,
+        "version": changelog.head,
+        "next": next_seq,
+        "has_more": has_more,
+        "embedding_model": rag_service.embedding_model,
+        "changes": page,
+    }, offload=True)
+
+
+def _hydrate_changes(entries) -> List[Dict]:
+    upsert_ids = [chunk_id for _, op, chunk_id in entries if op == "upsert"]
+    rows = {}
+    if upsert_ids:
+        stored = rag_service.backend.get(ids=upsert_ids, include=["documents", "metadatas", "embeddings"])
+        for chunk_id, text, meta, vector in zip(
+            stored["ids"], stored["documents"], stored["metadatas"], stored["embeddings"]
+        ):
+            rows[chunk_id] = (text, meta, np.asarray(vector, dtype=np.float32))
+
+    page = []
+    for seq, op, chunk_id in entries:
+        if op == "delete":
+            page.append({"seq": seq, "op": "delete", "id": chunk_id})
+        elif chunk_id in rows:
+            # An upsert whose chunk is gone has a later delete entry coming.
+            text, meta, vector = rows[chunk_id]
+            page.append({"seq": seq, "op": "upsert", "id": chunk_id, "content": text,
+                         "metadata": meta, "embedding": vector})
+    return page
+
+
+# ── MAIN ──────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    # One worker process on purpose — see the module docstring.
+    uvicorn.run("backend.shared_rag_service:app", host="0.0.0.0", port=SHARED_RAG_PORT, workers=1)
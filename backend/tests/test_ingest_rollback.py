@@ -0,0 +1,58 @@
+"""RAGService.add_document: a failure partway through leaves nothing indexed."""
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+
+from backend.services import rag_service as rag_module
+from backend.services.keyword_index import KeywordIndex
+from backend.services.rag_service import RAGService
+from backend.services.vector_backends import FlatIndexBackend
+
+
+def _service(tmp_path) -> RAGService:
+    service = RAGService()
+    service.backend = FlatIndexBackend(str(tmp_path / "index"))
+    service.keyword_index = KeywordIndex(str(tmp_path / "keywords.json"))
+    service.is_initialized = True
+
+    async def encode(texts):
+        rng = np.random.default_rng(len(texts))
+        vectors = rng.normal(size=(len(texts), 8)).astype(np.float32)
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist()
+
+    service._encode = encode
+    return service
+
+
+def test_failure_in_second_batch_removes_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_module, "RAG_EMBED_BATCH_SIZE", 2)
+    path = tmp_path / "doc.txt"
+    path.write_text("\n\n".join(f"paragraph {i} " + "words " * 200 for i in range(6)))
+
+    service = _service(tmp_path)
+    write_batch = service._write_batch
+    writes = []
+
+    async def failing_write(batch):
+        writes.append(len(batch))
+        if len(writes) == 2:
+            raise RuntimeError("disk full")
+        await write_batch(batch)
+
+    service._write_batch = failing_write
+
+    async def scenario():
+        with pytest.raises(RuntimeError, match="disk full"):
+            await service.add_document(str(path), "doc-1")
+        await service.persister.close()
+
+    try:
+        asyncio.run(scenario())
+        assert len(writes) == 2
+        assert service.backend.get(where={"document_id": "doc-1"})["ids"] == []
+        assert service.keyword_index.search("paragraph", 10) == []
+    finally:
+        service.executor.shutdown()
@@ -0,0 +1,40 @@
+"""WriteBehindPersister: writes that land during a flush still get flushed."""
+import asyncio
+
+from backend.services.persistence import WriteBehindPersister
+
+
+def test_write_during_timer_flush_is_flushed():
+    async def scenario():
+        async def slow_flush():
+            await asyncio.sleep(0.2)
+
+        persister = WriteBehindPersister(slow_flush, window_seconds=0.05, max_pending=1000)
+        persister.mark_dirty(3)
+        await asyncio.sleep(0.1)            # timer fired, first flush running
+        assert persister._lock.locked()
+        persister.mark_dirty(5)             # lands mid-flush
+        await asyncio.sleep(0.5)
+        return persister
+
+    persister = asyncio.run(scenario())
+    assert persister.pending_ops == 0
+    assert persister.flushes == 2
+    assert persister.flushed_ops == 8
+
+
+def test_max_pending_write_during_flush_is_flushed():
+    async def scenario():
+        async def slow_flush():
+            await asyncio.sleep(0.2)
+
+        persister = WriteBehindPersister(slow_flush, window_seconds=10, max_pending=2)
+        persister.mark_dirty(2)             # immediate flush
+        await asyncio.sleep(0.05)
+        persister.mark_dirty(2)             # over max_pending, mid-flush
+        await asyncio.sleep(0.6)
+        return persister
+
+    persister = asyncio.run(scenario())
+    assert persister.pending_ops == 0
+    assert persister.flushes == 2